@@ -2,6 +2,9 @@
 Global configuration and constants for the J&K Evacuation System
 """
 
+import os
+import tempfile
+
 # --------------------
 # Geography
 # --------------------
@@ -15,6 +18,33 @@ OVERPASS_URL = "https://overpass-api.de/api/interpreter"
 OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
 USGS_EQ_URL = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_day.geojson"
 
+# --------------------
+# HTTP
+# --------------------
+HTTP_POOL_SIZE = 10
+HTTP_USER_AGENT = "JK-Evacuation-System/1.0 (contact@example.com)"
+
+# --------------------
+# Upstream resilience
+# --------------------
+# Per-call HTTP timeouts
+NOMINATIM_TIMEOUT_S = 10
+WEATHER_TIMEOUT_S = 10
+USGS_TIMEOUT_S = 10
+OVERPASS_TIMEOUT_S = 60
+
+# A breaker opens after this many consecutive failures and lets one probe
+# through once the cooldown has passed
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN_S = 30.0
+
+# Fallbacks served while an upstream fails are cached only this long and
+# flagged as degraded
+DEGRADED_TTL_S = 60.0
+
+# Most time one API/UI request may spend waiting on upstreams
+REQUEST_LATENCY_BUDGET_S = float(os.getenv("SAFEROUTEX_LATENCY_BUDGET_S", "5"))
+
 # --------------------
 # Rate Limits
 # --------------------
@@ -22,6 +52,101 @@ NOMINATIM_CALLS_PER_SEC = 1
 WEATHER_CALLS_PER_SEC = 5
 OVERPASS_CALLS_PER_SEC = 1
 
+# Locations per multi-point Open-Meteo request
+WEATHER_BATCH_SIZE = 100
+
+# Weather is cached per model-grid tile this many degrees wide (Open-Meteo's
+# default models resolve to about 0.1°). Points take the nearest tile
+# centre's value, or a bilinear blend of the four around them.
+WEATHER_TILE_DEG = float(os.getenv("SAFEROUTEX_WEATHER_TILE_DEG", "0.1"))
+WEATHER_INTERPOLATE = os.getenv("SAFEROUTEX_WEATHER_INTERPOLATE", "0") == "1"
+
+# Token-bucket state shared by all worker processes on the host
+RATE_LIMIT_DIR = os.environ.get(
+    "SAFEROUTEX_RATE_LIMIT_DIR",
+    os.path.join(tempfile.gettempdir(), "saferoutex-ratelimit"),
+)
+
+# --------------------
+# Cache Freshness (seconds / entries)
+# --------------------
+COORD_CACHE_TTL_S = 30 * 24 * 3600
+COORD_CACHE_MAXSIZE = 1024
+
+WEATHER_CACHE_TTL_S = 30 * 60
+WEATHER_CACHE_STALE_S = 6 * 3600
+WEATHER_CACHE_MAXSIZE = 4096
+
+EARTHQUAKE_CACHE_TTL_S = 5 * 60
+EARTHQUAKE_CACHE_STALE_S = 3600
+EARTHQUAKE_CACHE_MAXSIZE = 16
+
+SAFEHOUSE_CACHE_TTL_S = 24 * 3600
+SAFEHOUSE_CACHE_STALE_S = 7 * 24 * 3600
+SAFEHOUSE_CACHE_MAXSIZE = 16
+
+MAP_CACHE_TTL_S = 24 * 3600
+MAP_CACHE_MAXSIZE = 256
+
+# --------------------
+# Persistent store (survives restarts and redeploys)
+# --------------------
+DATA_DIR = os.environ.get(
+    "SAFEROUTEX_DATA_DIR",
+    os.path.join(os.path.expanduser("~"), ".saferoutex"),
+)
+STORE_PATH = os.path.join(DATA_DIR, "store.sqlite3")
+STORE_BUSY_TIMEOUT_S = 5.0
+
+# Stored entries younger than this are served without an upstream call
+GEOCODE_REFRESH_AGE_S = COORD_CACHE_TTL_S
+SAFEHOUSE_REFRESH_AGE_S = SAFEHOUSE_CACHE_TTL_S
+
+# --------------------
+# Shared cache backend
+# --------------------
+# Tier shared by worker processes behind each upstream-data cache:
+# "memory" (none; every process caches alone), "sqlite" (the workers of one
+# host) or "redis" (any Redis-protocol server, across hosts)
+CACHE_BACKEND = os.getenv("SAFEROUTEX_CACHE_BACKEND", "memory")
+CACHE_SQLITE_PATH = os.path.join(DATA_DIR, "cache.sqlite3")
+CACHE_REDIS_URL = os.getenv("SAFEROUTEX_REDIS_URL", "redis://127.0.0.1:6379/0")
+CACHE_REDIS_TIMEOUT_S = 1.0
+CACHE_KEY_PREFIX = "saferoutex"
+
+# A worker that misses a key another worker is already loading waits up to
+# this long for the result instead of calling the upstream too
+CACHE_LEASE_S = 10.0
+CACHE_LEASE_POLL_S = 0.05
+
+# How often per-process hit counters are added to the shared totals
+CACHE_COUNTER_FLUSH_S = 5.0
+
+# --------------------
+# Snapshot bundle (startup cache, opt-in)
+# --------------------
+# One worker per host (whichever takes the lock first) builds snapshots and
+# writes them here; the others load them instead of calling upstreams. Each
+# worker still holds its own graph, so this saves startup and refresh work,
+# not memory
+SNAPSHOT_BUNDLE_ENABLED = os.getenv("SAFEROUTEX_SNAPSHOT_BUNDLE", "0") == "1"
+SNAPSHOT_BUNDLE_PATH = os.path.join(DATA_DIR, "snapshot.bundle")
+SNAPSHOT_BUNDLE_POLL_S = 2.0
+
+# Followers ignore bundles older than this and build for themselves
+SNAPSHOT_BUNDLE_MAX_AGE_S = 3600.0
+
+# --------------------
+# Background Refresh Intervals (seconds)
+# --------------------
+EARTHQUAKE_REFRESH_INTERVAL_S = 2 * 60
+WEATHER_REFRESH_INTERVAL_S = 15 * 60
+SAFEHOUSE_REFRESH_INTERVAL_S = 12 * 3600
+
+# While districts sit at fallback coordinates, retry geocoding (and rebuild
+# the topology) this often; the fallbacks' cache entries expire meanwhile
+GEOCODE_RETRY_INTERVAL_S = DEGRADED_TTL_S
+
 # --------------------
 # Risk Thresholds (heuristic)
 # --------------------
@@ -33,7 +158,47 @@ EQ_HIGH_MAG = 6.0
 EQ_MEDIUM_MAG = 5.0
 EQ_LOW_MAG = 4.0
 
+# Seismic exposure: events count within this radius of a node, and the
+# feed keeps only events within the buffer around JK_BBOX (must be >= radius)
+EQ_EXPOSURE_RADIUS_KM = 150.0
+EQ_BBOX_BUFFER_KM = 300.0
+
 # --------------------
 # Routing
 # --------------------
 DEFAULT_MAX_ROUTE_K = 3
+
+# Hard upper bound on k for any top-k route request
+ROUTE_K_CAP = 10
+
+# Most items one /routes/batch request may ask for (larger ones get 413)
+ROUTE_BATCH_MAX_ITEMS = int(os.getenv("SAFEROUTEX_ROUTE_BATCH_MAX_ITEMS", "500"))
+
+# Disaster types a user can mark as blocked (UI checkbox choices)
+DISASTER_TYPES = ["flood", "landslide", "earthquake"]
+
+# Route table precomputed per snapshot for every blocked-type subset
+ROUTE_TABLE_K = 5
+ROUTE_TABLE_WORKERS = 0  # 0 = compute inline, >0 = process pool size
+
+# Server-push route subscriptions: comment sent on idle streams so proxies
+# keep them open
+SUBSCRIPTION_KEEPALIVE_S = 15.0
+
+# --------------------
+# Road network
+# --------------------
+# Local OSM extract (.osm.pbf or saved Overpass JSON); unset = districts only
+ROAD_NETWORK_PATH = os.getenv("SAFEROUTEX_ROAD_NETWORK")
+
+ROAD_HIGHWAY_TYPES = frozenset({
+    "motorway", "trunk", "primary", "secondary", "tertiary",
+    "motorway_link", "trunk_link", "primary_link", "secondary_link",
+    "tertiary_link", "unclassified", "residential", "living_street",
+    "service", "track",
+})
+
+# Road arc cost = length_km * (1 + penalties); penalties scale with length
+# so a route's cost does not depend on how finely its roads are digitised
+ROAD_RISK_FACTOR = 0.02     # per unit of mean endpoint risk score
+ROAD_BLOCKED_FACTOR = 1.0   # per endpoint in a blocked disaster type
@@ -0,0 +1,38 @@
+"""
+Pre-seed the persistent store so a new deployment starts warm
+
+--districts stores the bundled district centres as geocodes; --overpass
+stores the safehouses of a saved Overpass response (the JSON body of the
+safehouse query). Seeded entries count as freshly fetched.
+
+    python -m app.data.seed_store --districts --overpass safehouses.json
+"""
+
+import argparse
+
+from app.data_sources.nominatim import seed_fallback_geocodes
+from app.data_sources.safehouses import seed_safehouses_from_dump
+from app.utils.store import persistent_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--districts", action="store_true",
+                        help="seed geocodes from the bundled district centres")
+    parser.add_argument("--overpass", metavar="PATH",
+                        help="seed safehouses from a saved Overpass JSON response")
+    args = parser.parse_args()
+    if not (args.districts or args.overpass):
+        parser.error("nothing to seed; pass --districts and/or --overpass")
+
+    if args.districts:
+        seed_fallback_geocodes()
+    if args.overpass:
+        print(f"safehouses: {seed_safehouses_from_dump(args.overpass)}")
+
+    for namespace, info in persistent_store.stats()["namespaces"].items():
+        print(f"{namespace}: {info['entries']} entries in {persistent_store.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,59 +2,188 @@
 USGS Earthquake data client
 """
 
-import requests
-from typing import List, Dict
+import asyncio
+from math import cos, radians
+from typing import List, Dict, Sequence, Tuple
 
-from app.config.settings import USGS_EQ_URL
-from app.utils.cache import earthquake_cache
-from app.utils.geo import haversine_km
+import numpy as np
 
+from app.config.settings import (
+    DEGRADED_TTL_S,
+    USGS_EQ_URL,
+    USGS_TIMEOUT_S,
+    JK_BBOX,
+    EQ_BBOX_BUFFER_KM,
+    EQ_EXPOSURE_RADIUS_KM,
+)
+from app.utils.cache import earthquake_cache, exposure_cache
+from app.utils.geo import (
+    EARTH_RADIUS_KM,
+    haversine_matrix_chunked,
+    haversine_one_to_many,
+)
+from app.utils.http import get_session, get_async_client
+from app.utils.resilience import upstream_timeout, usgs_breaker
 
-def fetch_recent_earthquakes() -> List[Dict]:
+
+def fetch_recent_earthquakes(force_refresh: bool = False) -> List[Dict]:
     """
     Fetch recent earthquake events from USGS
+
+    With `force_refresh`, bypass the cache. If the upstream call fails,
+    the previous feed (or none) is kept briefly and flagged as degraded;
+    a forced refresh then re-raises the failure for its scheduler.
     """
-    if earthquake_cache.exists("usgs"):
-        return earthquake_cache.get("usgs")
+    try:
+        if force_refresh:
+            quakes = _request_earthquakes()
+            earthquake_cache.set("usgs", quakes)
+            return quakes
+        return earthquake_cache.get_or_load("usgs", _request_earthquakes)
+    except Exception:
+        quakes = _degrade()
+        if force_refresh:
+            raise
+        return quakes
 
+
+async def fetch_recent_earthquakes_async() -> List[Dict]:
+    """
+    Async variant of `fetch_recent_earthquakes`
+    """
     try:
-        resp = requests.get(USGS_EQ_URL, timeout=10)
+        return await earthquake_cache.get_or_load_async(
+            "usgs", _request_earthquakes_async
+        )
+    except Exception:
+        return await asyncio.to_thread(_degrade)
+
+
+def earthquakes_degraded() -> bool:
+    """True if the current feed is a degraded fallback"""
+    return earthquake_cache.is_degraded("usgs")
+
+
+def _degrade() -> List[Dict]:
+    quakes = earthquake_cache.peek("usgs", [])
+    earthquake_cache.set("usgs", quakes, ttl=DEGRADED_TTL_S, degraded=True)
+    return quakes
+
+
+def _request_earthquakes() -> List[Dict]:
+    with usgs_breaker:
+        resp = get_session().get(USGS_EQ_URL, timeout=upstream_timeout(USGS_TIMEOUT_S))
         resp.raise_for_status()
         data = resp.json()
+    return _parse_features(data)
 
-        quakes = []
-        for f in data.get("features", []):
-            props = f.get("properties", {})
-            geom = f.get("geometry", {})
-            coords = geom.get("coordinates", [])
 
-            if len(coords) >= 2:
-                quakes.append({
-                    "mag": props.get("mag"),
-                    "lat": coords[1],
-                    "lon": coords[0],
-                })
+async def _request_earthquakes_async() -> List[Dict]:
+    with usgs_breaker:
+        resp = await get_async_client().get(
+            USGS_EQ_URL, timeout=upstream_timeout(USGS_TIMEOUT_S)
+        )
+        resp.raise_for_status()
+        data = resp.json()
+    return _parse_features(data)
 
-        earthquake_cache.set("usgs", quakes)
-        return quakes
 
-    except Exception:
-        earthquake_cache.set("usgs", [])
-        return []
+def _region_bounds(buffer_km: float = EQ_BBOX_BUFFER_KM):
+    # JK_BBOX grown by buffer_km; longitude degrees are widened at the
+    # bbox's poleward edge so the buffer is never narrower than asked
+    lat1, lon1, lat2, lon2 = JK_BBOX
+    km_per_deg = EARTH_RADIUS_KM * np.pi / 180
+    dlat = buffer_km / km_per_deg
+    dlon = buffer_km / (km_per_deg * cos(radians(min(89.0, max(abs(lat1), abs(lat2)) + dlat))))
+    return lat1 - dlat, lon1 - dlon, lat2 + dlat, lon2 + dlon
+
 
+def _parse_features(data: Dict) -> List[Dict]:
+    # Keep only events near the region; the global feed is mostly elsewhere
+    min_lat, min_lon, max_lat, max_lon = _region_bounds()
 
-def max_magnitude_near(lat: float, lon: float, radius_km: float = 150.0) -> float:
+    quakes = []
+    for f in data.get("features", []):
+        props = f.get("properties", {})
+        geom = f.get("geometry", {})
+        coords = geom.get("coordinates", [])
+
+        if len(coords) < 2:
+            continue
+        lon, lat = coords[0], coords[1]
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+            quakes.append({
+                "mag": props.get("mag"),
+                "lat": lat,
+                "lon": lon,
+            })
+
+    return quakes
+
+
+def node_quake_magnitudes(
+    coords: Sequence[Tuple[float, float]],
+    radius_km: float = EQ_EXPOSURE_RADIUS_KM,
+    quakes: List[Dict] | None = None,
+) -> List[float]:
+    """
+    Maximum nearby magnitude for every point, in one vectorized pass
+
+    The result is cached next to the feed it was computed from and reused
+    until the feed is replaced.
+    """
+    if quakes is None:
+        quakes = fetch_recent_earthquakes()
+
+    key = ("exposure", tuple(coords), radius_km)
+    cached = exposure_cache.get(key)
+    if cached is not None and cached[0] is quakes:
+        return cached[1]
+
+    mags = _max_magnitudes(coords, quakes, radius_km)
+    exposure_cache.set(key, (quakes, mags))
+    return mags
+
+
+def _max_magnitudes(coords, quakes, radius_km: float) -> List[float]:
+    rated = [q for q in quakes if q["mag"] is not None]
+    if not coords or not rated:
+        return [0.0] * len(coords)
+
+    q_mags = np.array([float(q["mag"]) for q in rated])
+    q_lats = [q["lat"] for q in rated]
+    q_lons = [q["lon"] for q in rated]
+
+    result = np.zeros(len(coords))
+    for offset, block in haversine_matrix_chunked(
+        [c[0] for c in coords], [c[1] for c in coords], q_lats, q_lons
+    ):
+        near = np.where(block <= radius_km, q_mags[None, :], 0.0)
+        result[offset:offset + len(block)] = near.max(axis=1)
+
+    return np.maximum(result, 0.0).tolist()
+
+
+def max_magnitude_near(
+    lat: float,
+    lon: float,
+    radius_km: float = EQ_EXPOSURE_RADIUS_KM,
+    quakes: List[Dict] | None = None,
+) -> float:
     """
     Return maximum earthquake magnitude within radius
     """
-    quakes = fetch_recent_earthquakes()
-    max_mag = 0.0
+    if quakes is None:
+        quakes = fetch_recent_earthquakes()
 
-    for q in quakes:
-        if q["mag"] is None:
-            continue
-        d = haversine_km(lat, lon, q["lat"], q["lon"])
-        if d <= radius_km:
-            max_mag = max(max_mag, float(q["mag"]))
+    rated = [q for q in quakes if q["mag"] is not None]
+    if not rated:
+        return 0.0
+
+    mags = np.array([float(q["mag"]) for q in rated])
+    d = haversine_one_to_many(
+        lat, lon, [q["lat"] for q in rated], [q["lon"] for q in rated]
+    )
+    near = mags[d <= radius_km]
 
-    return max_mag
+    return max(0.0, float(near.max())) if near.size else 0.0
@@ -2,56 +2,118 @@
 Nominatim (OpenStreetMap) geocoding client
 """
 
-import requests
-from ratelimit import limits, sleep_and_retry
+import asyncio
 
-from app.config.settings import NOMINATIM_URL, NOMINATIM_CALLS_PER_SEC
+from app.config.settings import (
+    DEGRADED_TTL_S,
+    GEOCODE_REFRESH_AGE_S,
+    NOMINATIM_TIMEOUT_S,
+    NOMINATIM_URL,
+)
+from app.utils.throttle import nominatim_bucket
 from app.utils.cache import coord_cache
-from app.data.districts import get_fallback_coord
+from app.utils.http import get_session, get_async_client
+from app.utils.resilience import nominatim_breaker, remaining_budget, upstream_timeout
+from app.utils.store import PersistedCache, persistent_store
+from app.data.districts import FALLBACK_COORDINATES, get_fallback_coord
+
+# Geocodes survive restarts in the on-disk store
+_persisted = PersistedCache(
+    coord_cache, "geocodes", GEOCODE_REFRESH_AGE_S, persistent_store, decode=tuple
+)
 
 
-@sleep_and_retry
-@limits(calls=NOMINATIM_CALLS_PER_SEC, period=1)
 def geocode_district(district: str):
     """
     Resolve district name to (lat, lon) using Nominatim
     """
-    if coord_cache.exists(district):
-        return coord_cache.get(district)
+    _persisted.prime()
+    try:
+        return coord_cache.get_or_load(
+            district,
+            lambda: _persisted.save(district, _request_coordinates(district)),
+        )
+    except Exception:
+        return _fallback(district)
+
+
+async def geocode_district_async(district: str):
+    """
+    Async variant of `geocode_district`
+    """
+    _persisted.prime()
+
+    async def _load():
+        return _persisted.save(district, await _request_coordinates_async(district))
+
+    try:
+        return await coord_cache.get_or_load_async(district, _load)
+    except Exception:
+        return await asyncio.to_thread(_fallback, district)
+
+
+def seed_fallback_geocodes():
+    """
+    Store the bundled district centres as geocodes
+
+    They are then served like fresh Nominatim results until
+    GEOCODE_REFRESH_AGE_S passes, so no district needs a lookup.
+    """
+    _persisted.seed(dict(FALLBACK_COORDINATES))
+
+
+def geocode_degraded(district: str) -> bool:
+    """True if the district's coordinates are a degraded fallback"""
+    return coord_cache.is_degraded(district)
 
-    params = {
+
+def _fallback(district: str):
+    # Fallback if API fails: the last real geocode (possibly from the
+    # store), else the district centre; kept briefly so geocoding is retried
+    fallback = coord_cache.peek(district) or get_fallback_coord(district)
+    if fallback:
+        coord_cache.set(district, fallback, ttl=DEGRADED_TTL_S, degraded=True)
+        return fallback
+
+    return None, None
+
+
+def _request_params(district: str):
+    return {
         "q": f"{district}, Jammu and Kashmir, India",
         "format": "json",
         "limit": 1,
     }
 
-    headers = {
-        "User-Agent": "JK-Evacuation-System/1.0 (contact@example.com)"
-    }
 
-    try:
-        resp = requests.get(
+def _request_coordinates(district: str):
+    with nominatim_breaker:
+        nominatim_bucket.acquire(max_wait=remaining_budget())
+        resp = get_session().get(
             NOMINATIM_URL,
-            params=params,
-            headers=headers,
-            timeout=10,
+            params=_request_params(district),
+            timeout=upstream_timeout(NOMINATIM_TIMEOUT_S),
         )
         resp.raise_for_status()
         data = resp.json()
+    return _parse_result(district, data)
 
-        if data:
-            lat = float(data[0]["lat"])
-            lon = float(data[0]["lon"])
-            coord_cache.set(district, (lat, lon))
-            return lat, lon
 
-    except Exception:
-        pass
+async def _request_coordinates_async(district: str):
+    with nominatim_breaker:
+        await nominatim_bucket.acquire_async(max_wait=remaining_budget())
+        resp = await get_async_client().get(
+            NOMINATIM_URL,
+            params=_request_params(district),
+            timeout=upstream_timeout(NOMINATIM_TIMEOUT_S),
+        )
+        resp.raise_for_status()
+        data = resp.json()
+    return _parse_result(district, data)
 
-    # Fallback if API fails
-    fallback = get_fallback_coord(district)
-    if fallback:
-        coord_cache.set(district, fallback)
-        return fallback
 
-    return None, None
+def _parse_result(district: str, data):
+    if not data:
+        raise LookupError(f"No geocoding result for {district}")
+
+    return float(data[0]["lat"]), float(data[0]["lon"])
@@ -2,27 +2,152 @@
 Safehouse discovery via Overpass API (OpenStreetMap)
 """
 
-import requests
-from ratelimit import limits, sleep_and_retry
+import asyncio
+import json
+from math import cos, pi, radians
 
-from app.config.settings import OVERPASS_URL, JK_BBOX, OVERPASS_CALLS_PER_SEC
+import numpy as np
+
+from app.config.settings import (
+    DEGRADED_TTL_S,
+    JK_BBOX,
+    OVERPASS_TIMEOUT_S,
+    OVERPASS_URL,
+    SAFEHOUSE_REFRESH_AGE_S,
+)
+from app.utils.throttle import overpass_bucket
 from app.utils.cache import safehouse_cache
-from app.utils.geo import haversine_km
+from app.utils.geo import haversine_paired
+from app.utils.http import get_session, get_async_client
+from app.utils.resilience import overpass_breaker, remaining_budget, upstream_timeout
+from app.utils.spatial import SpatialIndex
+from app.utils.store import PersistedCache, persistent_store
 from app.data.fallback_safehouses import get_fallback_safehouses
 
+DEDUPE_RADIUS_KM = 0.25
+KM_PER_DEGREE = 6371.0 * pi / 180
+
+# The safehouse set survives restarts in the on-disk store
+_persisted = PersistedCache(
+    safehouse_cache, "safehouses", SAFEHOUSE_REFRESH_AGE_S, persistent_store
+)
+
 
-@sleep_and_retry
-@limits(calls=OVERPASS_CALLS_PER_SEC, period=1)
-def fetch_safehouses():
+def fetch_safehouses(force_refresh: bool = False):
     """
     Fetch shelters, hospitals, police, fire stations from OSM
+
+    With `force_refresh`, bypass the cache. If the upstream call fails,
+    the previous set (or the bundled fallback list) is kept briefly and
+    flagged as degraded; a forced refresh then re-raises the failure for
+    its scheduler.
+    """
+    _persisted.prime()
+    try:
+        if force_refresh:
+            points = _load_safehouses()
+            safehouse_cache.set("safehouses", points)
+            return points
+        return safehouse_cache.get_or_load("safehouses", _load_safehouses)
+    except Exception:
+        points = _fallback()
+        if force_refresh:
+            raise
+        return points
+
+
+async def fetch_safehouses_async():
+    """
+    Async variant of `fetch_safehouses`
+    """
+    _persisted.prime()
+    try:
+        return await safehouse_cache.get_or_load_async(
+            "safehouses", _load_safehouses_async
+        )
+    except Exception:
+        return await asyncio.to_thread(_fallback)
+
+
+def seed_safehouses_from_dump(path: str) -> int:
+    """
+    Store the safehouses of a saved Overpass JSON response
+
+    The dump is the body of the query from `_overpass_query`; it is
+    parsed and deduplicated like a live response. Returns the count kept.
     """
-    if safehouse_cache.exists("safehouses"):
-        return safehouse_cache.get("safehouses")
+    with open(path, "r", encoding="utf-8") as f:
+        points = _parse_elements(json.load(f))
+    _persisted.seed({"safehouses": points})
+    return len(points)
+
+
+def fetch_safehouse_index() -> SpatialIndex:
+    """
+    Return a spatial index over the current safehouse set
+    """
+    return _index_for(fetch_safehouses())
+
+
+async def fetch_safehouse_index_async() -> SpatialIndex:
+    """
+    Async variant of `fetch_safehouse_index`
+    """
+    return _index_for(await fetch_safehouses_async())
+
+
+# (safehouse list, index) for the most recently loaded set
+_index_state: tuple = (None, None)
+
+
+def _index_for(safehouses) -> SpatialIndex:
+    # Rebuild only when the cache hands back a different list object
+    global _index_state
+    source, index = _index_state
+    if source is not safehouses:
+        index = SpatialIndex(safehouses)
+        _index_state = (safehouses, index)
+    return index
+
+
+def safehouses_degraded() -> bool:
+    """True if the current set is a degraded fallback"""
+    return safehouse_cache.is_degraded("safehouses")
+
+
+def current_safehouses():
+    """The cached set, fresh or not, without loading; None if empty"""
+    return safehouse_cache.peek("safehouses")
+
 
+def adopt_safehouses(points, degraded: bool = False):
+    """Use a set obtained elsewhere (e.g. a snapshot bundle) as current"""
+    if degraded:
+        safehouse_cache.set("safehouses", points, ttl=DEGRADED_TTL_S, degraded=True)
+    else:
+        safehouse_cache.set("safehouses", points)
+
+
+def _fallback():
+    points = safehouse_cache.peek("safehouses")
+    if points is None:
+        points = get_fallback_safehouses()
+    safehouse_cache.set("safehouses", points, ttl=DEGRADED_TTL_S, degraded=True)
+    return points
+
+
+def _load_safehouses():
+    return _persisted.save("safehouses", _request_safehouses())
+
+
+async def _load_safehouses_async():
+    return _persisted.save("safehouses", await _request_safehouses_async())
+
+
+def _overpass_query() -> str:
     lat1, lon1, lat2, lon2 = JK_BBOX
 
-    query = f"""
+    return f"""
     [out:json][timeout:60];
     (
       node["amenity"~"hospital|police|fire_station|shelter"]({lat1},{lon1},{lat2},{lon2});
@@ -32,42 +157,142 @@ def fetch_safehouses():
     out center;
     """
 
-    try:
-        resp = requests.post(OVERPASS_URL, data={"data": query}, timeout=60)
+
+def _request_safehouses():
+    with overpass_breaker:
+        overpass_bucket.acquire(max_wait=remaining_budget())
+        resp = get_session().post(
+            OVERPASS_URL,
+            data={"data": _overpass_query()},
+            timeout=upstream_timeout(OVERPASS_TIMEOUT_S),
+        )
+        resp.raise_for_status()
+        data = resp.json()
+    return _parse_elements(data)
+
+
+async def _request_safehouses_async():
+    with overpass_breaker:
+        await overpass_bucket.acquire_async(max_wait=remaining_budget())
+        resp = await get_async_client().post(
+            OVERPASS_URL,
+            data={"data": _overpass_query()},
+            timeout=upstream_timeout(OVERPASS_TIMEOUT_S),
+        )
         resp.raise_for_status()
         data = resp.json()
+    return _parse_elements(data)
+
+
+def _parse_elements(data):
+    points = []
+    for el in data.get("elements", []):
+        lat = el.get("lat") or el.get("center", {}).get("lat")
+        lon = el.get("lon") or el.get("center", {}).get("lon")
+
+        if lat is None or lon is None:
+            continue
 
-        points = []
-        for el in data.get("elements", []):
-            lat = el.get("lat") or el.get("center", {}).get("lat")
-            lon = el.get("lon") or el.get("center", {}).get("lon")
+        tags = el.get("tags", {})
+        point = {
+            "name": tags.get("name", "Unknown"),
+            "lat": float(lat),
+            "lon": float(lon),
+            "type": tags.get("amenity") or tags.get("emergency", "shelter"),
+        }
+        points.append((_richness(tags), point))
 
-            if lat is None or lon is None:
+    return _deduplicate(points, DEDUPE_RADIUS_KM)
+
+
+def _richness(tags) -> tuple:
+    # Named facilities first, then the more thoroughly tagged one
+    return ("name" in tags, len(tags))
+
+
+def _deduplicate(points, radius_km: float):
+    """
+    Merge points closer than `radius_km`, in near-linear time
+
+    Points are bucketed on a grid whose cells are at least `radius_km`
+    wide, so candidate pairs only come from the 3x3 block of cells around
+    each point; their distances are measured in one vectorized pass. The
+    greedy pass then keeps a point unless an earlier kept point is within
+    range. A kept point keeps its position and takes its name and type
+    from the richest-tagged point merged into it.
+    """
+    n = len(points)
+    if n == 0:
+        return []
+
+    lats = np.array([p["lat"] for _, p in points])
+    lons = np.array([p["lon"] for _, p in points])
+
+    max_abs_lat = float(np.abs(lats).max())
+    lat_step = radius_km / KM_PER_DEGREE
+    lon_step = radius_km / (KM_PER_DEGREE * max(cos(radians(max_abs_lat)), 1e-6))
+
+    cx = np.floor(lats / lat_step).astype(np.int64)
+    cy = np.floor(lons / lon_step).astype(np.int64)
+    width = int(cy.max() - cy.min()) + 3
+    cell = (cx - cx.min() + 1) * width + (cy - cy.min() + 1)
+
+    order = np.argsort(cell, kind="stable")
+    sorted_cells = cell[order]
+
+    # Candidate pairs (i, j) with j < i from neighbouring cells; queries
+    # run in sorted-cell order so every searchsorted input is sorted too
+    cand_i, cand_j = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            target = sorted_cells + (dx * width + dy)
+            lo = np.searchsorted(sorted_cells, target, side="left")
+            hi = np.searchsorted(sorted_cells, target, side="right")
+            counts = hi - lo
+            total = int(counts.sum())
+            if total == 0:
                 continue
 
-            tags = el.get("tags", {})
-            points.append({
-                "name": tags.get("name", "Unknown"),
-                "lat": float(lat),
-                "lon": float(lon),
-                "type": tags.get("amenity") or tags.get("emergency", "shelter"),
-            })
-
-        # Deduplicate by proximity
-        deduped = []
-        for p in points:
-            merged = False
-            for q in deduped:
-                if haversine_km(p["lat"], p["lon"], q["lat"], q["lon"]) < 0.25:
-                    merged = True
-                    break
-            if not merged:
-                deduped.append(p)
-
-        safehouse_cache.set("safehouses", deduped)
-        return deduped
+            i_rep = np.repeat(order, counts)
+            within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            j_rep = order[np.repeat(lo, counts) + within]
 
-    except Exception:
-        fallback = get_fallback_safehouses()
-        safehouse_cache.set("safehouses", fallback)
-        return fallback
+            earlier = j_rep < i_rep
+            cand_i.append(i_rep[earlier])
+            cand_j.append(j_rep[earlier])
+
+    # Close earlier neighbours of each point in CSR layout: with pairs
+    # sorted by i, start[i]..start[i + 1] is the run of point i's
+    # neighbours in j_sorted (row pointers over a flat column array)
+    if cand_i:
+        ii = np.concatenate(cand_i)
+        jj = np.concatenate(cand_j)
+        close = haversine_paired(lats[ii], lons[ii], lats[jj], lons[jj]) < radius_km
+        ii, jj = ii[close], jj[close]
+        srt = np.lexsort((jj, ii))
+        ii, jj = ii[srt], jj[srt]
+    else:
+        ii = jj = np.empty(0, dtype=np.int64)
+    start = np.searchsorted(ii, np.arange(n + 1)).tolist()
+    j_sorted = jj.tolist()
+
+    # Greedy pass in input order, as the original pairwise loop did
+    slot = [-1] * n  # index into `kept` for points that were kept
+    kept = []  # [richness, point]
+    for i, (richness, p) in enumerate(points):
+        match = next(
+            (j for j in j_sorted[start[i]:start[i + 1]] if slot[j] >= 0),
+            None,
+        )
+        if match is None:
+            slot[i] = len(kept)
+            kept.append([richness, dict(p)])
+            continue
+
+        entry = kept[slot[match]]
+        if richness > entry[0]:
+            entry[0] = richness
+            entry[1]["name"] = p["name"]
+            entry[1]["type"] = p["type"]
+
+    return [point for _, point in kept]
@@ -1,44 +1,351 @@
 """
 Weather data client (Open-Meteo)
+
+Values are cached per model-grid tile rather than per point: a point is
+answered from the nearest tile centre, or blended bilinearly from the
+four around it, so nearby points share one upstream lookup.
 """
 
-import requests
-from ratelimit import limits, sleep_and_retry
+import asyncio
+import math
+from typing import Dict, List, Sequence, Tuple
 
-from app.config.settings import OPEN_METEO_URL, WEATHER_CALLS_PER_SEC
+from app.config.settings import (
+    DEGRADED_TTL_S,
+    OPEN_METEO_URL,
+    WEATHER_BATCH_SIZE,
+    WEATHER_INTERPOLATE,
+    WEATHER_TILE_DEG,
+    WEATHER_TIMEOUT_S,
+)
+from app.utils.throttle import weather_bucket
 from app.utils.cache import weather_cache
+from app.utils.http import get_session, get_async_client
+from app.utils.resilience import remaining_budget, upstream_timeout, weather_breaker
+
+# Grid indices of a tile centre: (round(lat / WEATHER_TILE_DEG), ...)
+Tile = Tuple[int, int]
+
+# Corner weights below this are float noise from points on a grid line
+_MIN_WEIGHT = 1e-9
 
 
-@sleep_and_retry
-@limits(calls=WEATHER_CALLS_PER_SEC, period=1)
-def fetch_precipitation_24h(lat: float, lon: float) -> float:
+def fetch_precipitation_24h(
+    lat: float,
+    lon: float,
+    interpolate: bool = WEATHER_INTERPOLATE,
+) -> float:
     """
     Return total precipitation (mm) over last 24 hours
     """
-    key = (round(lat, 5), round(lon, 5))
+    covering = _covering_tiles(lat, lon, interpolate)
+    values = {tile: _tile_precipitation(tile) for tile, _ in covering}
+    return _blend(covering, values)
+
+
+async def fetch_precipitation_24h_async(
+    lat: float,
+    lon: float,
+    interpolate: bool = WEATHER_INTERPOLATE,
+) -> float:
+    """
+    Async variant of `fetch_precipitation_24h`
+    """
+    covering = _covering_tiles(lat, lon, interpolate)
+    totals = await asyncio.gather(
+        *(_tile_precipitation_async(tile) for tile, _ in covering)
+    )
+    return _blend(covering, {tile: t for (tile, _), t in zip(covering, totals)})
+
+
+def fetch_precipitation_24h_many(
+    coords: Sequence[Tuple[float, float]],
+    force_refresh: bool = False,
+    interpolate: bool = WEATHER_INTERPOLATE,
+) -> List[float]:
+    """
+    Return 24h precipitation (mm) for many points, in input order
+
+    Points are mapped to their tiles first, so upstream work scales with
+    the distinct tiles. Cached tiles are answered locally; the rest are
+    fetched in chunks of WEATHER_BATCH_SIZE tile centres per Open-Meteo
+    request, except tiles another worker is fetching already, whose values
+    are awaited from the shared cache. A failed chunk keeps its previous
+    values (0.0 if none), stored as degraded. With `force_refresh`, every
+    tile is refetched and, once all chunks have run, the first failure is
+    raised for the scheduler.
+    """
+    covering, values, missing = _split_cached(coords, force_refresh, interpolate)
+    mine, theirs = _claim(missing, values)
+    try:
+        errors = _fetch_chunks(mine, values)
+    finally:
+        _release(mine)
+    errors += _fetch_chunks(
+        _collect(theirs, weather_cache.wait_many(_keys(theirs)), values), values
+    )
+
+    if force_refresh and errors:
+        raise errors[0]
+    return [_blend(c, values) for c in covering]
+
+
+async def fetch_precipitation_24h_many_async(
+    coords: Sequence[Tuple[float, float]],
+    interpolate: bool = WEATHER_INTERPOLATE,
+) -> List[float]:
+    """
+    Async variant of `fetch_precipitation_24h_many`; chunks run concurrently
+    """
+    # Cache and lease round trips may reach the shared tier: keep them off the loop
+    covering, values, missing = await asyncio.to_thread(
+        _split_cached, coords, False, interpolate
+    )
+    mine, theirs = await asyncio.to_thread(_claim, missing, values)
+    try:
+        await _fetch_chunks_async(mine, values)
+    finally:
+        await asyncio.to_thread(_release, mine)
+    await _fetch_chunks_async(
+        _collect(theirs, await weather_cache.wait_many_async(_keys(theirs)), values),
+        values,
+    )
+
+    return [_blend(c, values) for c in covering]
+
+
+def precipitation_degraded(
+    coords: Sequence[Tuple[float, float]],
+    interpolate: bool = WEATHER_INTERPOLATE,
+) -> bool:
+    """True if any point's current value rests on a degraded fallback"""
+    tiles = {
+        tile
+        for lat, lon in coords
+        for tile, _ in _covering_tiles(lat, lon, interpolate)
+    }
+    return any(weather_cache.is_degraded(_cache_key(t)) for t in tiles)
+
+
+# --------------------
+# Tiles
+# --------------------
+def _cache_key(tile: Tile) -> Tuple[float, int, int]:
+    # The tile size is part of the key so differently sized grids never mix
+    return (WEATHER_TILE_DEG, *tile)
+
+
+def _tile_center(tile: Tile) -> Tuple[float, float]:
+    i, j = tile
+    return (round(i * WEATHER_TILE_DEG, 5), round(j * WEATHER_TILE_DEG, 5))
+
+
+def _covering_tiles(
+    lat: float,
+    lon: float,
+    interpolate: bool,
+) -> List[Tuple[Tile, float]]:
+    """Tiles answering (lat, lon) with their blend weights"""
+    y, x = lat / WEATHER_TILE_DEG, lon / WEATHER_TILE_DEG
+    if not interpolate:
+        return [((math.floor(y + 0.5), math.floor(x + 0.5)), 1.0)]
+
+    # Bilinear between the four surrounding tile centres
+    i, j = math.floor(y), math.floor(x)
+    fy, fx = y - i, x - j
+    corners = (
+        ((i, j), (1 - fy) * (1 - fx)),
+        ((i + 1, j), fy * (1 - fx)),
+        ((i, j + 1), (1 - fy) * fx),
+        ((i + 1, j + 1), fy * fx),
+    )
+    return [(tile, w) for tile, w in corners if w > _MIN_WEIGHT]
+
+
+def _blend(covering: List[Tuple[Tile, float]], values: Dict[Tile, float]) -> float:
+    if len(covering) == 1:
+        return values[covering[0][0]]
+    total = sum(w for _, w in covering)
+    return sum(w * values[tile] for tile, w in covering) / total
+
+
+def _tile_precipitation(tile: Tile) -> float:
+    try:
+        return weather_cache.get_or_load(
+            _cache_key(tile),
+            lambda: _request_precipitation_many([_tile_center(tile)])[0],
+        )
+    except Exception:
+        return _degrade([tile])[0]
+
 
-    if weather_cache.exists(key):
-        return weather_cache.get(key)
+async def _tile_precipitation_async(tile: Tile) -> float:
+    async def _load():
+        return (await _request_precipitation_many_async([_tile_center(tile)]))[0]
 
-    params = {
-        "latitude": lat,
-        "longitude": lon,
+    try:
+        return await weather_cache.get_or_load_async(_cache_key(tile), _load)
+    except Exception:
+        return (await asyncio.to_thread(_degrade, [tile]))[0]
+
+
+def _split_cached(
+    coords: Sequence[Tuple[float, float]],
+    force_refresh: bool = False,
+    interpolate: bool = WEATHER_INTERPOLATE,
+):
+    covering = [_covering_tiles(lat, lon, interpolate) for lat, lon in coords]
+    values: Dict[Tile, float] = {}
+    missing: List[Tile] = []
+
+    tiles = list(dict.fromkeys(t for c in covering for t, _ in c))
+    cached = {} if force_refresh else weather_cache.get_many(_keys(tiles))
+    for tile in tiles:
+        value = cached.get(_cache_key(tile))
+        if value is None:
+            missing.append(tile)
+        else:
+            values[tile] = value
+
+    return covering, values, missing
+
+
+def _keys(tiles) -> List[Tuple[float, int, int]]:
+    return [_cache_key(t) for t in tiles]
+
+
+def _claim(missing: List[Tile], values: Dict[Tile, float]):
+    # Split missing tiles between this worker and others loading them
+    # already; tiles that landed in the shared cache meanwhile are done
+    found, mine, theirs = weather_cache.claim_many(_keys(missing))
+    by_key = dict(zip(_keys(missing), missing))
+    values.update((by_key[k], v) for k, v in found.items())
+    return [by_key[k] for k in mine], [by_key[k] for k in theirs]
+
+
+def _release(tiles: List[Tile]):
+    weather_cache.release_many(_keys(tiles))
+
+
+def _collect(tiles: List[Tile], found: Dict, values: Dict[Tile, float]) -> List[Tile]:
+    # Take the values other workers loaded; return the tiles still missing
+    left = []
+    for tile in tiles:
+        value = found.get(_cache_key(tile))
+        if value is None:
+            left.append(tile)
+        else:
+            values[tile] = value
+    return left
+
+
+def _fetch_chunks(tiles: List[Tile], values: Dict[Tile, float]) -> List[Exception]:
+    # Failed chunks are degraded in place; their errors are returned
+    errors = []
+    for chunk in _chunks(tiles):
+        try:
+            totals = _request_precipitation_many([_tile_center(t) for t in chunk])
+        except Exception as exc:
+            values.update(zip(chunk, _degrade(chunk)))
+            errors.append(exc)
+            continue
+        _store(chunk, totals, values)
+    return errors
+
+
+async def _fetch_chunks_async(tiles: List[Tile], values: Dict[Tile, float]):
+    # Chunks run concurrently
+    chunks = list(_chunks(tiles))
+    responses = await asyncio.gather(
+        *(
+            _request_precipitation_many_async([_tile_center(t) for t in c])
+            for c in chunks
+        ),
+        return_exceptions=True,
+    )
+    await asyncio.to_thread(_store_responses, chunks, responses, values)
+
+
+def _store_responses(chunks, responses, values):
+    for chunk, totals in zip(chunks, responses):
+        if isinstance(totals, BaseException):
+            values.update(zip(chunk, _degrade(chunk)))
+            continue
+        _store(chunk, totals, values)
+
+
+def _chunks(tiles: List[Tile]):
+    for i in range(0, len(tiles), WEATHER_BATCH_SIZE):
+        yield tiles[i:i + WEATHER_BATCH_SIZE]
+
+
+def _store(chunk, totals, values):
+    weather_cache.set_many(zip(_keys(chunk), totals))
+    values.update(zip(chunk, totals))
+
+
+def _degrade(tiles) -> List[float]:
+    # Keep the last known value, briefly, so the next call retries
+    keys = _keys(tiles)
+    values = [weather_cache.peek(key, 0.0) for key in keys]
+    weather_cache.set_many(zip(keys, values), ttl=DEGRADED_TTL_S, degraded=True)
+    return values
+
+
+# --------------------
+# Open-Meteo
+# --------------------
+def _request_params(coords: Sequence[Tuple[float, float]]) -> Dict:
+    return {
+        "latitude": ",".join(str(lat) for lat, _ in coords),
+        "longitude": ",".join(str(lon) for _, lon in coords),
         "hourly": "precipitation",
         "past_days": 1,
         "timezone": "UTC",
     }
 
-    try:
-        resp = requests.get(OPEN_METEO_URL, params=params, timeout=10)
+
+def _request_precipitation_many(
+    coords: Sequence[Tuple[float, float]],
+) -> List[float]:
+    with weather_breaker:
+        weather_bucket.acquire(max_wait=remaining_budget())
+        resp = get_session().get(
+            OPEN_METEO_URL,
+            params=_request_params(coords),
+            timeout=upstream_timeout(WEATHER_TIMEOUT_S),
+        )
         resp.raise_for_status()
         data = resp.json()
+    return _parse_locations(data, len(coords))
 
-        hourly = data.get("hourly", {}).get("precipitation", [])
-        total = float(sum(hourly)) if isinstance(hourly, list) else 0.0
 
-        weather_cache.set(key, total)
-        return total
+async def _request_precipitation_many_async(
+    coords: Sequence[Tuple[float, float]],
+) -> List[float]:
+    with weather_breaker:
+        await weather_bucket.acquire_async(max_wait=remaining_budget())
+        resp = await get_async_client().get(
+            OPEN_METEO_URL,
+            params=_request_params(coords),
+            timeout=upstream_timeout(WEATHER_TIMEOUT_S),
+        )
+        resp.raise_for_status()
+        data = resp.json()
+    return _parse_locations(data, len(coords))
 
-    except Exception:
-        weather_cache.set(key, 0.0)
+
+def _parse_locations(data, expected: int) -> List[float]:
+    # A single location comes back as an object, several as a list
+    locations = data if isinstance(data, list) else [data]
+    if len(locations) != expected:
+        raise ValueError("Open-Meteo returned a mismatched location count")
+
+    return [_total_precipitation(loc) for loc in locations]
+
+
+def _total_precipitation(location: Dict) -> float:
+    hourly = location.get("hourly", {}).get("precipitation", [])
+    if not isinstance(hourly, list):
         return 0.0
+    return float(sum(h for h in hourly if h is not None))
@@ -2,14 +2,24 @@
 District graph construction
 """
 
+import asyncio
 import networkx as nx
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
 from app.data.districts import get_all_districts
-from app.data_sources.nominatim import geocode_district
-from app.data_sources.weather import fetch_precipitation_24h
-from app.data_sources.earthquakes import max_magnitude_near
-from app.utils.geo import haversine_km
+from app.data_sources.nominatim import geocode_degraded, geocode_district
+from app.data_sources.weather import (
+    fetch_precipitation_24h_many,
+    fetch_precipitation_24h_many_async,
+    precipitation_degraded,
+)
+from app.data_sources.earthquakes import (
+    earthquakes_degraded,
+    fetch_recent_earthquakes,
+    fetch_recent_earthquakes_async,
+    node_quake_magnitudes,
+)
+from app.utils.geo import pairs_within_km
 
 MAX_EDGE_DISTANCE_KM = 120.0  # adjacency threshold
 
@@ -17,6 +27,9 @@ MAX_EDGE_DISTANCE_KM = 120.0  # adjacency threshold
 def build_district_graph() -> Tuple[nx.Graph, Dict[str, Tuple[float, float]]]:
     """
     Build graph with districts as nodes and edges based on geographic proximity
+
+    G.graph["geocode_fallbacks"] names the districts placed at fallback
+    coordinates because Nominatim failed.
     """
     G = nx.Graph()
     positions: Dict[str, Tuple[float, float]] = {}
@@ -40,24 +53,24 @@ def build_district_graph() -> Tuple[nx.Graph, Dict[str, Tuple[float, float]]]:
             blocked=False,
         )
 
+    G.graph["geocode_fallbacks"] = frozenset(d for d in positions if geocode_degraded(d))
+
     # --------------------
     # Add edges (distance-limited)
     # --------------------
     nodes = list(G.nodes)
-    for i in range(len(nodes)):
-        for j in range(i + 1, len(nodes)):
-            a, b = nodes[i], nodes[j]
-            la, lo = positions[a]
-            lb, lo2 = positions[b]
-
-            dist = haversine_km(la, lo, lb, lo2)
-            if dist <= MAX_EDGE_DISTANCE_KM:
-                G.add_edge(
-                    a,
-                    b,
-                    base_distance_km=dist,
-                    weight=dist,
-                )
+    ii, jj, dists = pairs_within_km(
+        [positions[n][0] for n in nodes],
+        [positions[n][1] for n in nodes],
+        MAX_EDGE_DISTANCE_KM,
+    )
+    for i, j, dist in zip(ii.tolist(), jj.tolist(), dists.tolist()):
+        G.add_edge(
+            nodes[i],
+            nodes[j],
+            base_distance_km=dist,
+            weight=dist,
+        )
 
     return G, positions
 
@@ -66,18 +79,73 @@ def enrich_graph_with_live_data(G: nx.Graph) -> nx.Graph:
     """
     Attach live weather & earthquake data to nodes
     """
-    for node, attrs in G.nodes(data=True):
-        lat, lon = attrs["lat"], attrs["lon"]
+    nodes = list(G.nodes(data=True))
 
-        try:
-            attrs["precipitation_24h"] = fetch_precipitation_24h(lat, lon)
-        except Exception:
-            attrs["precipitation_24h"] = 0.0
+    try:
+        precipitation = fetch_precipitation_24h_many(_node_coords(nodes))
+    except Exception:
+        precipitation = None
 
-        try:
-            attrs["quake_mag"] = max_magnitude_near(lat, lon)
-        except Exception:
-            attrs["quake_mag"] = 0.0
+    try:
+        quakes = fetch_recent_earthquakes()
+    except Exception:
+        quakes = None
 
+    _apply_live_data(G, nodes, precipitation, quakes)
     return G
 
+
+async def enrich_graph_with_live_data_async(G: nx.Graph) -> nx.Graph:
+    """
+    Async variant of `enrich_graph_with_live_data`
+
+    Weather and earthquake lookups run concurrently.
+    """
+    nodes = list(G.nodes(data=True))
+
+    precipitation, quakes = await asyncio.gather(
+        fetch_precipitation_24h_many_async(_node_coords(nodes)),
+        fetch_recent_earthquakes_async(),
+        return_exceptions=True,
+    )
+    if isinstance(precipitation, BaseException):
+        precipitation = None
+    if isinstance(quakes, BaseException):
+        quakes = None
+
+    _apply_live_data(G, nodes, precipitation, quakes)
+    return G
+
+
+def _node_coords(nodes) -> List[Tuple[float, float]]:
+    return [(attrs["lat"], attrs["lon"]) for _, attrs in nodes]
+
+
+def _apply_live_data(G, nodes, precipitation, quakes):
+    coords = _node_coords(nodes)
+    # Derived afresh for every snapshot; the topology only reports whether
+    # its own coordinates are fallbacks
+    degraded = set()
+    if G.graph.get("geocode_fallbacks"):
+        degraded.add("nominatim")
+    if precipitation is None or precipitation_degraded(coords):
+        degraded.add("open_meteo")
+    if quakes is None or earthquakes_degraded():
+        degraded.add("usgs")
+    G.graph["degraded"] = frozenset(degraded)
+
+    if precipitation is None:
+        precipitation = [0.0] * len(nodes)
+
+    magnitudes = None
+    if quakes is not None:
+        try:
+            magnitudes = node_quake_magnitudes(coords, quakes=quakes)
+        except Exception:
+            magnitudes = None
+    if magnitudes is None:
+        magnitudes = [0.0] * len(nodes)
+
+    for (node, attrs), precip, mag in zip(nodes, precipitation, magnitudes):
+        attrs["precipitation_24h"] = precip
+        attrs["quake_mag"] = mag
@@ -0,0 +1,401 @@
+"""
+Snapshot bundles: a startup cache shared by worker processes
+
+One process per host (whichever holds the writer lock) builds snapshots
+and writes each one to a single binary file; every other worker loads new
+versions from it as they appear, without contacting any upstream or
+rescoring nodes. Loading maps the file, copies it into the worker's own
+graph and unmaps it again, so a bundle saves startup and refresh work, not
+memory: each worker still holds a full graph. Opt-in through
+SAFEROUTEX_SNAPSHOT_BUNDLE=1.
+
+Layout (little-endian):
+
+    magic        8 bytes   b"SRXSNAP\\0"
+    format       uint32
+    reserved     uint32
+    header_len   uint64
+    header       JSON      array table + metadata, padded to ALIGN
+    arrays       raw       each at an ALIGN-aligned offset from the start
+
+The graph is stored as CSR arrays (indptr, indices, one column per edge
+attribute), nodes as one column per attribute, and precomputed node risk
+next to them. Strings are packed as UTF-8 bytes plus an offsets array.
+Files are replaced atomically, so a reader never sees a partial bundle
+and keeps its old mapping valid until it lets go of it.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import networkx as nx
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None
+
+MAGIC = b"SRXSNAP\0"
+FORMAT_VERSION = 1
+ALIGN = 64
+
+_PREAMBLE = struct.Struct("<8sIIQ")
+
+
+class BundleFormatError(ValueError):
+    """Raised for files that are not bundles of a supported format"""
+
+
+# --------------------
+# Writing
+# --------------------
+def write_bundle(
+    path: str,
+    snapshot,
+    safehouses: Optional[Sequence[Dict]] = None,
+    safehouses_degraded: bool = False,
+) -> int:
+    """
+    Write `snapshot` (and the safehouse set) to `path` atomically
+
+    Node names must be strings. Returns the file size in bytes.
+    """
+    G = snapshot.graph
+    nodes = list(G.nodes)
+    if not all(isinstance(n, str) for n in nodes):
+        raise TypeError("bundles need string node names")
+    index = {n: i for i, n in enumerate(nodes)}
+
+    arrays: Dict[str, np.ndarray] = {}
+    _put_strings(arrays, "node", nodes)
+
+    node_attrs = _columns(arrays, "node_attr", [G.nodes[n] for n in nodes])
+
+    # CSR over every arc; undirected edges appear in both directions
+    adj = G.succ if G.is_directed() else G.adj
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    heads: List[int] = []
+    edge_dicts: List[Dict] = []
+    for i, n in enumerate(nodes):
+        for nbr, attrs in adj[n].items():
+            heads.append(index[nbr])
+            edge_dicts.append(attrs)
+        indptr[i + 1] = len(heads)
+    arrays["indptr"] = indptr
+    arrays["indices"] = np.array(heads, dtype=np.int32)
+    edge_attrs = _columns(arrays, "edge_attr", edge_dicts)
+
+    overlay = snapshot.overlay
+    arrays["risk"] = np.array([overlay.node_risk[n] for n in nodes], dtype=np.float64)
+    arrays["risk_blocked"] = np.array(
+        [n in overlay.blocked_nodes for n in nodes], dtype=np.bool_
+    )
+
+    pos_names = list(snapshot.positions)
+    _put_strings(arrays, "pos", pos_names)
+    arrays["pos_lat"] = np.array([snapshot.positions[p][0] for p in pos_names], dtype=np.float64)
+    arrays["pos_lon"] = np.array([snapshot.positions[p][1] for p in pos_names], dtype=np.float64)
+
+    if safehouses is not None:
+        _put_strings(arrays, "safehouse_name", [str(s["name"]) for s in safehouses])
+        _put_strings(arrays, "safehouse_type", [str(s.get("type") or "") for s in safehouses])
+        arrays["safehouse_lat"] = np.array([s["lat"] for s in safehouses], dtype=np.float64)
+        arrays["safehouse_lon"] = np.array([s["lon"] for s in safehouses], dtype=np.float64)
+
+    meta = {
+        "built_at": snapshot.built_at,
+        "writer_version": snapshot.version,
+        "directed": G.is_directed(),
+        "degraded": sorted(snapshot.degraded),
+        "topology": _topology_digest(nodes, indptr, arrays["indices"]),
+        "node_attrs": node_attrs,
+        "edge_attrs": edge_attrs,
+        "has_safehouses": safehouses is not None,
+        "safehouses_degraded": bool(safehouses_degraded),
+    }
+    return _write_file(path, meta, arrays)
+
+
+def _put_strings(arrays: Dict[str, np.ndarray], name: str, values: Sequence[str]):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    arrays[f"{name}.utf8"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    arrays[f"{name}.offsets"] = offsets
+
+
+def _columns(arrays: Dict[str, np.ndarray], prefix: str, dicts: List[Dict]) -> Dict[str, str]:
+    # One column per attribute of the first dict: "float", "bool" or "str"
+    kinds: Dict[str, str] = {}
+    for key, value in (dicts[0].items() if dicts else ()):
+        if isinstance(value, bool):
+            kinds[key] = "bool"
+            arrays[f"{prefix}.{key}"] = np.array([d[key] for d in dicts], dtype=np.bool_)
+        elif isinstance(value, (int, float)):
+            kinds[key] = "float"
+            arrays[f"{prefix}.{key}"] = np.array([d[key] for d in dicts], dtype=np.float64)
+        elif isinstance(value, str):
+            kinds[key] = "str"
+            _put_strings(arrays, f"{prefix}.{key}", [d[key] for d in dicts])
+    return kinds
+
+
+def _topology_digest(nodes: List[str], indptr: np.ndarray, indices: np.ndarray) -> str:
+    h = hashlib.sha1()
+    h.update("\0".join(nodes).encode("utf-8"))
+    h.update(indptr.tobytes())
+    h.update(indices.tobytes())
+    return h.hexdigest()
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+def _write_file(path: str, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> int:
+    # Offsets depend on the header length, which depends on the offsets;
+    # size the header with placeholder offsets first, then fix them
+    table = {
+        name: {"dtype": a.dtype.str, "shape": list(a.shape), "offset": 0}
+        for name, a in arrays.items()
+    }
+    header = dict(meta, arrays=table)
+    reserve = len(json.dumps(header).encode("utf-8")) + 20 * len(arrays) + 64
+
+    offset = _aligned(_PREAMBLE.size + reserve)
+    for name, a in arrays.items():
+        table[name]["offset"] = offset
+        offset = _aligned(offset + a.nbytes)
+    raw = json.dumps(header).encode("utf-8").ljust(reserve, b" ")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, len(raw)))
+            f.write(raw)
+            for name, a in arrays.items():
+                f.seek(table[name]["offset"])
+                f.write(np.ascontiguousarray(a).tobytes())
+            f.truncate(max(offset, f.tell()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return offset
+
+
+# --------------------
+# Reading
+# --------------------
+class SnapshotBundle:
+    """
+    Read-only mapping of one bundle file
+
+    Arrays are zero-copy views into the mapping; the graph and dicts built
+    from them are per-process copies, so the mapping can be closed once
+    they are built.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        if len(self._mm) < _PREAMBLE.size:
+            raise BundleFormatError(f"{path} is too short")
+        magic, fmt, _, header_len = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise BundleFormatError(f"{path} is not a format {FORMAT_VERSION} bundle")
+        start = _PREAMBLE.size
+        self.meta: Dict[str, Any] = json.loads(self._mm[start:start + header_len])
+        self._table = self.meta["arrays"]
+
+    @property
+    def built_at(self) -> float:
+        return self.meta["built_at"]
+
+    @property
+    def topology(self) -> str:
+        return self.meta["topology"]
+
+    @property
+    def nbytes(self) -> int:
+        return self.stamp[2]
+
+    def close(self):
+        """Unmap the file; views still referencing it keep it mapped until freed"""
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+
+    def array(self, name: str) -> np.ndarray:
+        spec = self._table[name]
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        return np.frombuffer(
+            self._mm, dtype=dtype, count=count, offset=spec["offset"]
+        ).reshape(spec["shape"])
+
+    def strings(self, name: str) -> List[str]:
+        data = self.array(f"{name}.utf8").tobytes()
+        offsets = self.array(f"{name}.offsets").tolist()
+        return [data[a:b].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+
+    def graph(self) -> nx.Graph:
+        """The enriched graph, rebuilt from the CSR arrays"""
+        directed = self.meta["directed"]
+        G = nx.DiGraph() if directed else nx.Graph()
+        nodes = self.strings("node")
+        node_cols = self._read_columns("node_attr", self.meta["node_attrs"])
+        keys = list(node_cols)
+        G.add_nodes_from(
+            (n, dict(zip(keys, values)))
+            for n, *values in zip(nodes, *node_cols.values())
+        )
+
+        # An undirected edge is stored as two arcs; add it from its lower end
+        indptr = self.array("indptr")
+        indices = self.array("indices")
+        tails = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+        arcs = np.arange(len(indices)) if directed else np.flatnonzero(tails <= indices)
+        edge_cols = self._read_columns("edge_attr", self.meta["edge_attrs"], arcs)
+        keys = list(edge_cols)
+        G.add_edges_from(
+            (nodes[u], nodes[v], dict(zip(keys, values)))
+            for u, v, *values in zip(
+                tails[arcs].tolist(), indices[arcs].tolist(), *edge_cols.values()
+            )
+        )
+
+        G.graph["degraded"] = frozenset(self.meta["degraded"])
+        return G
+
+    def node_scores(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Precomputed (risk, blocked) in graph node order, copied out"""
+        return self.array("risk").copy(), self.array("risk_blocked").copy()
+
+    def positions(self) -> Dict[str, Tuple[float, float]]:
+        names = self.strings("pos")
+        lat, lon = self.array("pos_lat").tolist(), self.array("pos_lon").tolist()
+        return {n: (a, b) for n, a, b in zip(names, lat, lon)}
+
+    def safehouses(self) -> Optional[List[Dict]]:
+        if not self.meta["has_safehouses"]:
+            return None
+        names = self.strings("safehouse_name")
+        types = self.strings("safehouse_type")
+        lat = self.array("safehouse_lat").tolist()
+        lon = self.array("safehouse_lon").tolist()
+        return [
+            {"name": n, "lat": a, "lon": b, "type": t or None}
+            for n, t, a, b in zip(names, types, lat, lon)
+        ]
+
+    def _read_columns(
+        self,
+        prefix: str,
+        kinds: Dict[str, str],
+        rows: Optional[np.ndarray] = None,
+    ) -> Dict[str, List]:
+        cols = {}
+        for key, kind in kinds.items():
+            if kind == "str":
+                values = self.strings(f"{prefix}.{key}")
+                cols[key] = values if rows is None else [values[i] for i in rows.tolist()]
+            else:
+                values = self.array(f"{prefix}.{key}")
+                cols[key] = (values if rows is None else values[rows]).tolist()
+        return cols
+
+
+# --------------------
+# Sharing between workers
+# --------------------
+class BundleChannel:
+    """
+    Writer election and change detection for one bundle path
+
+    The writer is whichever process first takes an exclusive lock on
+    `path + ".lock"`; it keeps the lock until it exits, and a follower
+    that polls afterwards takes over. Followers only load files whose
+    (inode, mtime, size) changed and that are younger than `max_age_s`.
+    """
+
+    def __init__(self, path: str, max_age_s: float):
+        self.path = path
+        self.max_age_s = max_age_s
+        self.leader = fcntl is None  # no locking: every process builds
+        self.written = 0
+        self.loaded = 0
+        self._lock_fd: Optional[int] = None
+        self._seen: Optional[Tuple[int, int, int]] = None
+        self._last: Optional[Tuple[int, float]] = None  # (bytes, built_at)
+
+    def try_lead(self) -> bool:
+        """True if this process is (now) the writer"""
+        if self.leader:
+            return True
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if self._lock_fd is None:
+                self._lock_fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self.leader = True
+        return True
+
+    def publish(self, snapshot, safehouses=None, safehouses_degraded: bool = False):
+        write_bundle(self.path, snapshot, safehouses, safehouses_degraded)
+        self.written += 1
+
+    def poll(self) -> Optional[SnapshotBundle]:
+        """
+        A newer bundle than the last one returned, or None
+
+        The caller owns the bundle and closes it once adopted.
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._seen:
+            return None
+
+        try:
+            bundle = SnapshotBundle(self.path)
+        except (OSError, ValueError, KeyError):
+            return None
+        self._seen = bundle.stamp
+        if time.time() - bundle.built_at > self.max_age_s:
+            bundle.close()
+            return None
+
+        self._last = (bundle.nbytes, bundle.built_at)
+        self.loaded += 1
+        return bundle
+
+    def stats(self) -> Dict[str, Any]:
+        last = self._last
+        return {
+            "path": self.path,
+            "role": "writer" if self.leader else "follower",
+            "written": self.written,
+            "loaded": self.loaded,
+            "bundle_bytes": last[0] if last else None,
+            "built_at": last[1] if last else None,
+        }
@@ -2,49 +2,253 @@
 Graph filtering & risk-aware edge weighting
 """
 
+import threading
 import networkx as nx
-from typing import List
+import numpy as np
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
 
-from app.risk.scoring import total_risk_score, is_blocked
+from app.risk.scoring import node_columns, score_nodes
 
+BLOCKED_TYPE_PENALTY = 25.0
+RISK_PENALTY_FACTOR = 0.1
 
-def apply_risk_weights(
-    G: nx.Graph,
-    blocked_disaster_types: List[str] | None = None,
-    remove_blocked_nodes: bool = False,
-    start: str | None = None,
-    end: str | None = None,
-) -> nx.Graph:
+EdgeKey = Tuple[Hashable, Hashable]
+WeightFn = Callable[[Hashable, Hashable, Dict], float]
+
+
+@dataclass(frozen=True)
+class RiskDiff:
     """
-    Apply risk-based penalties to edges and optionally remove blocked nodes
+    Nodes whose routing inputs changed since the previous overlay
+
+    `full` means there was no comparable previous overlay (first build or
+    a new topology), so everything derived from the graph is stale.
     """
-    if blocked_disaster_types is None:
-        blocked_disaster_types = []
+    risk_changed: FrozenSet[Hashable] = frozenset()
+    blocked_changed: FrozenSet[Hashable] = frozenset()
+    type_changed: FrozenSet[Hashable] = frozenset()
+    full: bool = False
+
+    @property
+    def nodes(self) -> FrozenSet[Hashable]:
+        return self.risk_changed | self.blocked_changed | self.type_changed
+
+    def touches(self, nodes: Iterable[Hashable]) -> bool:
+        """True if anything derived from `nodes` may be stale"""
+        return self.full or not self.nodes.isdisjoint(nodes)
+
+
+FULL_DIFF = RiskDiff(full=True)
+
+
+class RiskOverlay:
+    """
+    Risk-weighted, read-only view over a shared base graph
+
+    Built once per graph snapshot: node risk and the risk-penalised edge
+    weights are computed up front. Each blocked-disaster-type scenario only
+    stores the edges whose weight differs from the base, and blocked-node
+    removal is a subgraph view, so concurrent requests never copy the graph.
+
+    Given the overlay of the previous snapshot of the same topology, only
+    edges next to nodes whose inputs changed are recomputed, untouched
+    scenarios carry over, and `diff` records what changed.
+
+    `scores` passes precomputed (risk, blocked) arrays in G.nodes order,
+    e.g. from a snapshot bundle, instead of scoring the nodes again.
+    """
+
+    def __init__(
+        self,
+        G: nx.Graph,
+        previous: Optional["RiskOverlay"] = None,
+        scores: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    ):
+        self.graph = G
+        nodes = list(G.nodes)
+        if scores is None:
+            scores = score_nodes(*node_columns(G.nodes[n] for n in nodes))
+        risk, blocked = scores
+        self.node_risk: Dict[Hashable, float] = dict(zip(nodes, risk.tolist()))
+        self.blocked_nodes: FrozenSet[Hashable] = frozenset(
+            n for n, b in zip(nodes, blocked.tolist()) if b
+        )
+        self._disaster_type = {
+            n: attrs.get("disaster_type") for n, attrs in G.nodes(data=True)
+        }
+        self._scenarios: Dict[FrozenSet[str], Dict[EdgeKey, float]] = {}
+        self._lock = threading.Lock()
+
+        if previous is not None and not self._same_topology(previous):
+            previous = None
+        if previous is None:
+            self.diff = FULL_DIFF
+            self.base_weights: Dict[EdgeKey, float] = {}
+            for u, v, attrs in G.edges(data=True):
+                self._set_base_weight(u, v, attrs)
+            return
+
+        self.diff = self._diff_from(previous)
+        self.base_weights = dict(previous.base_weights)
+        for n in self.diff.risk_changed:
+            for nbr, attrs in G.adj[n].items():
+                self._set_base_weight(n, nbr, attrs)
+        self._carry_scenarios(previous)
 
-    H = G.copy()
+    def _set_base_weight(self, u, v, attrs):
+        # Both orientations so weight lookups need no canonical ordering
+        w = attrs["base_distance_km"] + RISK_PENALTY_FACTOR * (
+            self.node_risk[u] + self.node_risk[v]
+        )
+        self.base_weights[u, v] = w
+        self.base_weights[v, u] = w
 
     # --------------------
-    # Remove blocked nodes
+    # Incremental rebuild
     # --------------------
-    if remove_blocked_nodes:
-        for node, attrs in list(H.nodes(data=True)):
-            if is_blocked(attrs) and node not in {start, end}:
-                H.remove_node(node)
+    def _same_topology(self, previous: "RiskOverlay") -> bool:
+        return (
+            previous.node_risk.keys() == self.node_risk.keys()
+            and previous.graph.number_of_edges() == self.graph.number_of_edges()
+        )
+
+    def _diff_from(self, previous: "RiskOverlay") -> RiskDiff:
+        old_risk, old_type = previous.node_risk, previous._disaster_type
+        return RiskDiff(
+            risk_changed=frozenset(
+                n for n, r in self.node_risk.items() if old_risk[n] != r
+            ),
+            blocked_changed=self.blocked_nodes ^ previous.blocked_nodes,
+            type_changed=frozenset(
+                n for n, t in self._disaster_type.items() if old_type[n] != t
+            ),
+        )
+
+    def _carry_scenarios(self, previous: "RiskOverlay"):
+        # A scenario's deltas cover every edge of its penalised nodes, so
+        # it is unaffected unless a changed node appears in one of them
+        if self.diff.type_changed:
+            return
+        changed = self.diff.risk_changed
+        with previous._lock:
+            scenarios = dict(previous._scenarios)
+        for key, deltas in scenarios.items():
+            if not any(u in changed for u, _ in deltas):
+                self._scenarios[key] = deltas
 
     # --------------------
-    # Reweight edges
+    # Scenarios
     # --------------------
-    for u, v, attrs in H.edges(data=True):
-        ru = total_risk_score(H.nodes[u])
-        rv = total_risk_score(H.nodes[v])
+    def scenario_deltas(
+        self,
+        blocked_disaster_types: Iterable[str] | None = None,
+    ) -> Dict[EdgeKey, float]:
+        """
+        Edge weights that differ from the base for a blocked-type scenario
+        """
+        key = frozenset(blocked_disaster_types or ())
+        deltas = self._scenarios.get(key)
+        if deltas is None:
+            with self._lock:
+                deltas = self._scenarios.get(key)
+                if deltas is None:
+                    deltas = self._compute_deltas(key)
+                    self._scenarios[key] = deltas
+        return deltas
+
+    def _compute_deltas(self, blocked: FrozenSet[str]) -> Dict[EdgeKey, float]:
+        deltas: Dict[EdgeKey, float] = {}
+        if not blocked:
+            return deltas
 
-        penalty = 0.1 * (ru + rv)
+        penalised = [n for n, t in self._disaster_type.items() if t in blocked]
+        for n in penalised:
+            for nbr, attrs in self.graph.adj[n].items():
+                # Same operation order as the original per-copy reweighting
+                penalty = RISK_PENALTY_FACTOR * (
+                    self.node_risk[n] + self.node_risk[nbr]
+                )
+                if self._disaster_type[n] in blocked:
+                    penalty += BLOCKED_TYPE_PENALTY
+                if self._disaster_type[nbr] in blocked:
+                    penalty += BLOCKED_TYPE_PENALTY
 
-        if H.nodes[u].get("disaster_type") in blocked_disaster_types:
-            penalty += 25.0
-        if H.nodes[v].get("disaster_type") in blocked_disaster_types:
-            penalty += 25.0
+                w = attrs["base_distance_km"] + penalty
+                deltas[n, nbr] = w
+                deltas[nbr, n] = w
+        return deltas
 
-        attrs["weight"] = attrs["base_distance_km"] + penalty
+    def weight_fn(
+        self,
+        blocked_disaster_types: Iterable[str] | None = None,
+    ) -> WeightFn:
+        """
+        NetworkX-compatible weight function for a scenario
+        """
+        base = self.base_weights
+        deltas = self.scenario_deltas(blocked_disaster_types)
+
+        if not deltas:
+            return lambda u, v, d: base[u, v]
+        return lambda u, v, d: deltas.get((u, v), base[u, v])
+
+    # --------------------
+    # Topology
+    # --------------------
+    def view(
+        self,
+        remove_blocked_nodes: bool = False,
+        start: str | None = None,
+        end: str | None = None,
+    ) -> nx.Graph:
+        """
+        Base graph, or a subgraph view hiding blocked nodes
+        """
+        if not remove_blocked_nodes:
+            return self.graph
+
+        hidden = self.blocked_nodes - {start, end}
+        if not hidden:
+            return self.graph
+        return nx.restricted_view(self.graph, hidden, [])
+
+    def routing_inputs(
+        self,
+        blocked_disaster_types: List[str] | None = None,
+        remove_blocked_nodes: bool = False,
+        start: str | None = None,
+        end: str | None = None,
+    ) -> Tuple[nx.Graph, WeightFn]:
+        """
+        (graph view, weight function) pair for one routing request
+        """
+        return (
+            self.view(remove_blocked_nodes, start, end),
+            self.weight_fn(blocked_disaster_types),
+        )
+
+
+def apply_risk_weights(
+    G: nx.Graph,
+    blocked_disaster_types: List[str] | None = None,
+    remove_blocked_nodes: bool = False,
+    start: str | None = None,
+    end: str | None = None,
+) -> nx.Graph:
+    """
+    Apply risk-based penalties to edges and optionally remove blocked nodes
+
+    Materialises a weighted copy of the graph. Request paths should use a
+    snapshot's RiskOverlay instead, which avoids the copy.
+    """
+    overlay = RiskOverlay(G)
+    view, weight = overlay.routing_inputs(
+        blocked_disaster_types, remove_blocked_nodes, start, end
+    )
+
+    H = view.copy()
+    for u, v, attrs in H.edges(data=True):
+        attrs["weight"] = weight(u, v, attrs)
 
     return H
@@ -0,0 +1,219 @@
+"""
+Background refresh of live data sources
+
+A single daemon thread refetches the USGS feed, per-node precipitation and
+the Overpass safehouse set on their configured intervals, then enriches
+and publishes a new graph snapshot. While some districts sit at fallback
+coordinates, the topology itself is rebuilt to retry geocoding them.
+Request handlers only ever read the published snapshot and warm caches,
+so upstream latency stays off the request path.
+
+A process that follows a snapshot bundle leaves the upstream jobs to the
+bundle's writer and only polls the bundle for new versions; if the writer
+goes away, the next poll promotes this process and its jobs resume.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from app.config.settings import (
+    EARTHQUAKE_REFRESH_INTERVAL_S,
+    GEOCODE_RETRY_INTERVAL_S,
+    WEATHER_REFRESH_INTERVAL_S,
+    SAFEHOUSE_REFRESH_INTERVAL_S,
+    SNAPSHOT_BUNDLE_POLL_S,
+)
+from app.data_sources.earthquakes import fetch_recent_earthquakes
+from app.data_sources.safehouses import fetch_safehouses, fetch_safehouse_index
+from app.data_sources.weather import fetch_precipitation_24h_many
+from app.graph.snapshot import SnapshotManager, snapshot_manager
+
+
+@dataclass
+class RefreshJob:
+    name: str
+    interval_s: float
+    run: Callable[[], None]
+    affects_graph: bool
+    upstream: bool = True
+    next_run: float = 0.0
+    last_refreshed: Optional[float] = None
+    last_duration_s: Optional[float] = None
+    last_error: Optional[str] = None
+    runs: int = 0
+
+
+@dataclass
+class RefreshStatus:
+    sources: Dict[str, Dict] = field(default_factory=dict)
+    snapshot: Dict = field(default_factory=dict)
+
+
+class LiveDataRefresher:
+    """
+    Interval scheduler that keeps live data hot and snapshots current
+    """
+
+    def __init__(self, manager: SnapshotManager = snapshot_manager):
+        self._manager = manager
+        self._jobs: List[RefreshJob] = [
+            RefreshJob(
+                "earthquakes",
+                EARTHQUAKE_REFRESH_INTERVAL_S,
+                self._refresh_earthquakes,
+                affects_graph=True,
+            ),
+            RefreshJob(
+                "weather",
+                WEATHER_REFRESH_INTERVAL_S,
+                self._refresh_weather,
+                affects_graph=True,
+            ),
+            RefreshJob(
+                "safehouses",
+                SAFEHOUSE_REFRESH_INTERVAL_S,
+                self._refresh_safehouses,
+                affects_graph=False,
+            ),
+            RefreshJob(
+                "geocodes",
+                GEOCODE_RETRY_INTERVAL_S,
+                self._retry_geocodes,
+                affects_graph=False,  # publishes itself, only when needed
+            ),
+            RefreshJob(
+                "snapshot_bundle",
+                SNAPSHOT_BUNDLE_POLL_S,
+                self._manager.sync_bundle,
+                affects_graph=False,
+                upstream=False,
+            ),
+        ]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --------------------
+    # Lifecycle
+    # --------------------
+    def start(self):
+        """
+        Start the scheduler; first runs happen one interval from now,
+        on the assumption that startup already warmed every source.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        now = time.monotonic()
+        for job in self._jobs:
+            job.next_run = now + job.interval_s
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop,
+            name="live-data-refresher",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self):
+        """Refresh every source now and publish one new snapshot"""
+        for job in self._jobs:
+            self._run_job(job)
+        self._publish()
+
+    # --------------------
+    # Scheduling
+    # --------------------
+    def _loop(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            due = [j for j in self._jobs if j.next_run <= now]
+            following = self._manager.follows_bundle
+            ran = [j for j in due if not (following and j.upstream)]
+
+            for job in ran:
+                self._run_job(job)
+            for job in due:
+                job.next_run = time.monotonic() + job.interval_s
+
+            if any(j.affects_graph for j in ran):
+                self._publish()
+
+            next_due = min(j.next_run for j in self._jobs)
+            self._stop.wait(max(0.0, next_due - time.monotonic()))
+
+    def _run_job(self, job: RefreshJob):
+        # Sources raise once their degraded fallback is stored, so a failed
+        # run records the error and keeps the last successful refresh time
+        started = time.perf_counter()
+        try:
+            job.run()
+            job.last_error = None
+            job.last_refreshed = time.time()
+        except Exception as exc:
+            job.last_error = repr(exc)
+        job.last_duration_s = time.perf_counter() - started
+        job.runs += 1
+
+    def _publish(self):
+        try:
+            self._manager.refresh()
+        except Exception:
+            pass
+
+    # --------------------
+    # Sources
+    # --------------------
+    def _refresh_earthquakes(self):
+        fetch_recent_earthquakes(force_refresh=True)
+
+    def _refresh_weather(self):
+        G = self._manager.current().graph
+        coords = [(a["lat"], a["lon"]) for _, a in G.nodes(data=True)]
+        fetch_precipitation_24h_many(coords, force_refresh=True)
+
+    def _retry_geocodes(self):
+        if self._manager.current().graph.graph.get("geocode_fallbacks"):
+            self._manager.refresh(rebuild_topology=True)
+
+    def _refresh_safehouses(self):
+        try:
+            fetch_safehouses(force_refresh=True)
+        finally:
+            fetch_safehouse_index()  # rebuild the index off the request path
+
+    # --------------------
+    # Introspection
+    # --------------------
+    def status(self) -> RefreshStatus:
+        """Per source: last successful refresh, last run's duration and error"""
+        status = RefreshStatus()
+        for job in self._jobs:
+            status.sources[job.name] = {
+                "interval_s": job.interval_s,
+                "last_refreshed": job.last_refreshed,
+                "last_duration_s": job.last_duration_s,
+                "last_error": job.last_error,
+                "runs": job.runs,
+            }
+
+        snap = self._manager.current()
+        status.snapshot = {
+            "version": snap.version,
+            "built_at": snap.built_at,
+            "build_seconds": snap.build_seconds,
+            "bundle": self._manager.bundle_status(),
+        }
+        return status
+
+
+# Process-wide refresher shared by the API and the UI
+live_refresher = LiveDataRefresher()
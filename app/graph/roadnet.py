@@ -0,0 +1,512 @@
+"""
+Road-network graph backend
+
+Loads drivable roads from a local OSM extract (.osm.pbf via the optional
+`osmium` package, or a saved Overpass JSON response) into compressed
+sparse row (CSR) arrays:
+
+    indptr[v] .. indptr[v + 1]   arc range of vertex v   (int32)
+    indices[a]                   head vertex of arc a    (int32)
+    length_km[a]                 arc length              (float32)
+
+About 1M arcs take under 20 MB, a small fraction of the same network
+as NetworkX dicts. Searches run directly on the arrays. Districts snap to their
+nearest road vertex, and each vertex takes its risk from the district
+closest to it, so the existing scoring model applies per vertex.
+
+When ROAD_NETWORK_PATH is set, `road_router` draws the API's district
+routes along the roads that join them.
+"""
+
+import heapq
+import json
+import threading
+from collections import OrderedDict
+from math import inf
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+from app.config.settings import (
+    ROAD_BLOCKED_FACTOR,
+    ROAD_HIGHWAY_TYPES,
+    ROAD_NETWORK_PATH,
+    ROAD_RISK_FACTOR,
+)
+from app.risk.scoring import node_columns, score_nodes
+from app.utils.background import LatestWorker
+from app.utils.geo import (
+    HEURISTIC_SLACK,
+    haversine_matrix_chunked,
+    haversine_one_to_many,
+    haversine_paired,
+)
+
+Way = Tuple[List[int], Optional[str]]
+
+# Per-target A* heuristic arrays kept (float32, 4 bytes per vertex each);
+# district legs only ever target the districts' snapped vertices
+HEURISTIC_CACHE_TARGETS = 32
+
+
+class RoadNetwork:
+    """
+    Directed road graph in CSR form, plus district snapping and risk
+    """
+
+    def __init__(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        src: np.ndarray,
+        dst: np.ndarray,
+        osm_ids: np.ndarray | None = None,
+    ):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.osm_ids = osm_ids
+        n = len(self.lat)
+
+        src = np.asarray(src, dtype=np.int32)
+        dst = np.asarray(dst, dtype=np.int32)
+
+        # Sort arcs by tail vertex; drop self-loops and duplicate arcs
+        order = np.lexsort((dst, src))
+        src, dst = src[order], dst[order]
+        keep = src != dst
+        keep[1:] &= (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src, dst = src[keep], dst[keep]
+
+        self.indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(src, minlength=n), out=self.indptr[1:])
+        self.indices = dst
+        self.length_km = haversine_paired(
+            self.lat[src], self.lon[src], self.lat[dst], self.lon[dst]
+        ).astype(np.float32)
+
+        self._component: Optional[np.ndarray] = None
+        self._heuristics: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._heuristic_lock = threading.Lock()
+        self.districts: List[str] = []
+        self.district_vertex: Dict[str, int] = {}
+        self.vertex_district: Optional[np.ndarray] = None
+
+    @property
+    def n_vertices(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def n_arcs(self) -> int:
+        return len(self.indices)
+
+    def nbytes(self) -> int:
+        """Resident size of the array storage"""
+        arrays = [self.lat, self.lon, self.indptr, self.indices, self.length_km,
+                  self.osm_ids, self._component, self.vertex_district]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def arc_tails(self) -> np.ndarray:
+        """Tail vertex of every arc (the COO row array)"""
+        return np.repeat(
+            np.arange(self.n_vertices, dtype=np.int32), np.diff(self.indptr)
+        )
+
+    # --------------------
+    # Loading
+    # --------------------
+    @classmethod
+    def load(cls, path: str) -> "RoadNetwork":
+        """Load a .pbf extract or a saved Overpass JSON response"""
+        if path.endswith(".pbf"):
+            coords, ways = _read_pbf(path)
+        else:
+            coords, ways = _read_overpass_json(path)
+        return cls.from_ways(coords, ways)
+
+    @classmethod
+    def from_ways(
+        cls,
+        coords: Dict[int, Tuple[float, float]],
+        ways: Iterable[Way],
+    ) -> "RoadNetwork":
+        """
+        Build from OSM node coordinates and (node refs, oneway tag) ways
+        """
+        src: List[int] = []
+        dst: List[int] = []
+        for refs, oneway in ways:
+            refs = [r for r in refs if r in coords]
+            forward = oneway != "-1"
+            backward = oneway not in ("yes", "true", "1")
+            for a, b in zip(refs, refs[1:]):
+                if forward:
+                    src.append(a)
+                    dst.append(b)
+                if backward:
+                    src.append(b)
+                    dst.append(a)
+
+        refs = np.array(src + dst, dtype=np.int64)
+        osm_ids, compact = np.unique(refs, return_inverse=True)
+        lat = np.array([coords[i][0] for i in osm_ids.tolist()], dtype=np.float64)
+        lon = np.array([coords[i][1] for i in osm_ids.tolist()], dtype=np.float64)
+
+        half = len(src)
+        return cls(lat, lon, compact[:half], compact[half:], osm_ids)
+
+    # --------------------
+    # Snapping
+    # --------------------
+    def main_component(self) -> np.ndarray:
+        """Vertex ids of the largest weakly connected component"""
+        if self._component is None:
+            labels = _component_labels(self.n_vertices, self.arc_tails(), self.indices)
+            largest = np.bincount(labels).argmax()
+            self._component = np.flatnonzero(labels == largest).astype(np.int32)
+        return self._component
+
+    def nearest_vertex(self, lat: float, lon: float) -> int:
+        """Closest vertex of the main component"""
+        candidates = self.main_component()
+        d = haversine_one_to_many(lat, lon, self.lat[candidates], self.lon[candidates])
+        return int(candidates[np.argmin(d)])
+
+    def attach_districts(self, positions: Dict[str, Tuple[float, float]]):
+        """
+        Snap each district to a road vertex and assign every vertex the
+        district nearest to it, which supplies the vertex's risk inputs
+        """
+        self.districts = list(positions)
+        self.district_vertex = {
+            name: self.nearest_vertex(lat, lon)
+            for name, (lat, lon) in positions.items()
+        }
+
+        d_lats = [positions[n][0] for n in self.districts]
+        d_lons = [positions[n][1] for n in self.districts]
+        owner = np.empty(self.n_vertices, dtype=np.int16)
+        for offset, block in haversine_matrix_chunked(self.lat, self.lon, d_lats, d_lons):
+            owner[offset:offset + len(block)] = block.argmin(axis=1)
+        self.vertex_district = owner
+
+    # --------------------
+    # Risk
+    # --------------------
+    def vertex_risk(self, G: nx.Graph) -> np.ndarray:
+        """Risk score per vertex from its district's live attributes"""
+        risk, _ = score_nodes(*node_columns(
+            G.nodes[n] if n in G else {} for n in self.districts
+        ))
+        return risk.astype(np.float32)[self.vertex_district]
+
+    def risk_weights(
+        self,
+        G: nx.Graph,
+        blocked_disaster_types: Iterable[str] | None = None,
+    ) -> np.ndarray:
+        """
+        Per-arc cost under the district graph's current risk
+
+        Never below the arc length, so great-circle A* stays exact.
+        """
+        blocked = set(blocked_disaster_types or ())
+        risk = self.vertex_risk(G)
+        typed = np.array(
+            [n in G and G.nodes[n].get("disaster_type") in blocked for n in self.districts],
+            dtype=np.float32,
+        )[self.vertex_district]
+
+        tails, heads = self.arc_tails(), self.indices
+        factor = 1.0 + ROAD_RISK_FACTOR * 0.5 * (risk[tails] + risk[heads])
+        factor += ROAD_BLOCKED_FACTOR * (typed[tails] + typed[heads])
+        return (self.length_km * factor).astype(np.float32)
+
+    # --------------------
+    # Search
+    # --------------------
+    def shortest_path(
+        self,
+        source: int,
+        target: int,
+        weights: np.ndarray | None = None,
+        astar: bool = True,
+        stats: Dict | None = None,
+    ) -> Optional[Tuple[float, List[int]]]:
+        """
+        Cheapest source -> target vertex path as (cost, vertices), or None
+
+        `weights` defaults to arc length. A* uses the great-circle distance
+        to the target, a lower bound for any weights >= length.
+        """
+        indptr, indices = self.indptr, self.indices
+        w = self.length_km if weights is None else weights
+        h = self.heuristic(target).item if astar else _zero
+
+        dist = {source: 0.0}
+        parent = {source: -1}
+        done = set()
+        heap = [(h(source), source)]
+        expanded = 0
+
+        found = False
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            if u == target:
+                found = True
+                break
+            done.add(u)
+            expanded += 1
+
+            du = dist[u]
+            lo, hi = indptr[u], indptr[u + 1]
+            for v, wv in zip(indices[lo:hi].tolist(), w[lo:hi].tolist()):
+                nd = du + wv
+                if nd < dist.get(v, inf):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd + h(v), v))
+
+        if stats is not None:
+            stats["expanded"] = stats.get("expanded", 0) + expanded
+        if not found:
+            return None
+
+        path = [target]
+        while parent[path[-1]] != -1:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return dist[target], path
+
+    def heuristic(self, target: int) -> np.ndarray:
+        """
+        A* lower bound towards `target` for every vertex, in one vectorized
+        pass; the last HEURISTIC_CACHE_TARGETS targets are kept
+        """
+        with self._heuristic_lock:
+            h = self._heuristics.get(target)
+            if h is not None:
+                self._heuristics.move_to_end(target)
+                return h
+
+        h = (HEURISTIC_SLACK * haversine_one_to_many(
+            float(self.lat[target]), float(self.lon[target]), self.lat, self.lon
+        )).astype(np.float32)
+        with self._heuristic_lock:
+            self._heuristics[target] = h
+            while len(self._heuristics) > HEURISTIC_CACHE_TARGETS:
+                self._heuristics.popitem(last=False)
+        return h
+
+    def route_districts(
+        self,
+        start: str,
+        end: str,
+        weights: np.ndarray | None = None,
+        astar: bool = True,
+    ) -> Optional[Dict]:
+        """Road route between two snapped districts"""
+        if start not in self.district_vertex or end not in self.district_vertex:
+            return None
+
+        found = self.shortest_path(
+            self.district_vertex[start], self.district_vertex[end], weights, astar
+        )
+        if found is None:
+            return None
+
+        cost, path = found
+        return {
+            "cost": round(cost, 2),
+            "vertices": path,
+            "coordinates": list(zip(self.lat[path].tolist(), self.lon[path].tolist())),
+        }
+
+
+# --------------------
+# Connectivity
+# --------------------
+def _zero(v) -> float:
+    # Dijkstra as A* with a zero heuristic
+    return 0.0
+
+
+def _component_labels(n: int, tails: np.ndarray, heads: np.ndarray) -> np.ndarray:
+    # Vectorised union-find: hook roots to the smaller neighbouring root,
+    # then pointer-jump until every vertex points at its root
+    labels = np.arange(n, dtype=np.int32)
+    while True:
+        lt, lh = labels[tails], labels[heads]
+        low = np.minimum(lt, lh)
+        hooked = labels.copy()
+        np.minimum.at(hooked, lt, low)
+        np.minimum.at(hooked, lh, low)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+
+# --------------------
+# Extract readers
+# --------------------
+def _read_overpass_json(path: str):
+    # Expects `way[highway]; (._;>;); out body;` style output
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    coords: Dict[int, Tuple[float, float]] = {}
+    ways: List[Way] = []
+    for el in data.get("elements", []):
+        if el.get("type") == "node":
+            coords[el["id"]] = (el["lat"], el["lon"])
+        elif el.get("type") == "way":
+            tags = el.get("tags", {})
+            if tags.get("highway") in ROAD_HIGHWAY_TYPES:
+                ways.append((el.get("nodes", []), tags.get("oneway")))
+    return coords, ways
+
+
+def _read_pbf(path: str):
+    try:
+        import osmium
+    except ImportError as exc:
+        raise RuntimeError("reading .pbf extracts requires the 'osmium' package") from exc
+
+    coords: Dict[int, Tuple[float, float]] = {}
+    ways: List[Way] = []
+
+    class _Handler(osmium.SimpleHandler):
+        def way(self, w):
+            if w.tags.get("highway") not in ROAD_HIGHWAY_TYPES:
+                return
+            refs = []
+            for node in w.nodes:
+                if node.location.valid():
+                    coords[node.ref] = (node.location.lat, node.location.lon)
+                    refs.append(node.ref)
+            ways.append((refs, w.tags.get("oneway")))
+
+    _Handler().apply_file(path, locations=True)
+    return coords, ways
+
+
+# --------------------
+# Route geometry
+# --------------------
+class RoadRouter:
+    """
+    Road-following geometry for district routes
+
+    Active when ROAD_NETWORK_PATH is set. Consecutive districts on a route
+    are joined by the cheapest road path under the snapshot's risk. Arc
+    weights and legs are computed once per snapshot version and blocked
+    set, so repeated responses (table hits, batches, SSE pushes) reuse them.
+    """
+
+    def __init__(self, path: str | None = ROAD_NETWORK_PATH):
+        self.path = path
+        self._network: Optional[RoadNetwork] = None
+        self._positions: Dict[str, Tuple[float, float]] = {}
+        self._version: Optional[int] = None
+        self._weights: Dict[FrozenSet[str], np.ndarray] = {}
+        # (blocked, start, end) -> route_districts result, None if unreachable
+        self._legs: Dict[Tuple[FrozenSet[str], str, str], Optional[Dict]] = {}
+        self._lock = threading.Lock()
+        self._worker = LatestWorker("road-weights", self._warm)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def network(self, positions: Mapping[str, Tuple[float, float]]) -> Optional[RoadNetwork]:
+        """The loaded network with districts snapped to `positions`; None if disabled"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            return self._attached(positions)
+
+    def _attached(self, positions: Mapping[str, Tuple[float, float]]) -> RoadNetwork:
+        # Caller holds the lock
+        if self._network is None:
+            self._network = RoadNetwork.load(self.path)
+        if dict(positions) != self._positions:
+            self._network.attach_districts(positions)
+            self._positions = dict(positions)
+            self._weights.clear()
+            self._legs.clear()
+        return self._network
+
+    def _weights_for(self, snapshot, blocked: FrozenSet[str]) -> Tuple[RoadNetwork, np.ndarray]:
+        with self._lock:
+            network = self._attached(snapshot.positions)
+            if snapshot.version != self._version:
+                self._version = snapshot.version
+                self._weights.clear()
+                self._legs.clear()
+            weights = self._weights.get(blocked)
+            if weights is None:
+                weights = self._weights[blocked] = network.risk_weights(snapshot.graph, blocked)
+            return network, weights
+
+    def geometry(
+        self,
+        snapshot,
+        path: List[str],
+        blocked_disaster_types: Iterable[str] | None = None,
+    ) -> Optional[Dict]:
+        """
+        {"coordinates", "cost"} along the roads joining `path`'s districts,
+        or None when disabled or some leg has no road connection
+        """
+        if not self.enabled or len(path) < 2:
+            return None
+
+        scenario = _scenario(snapshot.graph, blocked_disaster_types)
+        network, weights = self._weights_for(snapshot, scenario)
+        coords: List[Tuple[float, float]] = []
+        cost = 0.0
+        for a, b in zip(path, path[1:]):
+            leg = self._leg(snapshot.version, network, weights, (scenario, a, b))
+            if leg is None:
+                return None
+            coords.extend(leg["coordinates"][1:] if coords else leg["coordinates"])
+            cost += leg["cost"]
+        return {"coordinates": coords, "cost": round(cost, 2)}
+
+    def _leg(self, version: int, network: RoadNetwork, weights: np.ndarray, key) -> Optional[Dict]:
+        # The search runs outside the lock; a result for a superseded
+        # version is returned but not stored
+        with self._lock:
+            if version == self._version and key in self._legs:
+                return self._legs[key]
+        leg = network.route_districts(key[1], key[2], weights)
+        with self._lock:
+            if version == self._version:
+                self._legs[key] = leg
+        return leg
+
+    def on_publish(self, snapshot):
+        """Snapshot listener: load or re-snap and warm the unblocked weights"""
+        if self.enabled:
+            self._worker.submit(snapshot)
+
+    def _warm(self, snapshot):
+        self._weights_for(snapshot, frozenset())
+
+
+def _scenario(G: nx.Graph, blocked_disaster_types: Iterable[str] | None) -> FrozenSet[str]:
+    # Only types some district carries change the weights, which keeps the
+    # per-version caches bounded whatever clients send
+    present = {a.get("disaster_type") for _, a in G.nodes(data=True)}
+    return frozenset(blocked_disaster_types or ()) & present
+
+
+# Process-wide router used by the API
+road_router = RoadRouter()
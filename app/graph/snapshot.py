@@ -0,0 +1,312 @@
+"""
+Immutable, versioned graph snapshots
+
+The district topology is built once; each refresh enriches a copy of it,
+freezes the result and publishes it by swapping a single reference.
+Readers never lock: they grab the current snapshot and keep using it even
+if a newer one is published mid-request.
+
+With a snapshot bundle enabled (a startup cache, off by default), one
+process per host builds and writes each version to a shared file, and the
+others load it from there instead of building their own.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+import networkx as nx
+
+from app.config.settings import (
+    SNAPSHOT_BUNDLE_ENABLED,
+    SNAPSHOT_BUNDLE_MAX_AGE_S,
+    SNAPSHOT_BUNDLE_PATH,
+)
+from app.data_sources.safehouses import (
+    adopt_safehouses,
+    current_safehouses,
+    safehouses_degraded,
+)
+from app.graph.bundle import BundleChannel
+from app.graph.filters import RiskDiff, RiskOverlay
+from app.graph.builder import (
+    build_district_graph,
+    enrich_graph_with_live_data,
+    enrich_graph_with_live_data_async,
+)
+
+
+@dataclass(frozen=True)
+class GraphSnapshot:
+    """
+    Read-only view of the enriched district graph at one point in time
+
+    `overlay` holds per-node risk and the risk-weighted edge costs for
+    this version; routing reads it instead of reweighting a copy. `diff`
+    lists the nodes whose risk inputs changed since `previous_version`.
+    `topology` changes whenever the node or edge set may have changed.
+    """
+    version: int
+    graph: nx.Graph
+    positions: Mapping[str, Tuple[float, float]]
+    overlay: RiskOverlay
+    built_at: float
+    build_seconds: float
+    previous_version: Optional[int] = None
+    topology: int = 0
+
+    @property
+    def diff(self) -> RiskDiff:
+        return self.overlay.diff
+
+    @property
+    def degraded(self) -> FrozenSet[str]:
+        """Upstreams that served fallback data into this version"""
+        return self.graph.graph.get("degraded", frozenset())
+
+
+class SnapshotManager:
+    """
+    Owns the base topology and publishes enriched snapshots atomically
+    """
+
+    def __init__(
+        self,
+        builder: Callable = build_district_graph,
+        enricher: Callable[[nx.Graph], nx.Graph] = enrich_graph_with_live_data,
+        async_enricher: Callable[
+            [nx.Graph], Awaitable[nx.Graph]
+        ] = enrich_graph_with_live_data_async,
+        bundle: Optional[BundleChannel] = None,
+    ):
+        self._builder = builder
+        self._enricher = enricher
+        self._async_enricher = async_enricher
+        self._base: Optional[Tuple[nx.Graph, dict]] = None
+        self._current: Optional[GraphSnapshot] = None
+        self._current_base: Optional[Tuple[nx.Graph, dict]] = None
+        self._version = 0
+        self._topology = 0  # bumped whenever the base topology is replaced
+        self._refresh_lock = threading.Lock()
+        # Builds are numbered as they start; one that finishes after a
+        # later-started build was published is dropped
+        self._builds = itertools.count(1)
+        self._published_build = 0
+        # (loop, rebuild_topology, task) of the async build in progress
+        self._inflight: Optional[Tuple[asyncio.AbstractEventLoop, bool, asyncio.Task]] = None
+        self._listeners: List[Callable[[GraphSnapshot], None]] = []
+        self._bundle = bundle
+        # (topology digest, positions) of the bundles being followed
+        self._bundle_base: Optional[Tuple[str, dict]] = None
+
+    def add_listener(self, callback: Callable[["GraphSnapshot"], None]):
+        """
+        Call `callback(snapshot)` after every publish
+
+        Listeners run on the publishing thread, after the swap, so they
+        should hand long work off to a thread of their own.
+        """
+        self._listeners.append(callback)
+
+    def current(self) -> GraphSnapshot:
+        """
+        Return the latest published snapshot, building the first one lazily
+        """
+        snap = self._current
+        if snap is None:
+            with self._refresh_lock:
+                snap = self._current or self._publish(rebuild_topology=False)
+        return snap
+
+    def refresh(self, rebuild_topology: bool = False) -> GraphSnapshot:
+        """
+        Enrich a fresh copy of the base graph and publish it as a new version
+        """
+        with self._refresh_lock:
+            return self._publish(rebuild_topology)
+
+    @property
+    def follows_bundle(self) -> bool:
+        """True if another process builds snapshots and this one adopts them"""
+        return self._bundle is not None and not self._bundle.try_lead()
+
+    def sync_bundle(self) -> Optional[GraphSnapshot]:
+        """Adopt a newer bundle when following one; None if nothing changed"""
+        if not self.follows_bundle:
+            return None
+        with self._refresh_lock:
+            return self._adopt_bundle()
+
+    def bundle_status(self) -> Optional[Dict[str, Any]]:
+        return self._bundle.stats() if self._bundle is not None else None
+
+    async def current_async(self) -> GraphSnapshot:
+        """
+        Async variant of `current`
+        """
+        snap = self._current
+        if snap is None:
+            snap = await self.refresh_async()
+        return snap
+
+    async def refresh_async(self, rebuild_topology: bool = False) -> GraphSnapshot:
+        """
+        Enrich and publish a new version without blocking the event loop
+
+        Concurrent calls on one loop share a single build, so upstreams are
+        asked once; a plain refresh never stands in for a topology rebuild.
+        """
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight
+        if (
+            inflight is not None
+            and inflight[0] is loop
+            and not inflight[2].done()
+            and (inflight[1] or not rebuild_topology)
+        ):
+            return await asyncio.shield(inflight[2])
+
+        task = loop.create_task(self._refresh_async(rebuild_topology))
+        self._inflight = (loop, rebuild_topology, task)
+        # Shielded: a caller that gives up must not cancel a shared build
+        return await asyncio.shield(task)
+
+    async def _refresh_async(self, rebuild_topology: bool) -> GraphSnapshot:
+        started = time.perf_counter()
+        build = next(self._builds)
+
+        if self.follows_bundle:
+            with self._refresh_lock:
+                snap = self._adopt_bundle() or self._current
+            if snap is not None:
+                return snap
+
+        if self._base is None or rebuild_topology:
+            base = await asyncio.to_thread(self._builder)
+            with self._refresh_lock:
+                self._base = base
+
+        base = self._base
+        G = await self._async_enricher(base[0].copy())
+
+        with self._refresh_lock:
+            return self._freeze_and_swap(G, base, started, build)
+
+    def _publish(self, rebuild_topology: bool) -> GraphSnapshot:
+        # Caller holds the refresh lock
+        started = time.perf_counter()
+        build = next(self._builds)
+
+        # Followers build only while no usable bundle has appeared yet
+        if self.follows_bundle:
+            snap = self._adopt_bundle() or self._current
+            if snap is not None:
+                return snap
+
+        if self._base is None or rebuild_topology:
+            self._base = self._builder()
+
+        base = self._base
+        G = self._enricher(base[0].copy())
+        return self._freeze_and_swap(G, base, started, build)
+
+    def _adopt_bundle(self) -> Optional[GraphSnapshot]:
+        # Caller holds the refresh lock
+        started = time.perf_counter()
+        build = next(self._builds)
+        bundle = self._bundle.poll()
+        if bundle is None:
+            return None
+        try:
+            G = bundle.graph()
+            positions = bundle.positions()
+            scores = bundle.node_scores()
+            safehouses = bundle.safehouses()
+        except (KeyError, ValueError):
+            return None
+        finally:
+            bundle.close()  # everything above is a copy
+
+        # Same topology digest -> same base, so the risk diff stays incremental
+        base = self._bundle_base
+        if base is None or base[0] != bundle.topology:
+            base = self._bundle_base = (bundle.topology, positions)
+        if safehouses is not None:
+            adopt_safehouses(safehouses, bundle.meta["safehouses_degraded"])
+        return self._freeze_and_swap(
+            G, base, started, build, scores=scores, built_at=bundle.built_at
+        )
+
+    def _freeze_and_swap(
+        self,
+        G: nx.Graph,
+        base,
+        started: float,
+        build: int,
+        scores=None,
+        built_at: Optional[float] = None,
+    ) -> GraphSnapshot:
+        # Caller holds the refresh lock
+        if build < self._published_build and self._current is not None:
+            return self._current  # built on older inputs than the current one
+        self._published_build = build
+        G = nx.freeze(G)
+
+        # Diff against the previous version only if it shares this topology
+        prev = self._current
+        if self._current_base is not base:
+            prev = None
+            self._topology += 1
+        self._current_base = base
+
+        self._version += 1
+        snap = GraphSnapshot(
+            version=self._version,
+            graph=G,
+            positions=MappingProxyType(dict(base[1])),
+            overlay=RiskOverlay(G, prev.overlay if prev else None, scores),
+            built_at=time.time() if built_at is None else built_at,
+            build_seconds=time.perf_counter() - started,
+            previous_version=prev.version if prev else None,
+            topology=self._topology,
+        )
+
+        # Single reference assignment: readers see old or new, never a mix
+        self._current = snap
+
+        if self._bundle is not None and self._bundle.leader:
+            try:
+                self._bundle.publish(snap, current_safehouses(), safehouses_degraded())
+            except Exception:
+                pass
+
+        for callback in list(self._listeners):
+            try:
+                callback(snap)
+            except Exception:
+                pass
+        return snap
+
+
+# Process-wide manager shared by the API and the UI
+snapshot_manager = SnapshotManager(
+    bundle=(
+        BundleChannel(SNAPSHOT_BUNDLE_PATH, SNAPSHOT_BUNDLE_MAX_AGE_S)
+        if SNAPSHOT_BUNDLE_ENABLED
+        else None
+    ),
+)
+
+
+def get_snapshot() -> GraphSnapshot:
+    """Return the current graph snapshot"""
+    return snapshot_manager.current()
+
+
+async def get_snapshot_async() -> GraphSnapshot:
+    """Return the current graph snapshot from async code"""
+    return await snapshot_manager.current_async()
@@ -6,7 +6,9 @@ IMPORTANT:
 - Scores are designed for relative comparison, not absolute danger levels.
 """
 
-from typing import Dict
+from typing import Dict, Iterable, Sequence, Tuple
+
+import numpy as np
 
 from app.config.settings import (
     RAIN_BLOCK_MM,
@@ -81,3 +83,86 @@ def is_blocked(node_attrs: Dict) -> bool:
     """
     precip = float(node_attrs.get("precipitation_24h", 0.0))
     return precip >= RAIN_BLOCK_MM
+
+
+# --------------------
+# Vectorised scoring
+# --------------------
+# (threshold, score) pairs, highest first, mirroring the if-chains above
+RAIN_SCORE_TABLE = (
+    (RAIN_BLOCK_MM, 30.0),
+    (RAIN_HIGH_MM, 18.0),
+    (RAIN_MEDIUM_MM, 8.0),
+    (20, 3.0),
+)
+EQ_SCORE_TABLE = (
+    (EQ_HIGH_MAG, 30.0),
+    (EQ_MEDIUM_MAG, 18.0),
+    (EQ_LOW_MAG, 8.0),
+)
+
+# Disaster-type codes; MULTIPLIER_BY_CODE[code] == contextual_multiplier(type)
+TYPE_NONE, TYPE_FLOOD, TYPE_LANDSLIDE, TYPE_EARTHQUAKE = range(4)
+MULTIPLIER_BY_CODE = np.array([1.0, 1.2, 1.1, 1.0])
+
+
+def disaster_type_code(disaster_type: str) -> int:
+    """
+    Integer code for a disaster type, matched like contextual_multiplier
+    """
+    disaster_type = (disaster_type or "").lower()
+
+    if "flood" in disaster_type:
+        return TYPE_FLOOD
+    if "landslide" in disaster_type:
+        return TYPE_LANDSLIDE
+    if "earthquake" in disaster_type:
+        return TYPE_EARTHQUAKE
+    return TYPE_NONE
+
+
+def _table_score(values: np.ndarray, table) -> np.ndarray:
+    # NaN fails every comparison and scores 0, as in the scalar chains
+    return np.select(
+        [values >= threshold for threshold, _ in table],
+        [score for _, score in table],
+        default=0.0,
+    )
+
+
+def score_nodes(
+    precipitation: Sequence[float],
+    magnitude: Sequence[float],
+    disaster_codes: Sequence[int],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Risk scores and blocked mask for many nodes in one call
+
+    Element-wise equal to total_risk_score and is_blocked.
+    """
+    precip = np.asarray(precipitation, dtype=np.float64)
+    mag = np.asarray(magnitude, dtype=np.float64)
+    codes = np.asarray(disaster_codes, dtype=np.intp)
+
+    base = _table_score(precip, RAIN_SCORE_TABLE) + _table_score(mag, EQ_SCORE_TABLE)
+    risk = base * MULTIPLIER_BY_CODE[codes]
+    blocked = precip >= RAIN_BLOCK_MM
+    return risk, blocked
+
+
+def node_columns(
+    nodes: Iterable[Dict],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (precipitation, magnitude, disaster code) arrays from node attribute dicts
+    """
+    precip, mag, codes = [], [], []
+    for attrs in nodes:
+        precip.append(float(attrs.get("precipitation_24h", 0.0)))
+        mag.append(float(attrs.get("quake_mag", 0.0)))
+        codes.append(disaster_type_code(attrs.get("disaster_type", "")))
+    return (
+        np.array(precip, dtype=np.float64),
+        np.array(mag, dtype=np.float64),
+        np.array(codes, dtype=np.int8),
+    )
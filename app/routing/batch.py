@@ -0,0 +1,119 @@
+"""
+Batched routing on one snapshot
+
+Items are grouped by scenario and by a shared endpoint. Each group runs a
+single shortest-path tree search from that endpoint and every item in the
+group reuses it for its k-route search, so the work grows with the number
+of distinct endpoints rather than the number of pairs. On undirected
+graphs, an item anchored at its start is solved end -> start and the
+paths are reversed, which has the same costs.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from app.routing.ksp import target_tree
+from app.routing.paths import find_k_routes
+
+Routes = List[Dict]
+
+
+@dataclass
+class RouteItem:
+    start: str
+    end: str
+    blocked: List[str] = field(default_factory=list)
+    k: int = 3
+
+
+@dataclass
+class RouteGroup:
+    """
+    Items answered together: one scenario, one shared tree root
+
+    Table hits form groups with no root whose answers are already known.
+    """
+    snapshot: object
+    scenario: FrozenSet[str]
+    root: Optional[str]
+    items: List[Tuple[int, RouteItem]]
+    answers: Dict[int, Routes] = field(default_factory=dict)
+
+    def solve(self) -> List[Tuple[int, Routes]]:
+        """Return (item index, routes) for every item in the group"""
+        if self.root is None:
+            return [(i, self.answers[i]) for i, _ in self.items]
+
+        overlay = self.snapshot.overlay
+        view, weight = overlay.routing_inputs(blocked_disaster_types=list(self.scenario))
+        if self.root not in view:
+            return [(i, []) for i, _ in self.items]
+
+        tree = target_tree(view, self.root, weight)
+        results = []
+        for i, item in self.items:
+            reverse = item.end != self.root
+            start, end = (item.end, item.start) if reverse else (item.start, item.end)
+
+            routes = find_k_routes(
+                view, start, end, k=item.k,
+                weight=weight,
+                node_risk=overlay.node_risk,
+                tree=tree,
+            )
+            if reverse:
+                for route in routes:
+                    route["path"] = route["path"][::-1]
+            results.append((i, routes))
+        return results
+
+
+def plan_route_batch(
+    snapshot,
+    items: Iterable[RouteItem],
+    route_tables=None,
+) -> List[RouteGroup]:
+    """
+    Split a batch into groups that each share one tree search
+
+    Items answered by the snapshot's route table come first as one group.
+    """
+    undirected = not snapshot.graph.is_directed()
+    cached = RouteGroup(snapshot, frozenset(), None, [])
+    pending: Dict[FrozenSet[str], List[Tuple[int, RouteItem]]] = {}
+
+    for i, item in enumerate(items):
+        routes = None
+        if route_tables is not None:
+            routes = route_tables.lookup(snapshot, item.start, item.end, item.blocked, item.k)
+        if routes is not None:
+            cached.items.append((i, item))
+            cached.answers[i] = routes
+        else:
+            pending.setdefault(frozenset(item.blocked or ()), []).append((i, item))
+
+    groups = [cached] if cached.items else []
+    for scenario, members in pending.items():
+        groups.extend(_group_by_endpoint(snapshot, scenario, members, undirected))
+    return groups
+
+
+def _group_by_endpoint(snapshot, scenario, members, undirected) -> List[RouteGroup]:
+    # Anchor each item at its more frequent endpoint; the engine's tree is
+    # rooted at the target, so only undirected graphs may anchor at start
+    counts = Counter(item.end for _, item in members)
+    if undirected:
+        counts.update(item.start for _, item in members)
+
+    by_root: Dict[str, List[Tuple[int, RouteItem]]] = {}
+    for i, item in members:
+        root = item.end
+        if undirected and counts[item.start] > counts[item.end]:
+            root = item.start
+        by_root.setdefault(root, []).append((i, item))
+
+    return [
+        RouteGroup(snapshot, scenario, root, group)
+        for root, group in by_root.items()
+    ]
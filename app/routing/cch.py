@@ -0,0 +1,465 @@
+"""
+Customizable contraction hierarchies (CCH)
+
+Risk weights change on every live-data refresh and with every blocked
+disaster type, so the hierarchy is split into two phases:
+
+- preprocessing (once per topology): a metric-independent node order by
+  geometric nested dissection, the chordal fill-in it induces, the
+  elimination tree, and every lower triangle of the hierarchy;
+- customization (once per weight set): a vectorised pass over those
+  triangles, level by level up the elimination tree.
+
+Queries walk the elimination tree upwards from both endpoints, touching
+only the nodes' ancestors, and unpack shortcuts through the triangle that
+produced their weight. Undirected graphs with symmetric weights only,
+which covers RiskOverlay weights.
+"""
+
+import threading
+from dataclasses import dataclass
+from math import cos, inf, radians
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+from app.routing.paths import weight_function
+from app.utils.background import LatestWorker
+
+Node = Hashable
+
+# Parts at or below this size are ordered by degree instead of split
+DISSECTION_LEAF_SIZE = 16
+
+
+class ContractionHierarchy:
+    """
+    Metric-independent CCH topology for one graph
+    """
+
+    def __init__(self, G: nx.Graph):
+        if G.is_directed():
+            raise ValueError("CCH supports undirected graphs only")
+
+        self.nodes: List[Node] = list(G.nodes)
+        self.rank_of: Dict[Node, int] = {}
+        n = len(self.nodes)
+
+        order = _dissection_order(G, self.nodes)
+        for r, i in enumerate(order):
+            self.rank_of[self.nodes[i]] = r
+        self.node_at = [self.nodes[i] for i in order]
+
+        # Chordal completion: each node's upward clique hangs off its
+        # lowest upward neighbour, which becomes its elimination-tree parent
+        up = [set() for _ in range(n)]
+        self.edges: List[Tuple[Node, Node]] = list(G.edges())
+        self._edge_attrs = [G[u][v] for u, v in self.edges]
+        for u, v in self.edges:
+            a, b = self.rank_of[u], self.rank_of[v]
+            up[min(a, b)].add(max(a, b))
+
+        self.parent = np.full(n, -1, dtype=np.int32)
+        for v in range(n):
+            if up[v]:
+                p = min(up[v])
+                self.parent[v] = p
+                up[p] |= up[v] - {p}
+
+        # Upward arcs, grouped by lower endpoint, heads ascending
+        self.heads: List[List[int]] = [sorted(s) for s in up]
+        del up
+        self.first_arc = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(h) for h in self.heads], out=self.first_arc[1:])
+        self.arc_tail = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.first_arc))
+        self.arc_head = np.fromiter(
+            (x for h in self.heads for x in h), dtype=np.int32, count=int(self.first_arc[-1])
+        )
+        # Arcs sorted by (tail, head), so this key array is sorted too
+        self._arc_keys = self.arc_tail.astype(np.int64) * n + self.arc_head
+
+        lo = np.array([self.rank_of[u] for u, _ in self.edges], dtype=np.int64)
+        hi = np.array([self.rank_of[v] for _, v in self.edges], dtype=np.int64)
+        self.edge_arc = self._arc_ids(np.minimum(lo, hi), np.maximum(lo, hi))
+
+        # Lower triangles {v, x, y}, v < x < y, grouped by v's height
+        height = np.zeros(n, dtype=np.int32)
+        for v in range(n):
+            p = self.parent[v]
+            if p >= 0 and height[p] < height[v] + 1:
+                height[p] = height[v] + 1
+
+        parts = []
+        for v, h in enumerate(self.heads):
+            if len(h) < 2:
+                continue
+            i, j = np.triu_indices(len(h), 1)
+            parts.append((v, i, j))
+
+        by_height = sorted(parts, key=lambda part: height[part[0]])
+        tri_vx, tri_vy, tri_xy, tri_h = [], [], [], []
+        for v, i, j in by_height:
+            base = self.first_arc[v]
+            heads = self.arc_head[base:self.first_arc[v + 1]]
+            tri_vx.append((base + i).astype(np.int32))
+            tri_vy.append((base + j).astype(np.int32))
+            tri_xy.append(self._arc_ids(heads[i], heads[j]).astype(np.int32))
+            tri_h.append(np.full(len(i), height[v], dtype=np.int32))
+
+        empty = np.zeros(0, dtype=np.int32)
+        levels = np.concatenate(tri_h) if tri_h else empty
+        xy = np.concatenate(tri_xy) if tri_xy else empty
+        # Within a level, group triangles by the arc they update so
+        # customization can take segment minima with reduceat
+        by_target = np.lexsort((xy, levels))
+        levels, xy = levels[by_target], xy[by_target]
+        self.tri_vx = (np.concatenate(tri_vx) if tri_vx else empty)[by_target]
+        self.tri_vy = (np.concatenate(tri_vy) if tri_vy else empty)[by_target]
+
+        new_segment = np.ones(len(xy), dtype=bool)
+        new_segment[1:] = (xy[1:] != xy[:-1]) | (levels[1:] != levels[:-1])
+        self.seg_start = np.flatnonzero(new_segment).astype(np.int32)
+        self.seg_arc = xy[self.seg_start]
+        self.level_bounds = np.searchsorted(
+            levels[self.seg_start], np.arange(int(height.max(initial=0)) + 2)
+        )
+
+    def _arc_ids(self, tails: np.ndarray, heads: np.ndarray) -> np.ndarray:
+        keys = np.asarray(tails, dtype=np.int64) * (len(self.first_arc) - 1) + heads
+        return np.searchsorted(self._arc_keys, keys)
+
+    @property
+    def n_arcs(self) -> int:
+        return len(self.arc_head)
+
+    @property
+    def n_triangles(self) -> int:
+        return len(self.tri_vx)
+
+    def nbytes(self) -> int:
+        """Resident size of the array storage"""
+        arrays = [self.parent, self.first_arc, self.arc_tail, self.arc_head, self._arc_keys,
+                  self.edge_arc, self.tri_vx, self.tri_vy, self.seg_start, self.seg_arc, self.level_bounds]
+        return sum(a.nbytes for a in arrays)
+
+    # --------------------
+    # Customization
+    # --------------------
+    def customize(
+        self,
+        weight: str | Callable = "weight",
+        G: nx.Graph | None = None,
+    ) -> "CustomizedCCH":
+        """
+        Apply a weight attribute or weight function, e.g. RiskOverlay.weight_fn
+
+        `G` supplies edge attributes when it is a newer graph with the same
+        topology as the one preprocessed.
+        """
+        weight = weight_function(weight)
+        attrs = self._edge_attrs if G is None else [G[u][v] for u, v in self.edges]
+        values = np.fromiter(
+            (weight(u, v, a) for (u, v), a in zip(self.edges, attrs)),
+            dtype=np.float64,
+            count=len(self.edges),
+        )
+        return self.customize_array(values)
+
+    def customize_array(self, edge_weights: np.ndarray) -> "CustomizedCCH":
+        """Apply one weight per edge, aligned with `self.edges`"""
+        w = np.full(self.n_arcs, inf)
+        np.minimum.at(w, self.edge_arc, np.asarray(edge_weights, dtype=np.float64))
+        original = w.copy()
+
+        starts = np.append(self.seg_start, len(self.tri_vx))
+        bounds = self.level_bounds
+        for s_lo, s_hi in zip(bounds[:-1], bounds[1:]):
+            if s_lo == s_hi:
+                continue
+            lo, hi = starts[s_lo], starts[s_hi]
+            sums = w[self.tri_vx[lo:hi]] + w[self.tri_vy[lo:hi]]
+            best = np.minimum.reduceat(sums, self.seg_start[s_lo:s_hi] - lo)
+            arcs = self.seg_arc[s_lo:s_hi]
+            w[arcs] = np.minimum(w[arcs], best)
+
+        # Shortcut unpacking: any triangle that attains an arc's weight
+        via_lo = np.full(self.n_arcs, -1, dtype=np.int64)
+        via_hi = np.full(self.n_arcs, -1, dtype=np.int64)
+        tri_xy = np.repeat(self.seg_arc, np.diff(starts))
+        attained = (w[self.tri_vx] + w[self.tri_vy] == w[tri_xy]) & (
+            original[tri_xy] != w[tri_xy]
+        )
+        via_lo[tri_xy[attained]] = self.tri_vx[attained]
+        via_hi[tri_xy[attained]] = self.tri_vy[attained]
+
+        return CustomizedCCH(self, w, via_lo, via_hi)
+
+
+@dataclass
+class CustomizedCCH:
+    """A CCH topology with one weight set applied"""
+    cch: ContractionHierarchy
+    weights: np.ndarray
+    via_lo: np.ndarray
+    via_hi: np.ndarray
+
+    def __post_init__(self):
+        self._parent = self.cch.parent.tolist()
+        self._first = self.cch.first_arc.tolist()
+        self._out: Dict[int, List[Tuple[int, int, float]]] = {}
+
+    def _arcs(self, v: int) -> List[Tuple[int, int, float]]:
+        # (head, arc, weight) per upward arc, as Python values, built on
+        # first use so customization does not pay for unqueried nodes
+        out = self._out.get(v)
+        if out is None:
+            lo, hi = self._first[v], self._first[v + 1]
+            out = self._out[v] = list(
+                zip(self.cch.heads[v], range(lo, hi), self.weights[lo:hi].tolist())
+            )
+        return out
+
+    def nbytes(self) -> int:
+        return self.weights.nbytes + self.via_lo.nbytes + self.via_hi.nbytes
+
+    def _upward(self, s: int):
+        dist = {s: 0.0}
+        pred: Dict[int, int] = {}
+        chain = []
+        v = s
+        while v != -1:
+            chain.append(v)
+            dv = dist.get(v)
+            if dv is not None:
+                for x, a, w in self._arcs(v):
+                    nd = dv + w
+                    if nd < dist.get(x, inf):
+                        dist[x] = nd
+                        pred[x] = a
+            v = self._parent[v]
+        return dist, pred, chain
+
+    def _meet(self, source: Node, target: Node):
+        rank_of = self.cch.rank_of
+        if source not in rank_of or target not in rank_of:
+            return inf, -1, {}, {}, -1, -1
+        s, t = rank_of[source], rank_of[target]
+        ds, ps, chain = self._upward(s)
+        dt, pt, _ = self._upward(t)
+
+        best, meet = inf, -1
+        for v in chain:
+            if v in ds and v in dt and ds[v] + dt[v] < best:
+                best, meet = ds[v] + dt[v], v
+        return best, meet, ps, pt, s, t
+
+    def distance(self, source: Node, target: Node) -> Optional[float]:
+        """Shortest-path cost, or None if unreachable"""
+        best = self._meet(source, target)[0]
+        return None if best == inf else best
+
+    def shortest_path(self, source: Node, target: Node) -> Optional[Tuple[float, List[Node]]]:
+        """(cost, nodes) of a shortest path, or None if unreachable"""
+        best, meet, ps, pt, s, t = self._meet(source, target)
+        if meet == -1:
+            return None
+
+        up_s = self._chain(ps, s, meet)
+        up_t = self._chain(pt, t, meet)
+        ranks = [s]
+        for a in up_s:
+            ranks.extend(self._unpack(a, ranks[-1])[1:])
+        for a in reversed(up_t):
+            ranks.extend(self._unpack(a, ranks[-1])[1:])
+        return best, [self.cch.node_at[r] for r in ranks]
+
+    def _chain(self, pred, start: int, meet: int) -> List[int]:
+        # Arcs from `start` up to `meet`, in upward order
+        arcs = []
+        v = meet
+        tail = self.cch.arc_tail
+        while v != start:
+            a = pred[v]
+            arcs.append(a)
+            v = int(tail[a])
+        arcs.reverse()
+        return arcs
+
+    def _unpack(self, arc: int, frm: int) -> List[int]:
+        # Original-edge ranks along `arc`, walked starting at endpoint `frm`
+        tail, head = self.cch.arc_tail, self.cch.arc_head
+        out = [frm]
+        stack = [(arc, frm)]
+        while stack:
+            a, start = stack.pop()
+            lo, hi = int(tail[a]), int(head[a])
+            end = hi if start == lo else lo
+            if self.via_lo[a] == -1:
+                out.append(end)
+                continue
+            # lo -> mid -> hi through the triangle's two lower arcs
+            arc_lo, arc_hi = int(self.via_lo[a]), int(self.via_hi[a])
+            first, second = (arc_lo, arc_hi) if start == lo else (arc_hi, arc_lo)
+            mid = int(tail[arc_lo])
+            stack.append((second, mid))
+            stack.append((first, start))
+        return out
+
+
+# --------------------
+# Ordering
+# --------------------
+def _dissection_order(G: nx.Graph, nodes: List[Node]) -> List[int]:
+    """
+    Node indices in elimination order: parts first, separators last
+
+    Each part is halved at the median along the direction (two axes, two
+    diagonals) whose cut edges have the smallest greedy vertex cover; that
+    cover is the separator. Without coordinates, orders by degree.
+    """
+    index = {n: i for i, n in enumerate(nodes)}
+    adj = [[index[m] for m in G.adj[n]] for n in nodes]
+    degree = [len(a) for a in adj]
+
+    attrs = [G.nodes[n] for n in nodes]
+    if not all("lat" in a and "lon" in a for a in attrs):
+        return sorted(range(len(nodes)), key=lambda i: degree[i])
+
+    mean_lat = radians(sum(a["lat"] for a in attrs) / max(len(attrs), 1))
+    xy = np.array([(a["lon"] * cos(mean_lat), a["lat"]) for a in attrs])
+    directions = [xy[:, 0], xy[:, 1], xy[:, 0] + xy[:, 1], xy[:, 0] - xy[:, 1]]
+
+    order: List[int] = []
+    # Explicit stack of (part, is_separator); separators pop after both halves
+    stack: List[Tuple[List[int], bool]] = [(list(range(len(nodes))), False)]
+    while stack:
+        part, is_separator = stack.pop()
+        if is_separator or len(part) <= DISSECTION_LEAF_SIZE:
+            order.extend(sorted(part, key=lambda i: degree[i]))
+            continue
+
+        best = None
+        for coord in directions:
+            ranked = sorted(part, key=coord.__getitem__)
+            side_a = set(ranked[:len(ranked) // 2])
+            separator = _cut_cover(ranked, side_a, adj)
+            if best is None or len(separator) < len(best[1]):
+                best = (ranked, separator)
+
+        ranked, separator = best
+        half = len(ranked) // 2
+        stack.append((sorted(separator), True))
+        stack.append(([i for i in ranked[half:] if i not in separator], False))
+        stack.append(([i for i in ranked[:half] if i not in separator], False))
+    return order
+
+
+def _cut_cover(ranked: List[int], side_a: set, adj) -> set:
+    # Greedy vertex cover of the edges crossing the cut, inside the part
+    members = set(ranked)
+    cut: Dict[int, set] = {}
+    for i in side_a:
+        for j in adj[i]:
+            if j in members and j not in side_a:
+                cut.setdefault(i, set()).add(j)
+                cut.setdefault(j, set()).add(i)
+
+    cover = set()
+    while cut:
+        v = max(cut, key=lambda x: len(cut[x]))
+        cover.add(v)
+        for u in cut.pop(v):
+            cut[u].discard(v)
+            if not cut[u]:
+                del cut[u]
+    return cover
+
+
+class CCHManager:
+    """
+    One preprocessed topology, customized per snapshot and scenario
+
+    Preprocessing reruns only when the node or edge set changes; a new
+    snapshot version with the same topology only costs customizations.
+    As a snapshot listener it re-customizes, off the publishing thread,
+    the unblocked scenario and every scenario queried so far.
+    """
+
+    def __init__(self):
+        # Guards the published state only; preprocessing and customization
+        # run outside it, so one scenario never holds up queries on another
+        self._lock = threading.Lock()
+        self._topology: Optional[Tuple[int, ContractionHierarchy]] = None
+        self._version: Optional[int] = None
+        self._metrics: Dict[FrozenSet[str], CustomizedCCH] = {}
+        self._scenarios: set = {frozenset()}
+        self._worker = LatestWorker("cch-customize", self._customize_all)
+
+    def metric(
+        self,
+        snapshot,
+        blocked_disaster_types: Iterable[str] | None = None,
+    ) -> CustomizedCCH:
+        key = frozenset(blocked_disaster_types or ())
+        with self._lock:
+            self._scenarios.add(key)
+            if self._version == snapshot.version and key in self._metrics:
+                return self._metrics[key]
+            topology = self._topology
+
+        if topology is None or topology[0] != snapshot.topology:
+            topology = (snapshot.topology, ContractionHierarchy(snapshot.graph))
+        weight = snapshot.overlay.weight_fn(key)
+        metric = topology[1].customize(weight, snapshot.graph)
+
+        # Publish unless a newer version got there first
+        with self._lock:
+            if self._version is None or snapshot.version > self._version:
+                self._version = snapshot.version
+                self._metrics = {}
+                self._topology = topology
+            if snapshot.version == self._version:
+                metric = self._metrics.setdefault(key, metric)
+        return metric
+
+    def routes(
+        self,
+        snapshot,
+        start: str,
+        end: str,
+        blocked_disaster_types: Iterable[str] | None = None,
+    ) -> List[Dict]:
+        """
+        The cheapest route in find_k_routes' shape, as a list of at most one
+
+        CCH answers single shortest paths, so there are no alternatives.
+        """
+        if start not in snapshot.graph or end not in snapshot.graph:
+            return []
+
+        found = self.metric(snapshot, blocked_disaster_types).shortest_path(start, end)
+        if found is None:
+            return []
+
+        cost, path = found
+        node_risk = snapshot.overlay.node_risk
+        return [{
+            "path": path,
+            "cost": round(float(cost), 2),
+            "risk_nodes": sum(1 for n in path if node_risk[n] > 5.0),
+        }]
+
+    def on_publish(self, snapshot):
+        """Snapshot listener; customization runs on a background worker"""
+        self._worker.submit(snapshot)
+
+    def _customize_all(self, snapshot):
+        with self._lock:
+            scenarios = list(self._scenarios)
+        for key in scenarios:
+            self.metric(snapshot, key)
+
+
+# Process-wide CCH used by the API
+cch_router = CCHManager()
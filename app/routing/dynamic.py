@@ -0,0 +1,185 @@
+"""
+Dynamic shortest-path tree
+
+A shortest-path tree towards one target that is repaired in place when
+edge weights change, instead of being rebuilt. After a weight update:
+
+- nodes whose tree path crosses an edge that got more expensive lose
+  their labels and are re-seeded from their best unaffected neighbour;
+- edges that got cheaper seed their tail if they now offer a shorter way;
+- one Dijkstra pass from those seeds settles every label again.
+
+The work is proportional to the part of the tree whose distances actually
+change (plus its boundary), so small risk diffs cost little.
+"""
+
+import heapq
+from itertools import count
+from math import inf
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import networkx as nx
+
+from app.routing.ksp import WeightFn
+
+Node = Hashable
+
+
+class DynamicTree:
+    """
+    Distance and next hop towards `target` for every node that reaches it
+    """
+
+    def __init__(self, G: nx.Graph, target: Node, weight: WeightFn):
+        self.target = target
+        self.dist: Dict[Node, float] = {}
+        self.next_hop: Dict[Node, Node] = {}
+        self.repaired = 0
+
+        self._G = G
+        self._weight = weight
+        self._hop_weight: Dict[Node, float] = {}
+        self._children: Dict[Node, Set[Node]] = {}
+        self._tie = count()
+
+        self.dist[target] = 0.0
+        self._settle([(0.0, next(self._tie), target)])
+
+    def path(self, source: Node) -> Optional[List[Node]]:
+        """Tree path source -> target, or None if unreachable"""
+        if source not in self.dist:
+            return None
+        path = [source]
+        while path[-1] != self.target:
+            path.append(self.next_hop[path[-1]])
+        return path
+
+    def copy(self) -> "DynamicTree":
+        """Independent copy, to repair while readers keep using this one"""
+        clone = DynamicTree.__new__(DynamicTree)
+        clone.target = self.target
+        clone.dist = dict(self.dist)
+        clone.next_hop = dict(self.next_hop)
+        clone.repaired = self.repaired
+        clone._G, clone._weight = self._G, self._weight
+        clone._hop_weight = dict(self._hop_weight)
+        clone._children = {n: set(c) for n, c in self._children.items()}
+        clone._tie = count(next(self._tie))
+        return clone
+
+    def update(
+        self,
+        G: nx.Graph,
+        weight: WeightFn,
+        edges: Iterable[Tuple[Node, Node]],
+    ) -> Set[Node]:
+        """
+        Move to new weights where only `edges` changed; same topology
+
+        Returns the nodes whose distance or next hop changed.
+        """
+        self._G, self._weight = G, weight
+        succ = G.succ if G.is_directed() else G.adj
+        dist, hop = self.dist, self.next_hop
+
+        # Classify each changed arc u -> v against the current tree
+        raised: List[Node] = []
+        candidates: List[Tuple[Node, Node]] = []
+        for a, b in edges:
+            for u, v in ((a, b), (b, a)):
+                if v not in succ[u]:
+                    continue
+                w = weight(u, v, succ[u][v])
+                if hop.get(u) == v:
+                    if w is None or w > self._hop_weight[u]:
+                        raised.append(u)
+                        continue
+                candidates.append((u, v))
+
+        before: Dict[Node, Tuple[Optional[float], Optional[Node]]] = {}
+
+        # Nodes below a raised tree arc lose their labels
+        affected: Set[Node] = set()
+        stack = list(raised)
+        while stack:
+            x = stack.pop()
+            if x in affected:
+                continue
+            affected.add(x)
+            stack.extend(self._children.get(x, ()))
+
+        for x in affected:
+            self._detach(x)
+            before[x] = (dist.pop(x), hop.pop(x))
+
+        seeds = []
+        for x in affected:
+            best, via, via_w = inf, None, None
+            for y, attrs in succ[x].items():
+                if y in affected or y not in dist:
+                    continue
+                w = weight(x, y, attrs)
+                if w is not None and dist[y] + w < best:
+                    best, via, via_w = dist[y] + w, y, w
+            if via is not None:
+                self._relabel(x, best, via, via_w, before)
+                seeds.append((best, next(self._tie), x))
+
+        # Arcs that now offer a shorter way, including cheaper tree arcs
+        for u, v in candidates:
+            if v not in dist:
+                continue
+            w = weight(u, v, succ[u][v])
+            if w is None:
+                continue
+            nd = dist[v] + w
+            if nd < dist.get(u, inf):
+                self._relabel(u, nd, v, w, before)
+                seeds.append((nd, next(self._tie), u))
+
+        self._settle(seeds, before)
+
+        changed = {
+            x for x, (d, h) in before.items()
+            if dist.get(x) != d or hop.get(x) != h
+        }
+        self.repaired += len(before)
+        return changed
+
+    # --------------------
+    # Internals
+    # --------------------
+    def _pred(self):
+        G = self._G
+        return G.pred if G.is_directed() else G.adj
+
+    def _settle(self, heap, before: Dict | None = None):
+        # Dijkstra from the seeded labels; labels only ever decrease here
+        heapq.heapify(heap)
+        pred, weight, dist = self._pred(), self._weight, self.dist
+        while heap:
+            d, _, v = heapq.heappop(heap)
+            if d > dist.get(v, inf):
+                continue
+            for u, attrs in pred[v].items():
+                w = weight(u, v, attrs)
+                if w is None:
+                    continue
+                nd = d + w
+                if nd < dist.get(u, inf):
+                    self._relabel(u, nd, v, w, before)
+                    heapq.heappush(heap, (nd, next(self._tie), u))
+
+    def _relabel(self, u, d, v, w, before):
+        if before is not None and u not in before:
+            before[u] = (self.dist.get(u), self.next_hop.get(u))
+        self._detach(u)
+        self.dist[u] = d
+        self.next_hop[u] = v
+        self._hop_weight[u] = w
+        self._children.setdefault(v, set()).add(u)
+
+    def _detach(self, u):
+        old = self.next_hop.get(u)
+        if old is not None:
+            self._children.get(old, set()).discard(u)
@@ -0,0 +1,330 @@
+"""
+k-shortest loopless paths (Yen, with Lawler's and tree-reuse refinements)
+
+Compared to `nx.shortest_simple_paths` this engine:
+- spurs each path only from its deviation node onward (Lawler), instead
+  of from every node of every accepted path;
+- computes one reverse shortest-path tree from the target and reuses it
+  for every spur: when the best allowed first hop's tree path avoids the
+  banned nodes it *is* the shortest spur path and no search runs at all;
+- runs the remaining spur searches as A* guided by the tree distances,
+  which are exact lower bounds, so they expand little beyond the answer;
+- grows that tree lazily: given a coordinate heuristic, only as A* until
+  it reaches the source, then further only when a spur search needs a
+  node it has not settled, so a query costs a goal-directed search
+  rather than a whole-graph one;
+- returns each path's cost from prefix sums and search distances, so
+  callers never walk a path again to price it.
+"""
+
+import heapq
+from dataclasses import dataclass
+from itertools import count
+from math import inf
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import networkx as nx
+
+Node = Hashable
+WeightFn = Callable[[Node, Node, Dict], Optional[float]]
+# Lower bound on the cost of any path u -> v
+Heuristic = Callable[[Node, Node], float]
+
+
+@dataclass
+class SearchStats:
+    """Work counters for one k-shortest-paths call"""
+    spur_searches: int = 0
+    tree_hits: int = 0
+    expanded: int = 0
+
+
+class TargetTree:
+    """
+    Shortest-path tree towards one target: distance and next hop per node
+
+    Grown by a resumable reverse Dijkstra. `dist` and `next_hop` hold the
+    settled nodes only; `potential` settles further nodes on demand, so
+    a tree is shareable across every query to the same target on the
+    same graph and weights and never grows beyond what they touch.
+    """
+
+    def __init__(
+        self,
+        G: nx.Graph,
+        target: Node,
+        weight: WeightFn,
+        stats: SearchStats | None = None,
+    ):
+        self.target = target
+        self.dist: Dict[Node, float] = {}
+        self.next_hop: Dict[Node, Node] = {}
+        self.stats = stats
+
+        self._pred = G.pred if G.is_directed() else G.adj
+        self._weight = weight
+        self._tentative: Dict[Node, float] = {target: 0.0}
+        self._hop: Dict[Node, Node] = {}
+        self._heap = [(0.0, 0, target)]
+        self._tie = count(1)
+        self._key: Callable[[Node], float] | None = None
+
+    def grow(self, until: Node | None = None):
+        """Settle nodes in order until `until` is settled, or all are"""
+        heap, dist, tentative = self._heap, self.dist, self._tentative
+        pred, weight, key = self._pred, self._weight, self._key
+
+        while heap:
+            _, _, v = heapq.heappop(heap)
+            if v in dist:
+                continue
+            d = dist[v] = tentative[v]
+            if v in self._hop:
+                self.next_hop[v] = self._hop[v]
+            if self.stats is not None:
+                self.stats.expanded += 1
+
+            for u, attrs in pred[v].items():
+                if u in dist:
+                    continue
+                w = weight(u, v, attrs)
+                if w is None:
+                    continue
+                nd = d + w
+                if nd < tentative.get(u, inf):
+                    tentative[u] = nd
+                    self._hop[u] = v
+                    f = nd if key is None else nd + key(u)
+                    heapq.heappush(heap, (f, next(self._tie), u))
+
+            if v == until:
+                return
+
+    def guide(self, key: Callable[[Node], float] | None):
+        """
+        Order growth by distance + key(node) (A*), or by distance if None
+
+        Settled distances stay exact for any consistent key.
+        """
+        self._key = key
+        self._heap = [
+            (d if key is None else d + key(u), next(self._tie), u)
+            for u, d in self._tentative.items()
+            if u not in self.dist
+        ]
+        heapq.heapify(self._heap)
+
+    def potential(self, v: Node) -> Optional[float]:
+        """Exact distance from v to the target; None if unreachable"""
+        d = self.dist.get(v)
+        if d is None and self._heap:
+            self.grow(until=v)
+            d = self.dist.get(v)
+        return d
+
+
+def k_shortest_paths(
+    G: nx.Graph,
+    source: Node,
+    target: Node,
+    k: int,
+    weight: WeightFn,
+    stats: SearchStats | None = None,
+    tree: TargetTree | None = None,
+    heuristic: Heuristic | None = None,
+) -> List[Tuple[float, List[Node]]]:
+    """
+    Return up to k (cost, path) pairs in non-decreasing cost order
+
+    `weight(u, v, attrs)` returns an edge cost, or None to hide the edge.
+    `tree` is a precomputed target_tree for (G, target, weight).
+    `heuristic` switches the searches to A*; it must never overestimate.
+    """
+    if stats is None:
+        stats = SearchStats()
+    if k < 1 or source not in G or target not in G:
+        return []
+    if source == target:
+        return [(0.0, [source])]
+
+    succ = G.adj
+    undirected = not G.is_directed()
+
+    if tree is None:
+        tree = target_tree(G, target, weight, stats, source, heuristic)
+    if tree.potential(source) is None:
+        return []
+    to_target, next_hop = tree.dist, tree.next_hop
+
+    first = _tree_path(source, target, next_hop)
+    first_cum = [to_target[source] - to_target[n] for n in first]
+
+    # Accepted paths: (cost, path, cumulative cost per node, deviation index)
+    accepted = [(to_target[source], first, first_cum, 0)]
+    candidates: List[tuple] = []
+    seen = {tuple(first)}
+    tie = count()
+
+    while len(accepted) < k:
+        _, path, cum, dev = accepted[-1]
+
+        for i in range(dev, len(path) - 1):
+            spur = path[i]
+            root = path[:i + 1]
+
+            banned_edges: Set[Tuple[Node, Node]] = set()
+            for _, p, _, _ in accepted:
+                if len(p) > i + 1 and p[:i + 1] == root:
+                    banned_edges.add((p[i], p[i + 1]))
+                    if undirected:
+                        banned_edges.add((p[i + 1], p[i]))
+            banned_nodes = set(root[:-1])
+
+            found = _spur_path(
+                succ, spur, weight, banned_nodes, banned_edges, tree, stats
+            )
+            if found is None:
+                continue
+
+            spur_cost, spur_nodes, spur_cum = found
+            new_path = root[:-1] + spur_nodes
+            key = tuple(new_path)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            base = cum[i]
+            new_cum = cum[:i] + [base + c for c in spur_cum]
+            heapq.heappush(
+                candidates,
+                (base + spur_cost, next(tie), new_path, new_cum, i),
+            )
+
+        if not candidates:
+            break
+
+        cost, _, new_path, new_cum, new_dev = heapq.heappop(candidates)
+        accepted.append((cost, new_path, new_cum, new_dev))
+
+    return [(cost, path) for cost, path, _, _ in accepted]
+
+
+# --------------------
+# Shortest-path primitives
+# --------------------
+def target_tree(
+    G: nx.Graph,
+    target: Node,
+    weight: WeightFn,
+    stats: SearchStats | None = None,
+    source: Node | None = None,
+    heuristic: Heuristic | None = None,
+) -> TargetTree:
+    """
+    Reverse shortest-path tree towards `target`
+
+    With both `source` and `heuristic`, only grows (as A*) until the source
+    is settled and leaves the rest to on-demand growth; otherwise settles
+    every node that can reach the target.
+    """
+    tree = TargetTree(G, target, weight, stats)
+    if source is not None and heuristic is not None:
+        tree.guide(lambda u: heuristic(source, u))
+        tree.grow(until=source)
+        tree.guide(None)
+    else:
+        tree.grow()
+    return tree
+
+
+def _tree_path(node, target, next_hop) -> List[Node]:
+    path = [node]
+    while node != target:
+        node = next_hop[node]
+        path.append(node)
+    return path
+
+
+def _spur_path(
+    succ, spur, weight: WeightFn,
+    banned_nodes, banned_edges,
+    tree: TargetTree, stats: SearchStats,
+):
+    """
+    Shortest spur -> tree.target path avoiding the banned sets
+
+    Returns (cost, nodes, cumulative cost per node) or None.
+    """
+    to_target = tree.dist
+
+    # Lower bound: best allowed first hop plus its unrestricted distance
+    best, via, first_w = inf, None, 0.0
+    for v, attrs in succ[spur].items():
+        if v in banned_nodes or (spur, v) in banned_edges:
+            continue
+        rest = tree.potential(v)
+        if rest is None:
+            continue
+        w = weight(spur, v, attrs)
+        if w is not None and w + rest < best:
+            best, via, first_w = w + rest, v, w
+    if via is None:
+        return None
+
+    # If that hop's tree path is still usable, the bound is attained
+    path = _tree_path(via, tree.target, tree.next_hop)
+    if spur not in path and not any(n in banned_nodes for n in path):
+        stats.tree_hits += 1
+        base = to_target[via]
+        return best, [spur] + path, [0.0] + [first_w + base - to_target[n] for n in path]
+
+    stats.spur_searches += 1
+    return _astar(succ, spur, weight, banned_nodes, banned_edges, tree, stats)
+
+
+def _astar(
+    succ, source, weight: WeightFn,
+    banned_nodes, banned_edges, tree: TargetTree, stats: SearchStats,
+):
+    # Unrestricted distances to the target never overestimate restricted
+    # ones and are consistent, so they are an exact-as-possible A* heuristic
+    target = tree.target
+    p = tree.potential
+
+    dist = {source: 0.0}
+    parent = {source: None}
+    heap = [(p(source), 0, 0.0, source)]
+    tie = count(1)
+
+    while heap:
+        _, _, d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        if u == target:
+            break
+        stats.expanded += 1
+
+        for v, attrs in succ[u].items():
+            if v in banned_nodes or (u, v) in banned_edges:
+                continue
+            rest = p(v)
+            if rest is None:
+                continue
+            w = weight(u, v, attrs)
+            if w is None:
+                continue
+            nd = d + w
+            if nd < dist.get(v, inf):
+                dist[v] = nd
+                parent[v] = u
+                heapq.heappush(heap, (nd + rest, next(tie), nd, v))
+    else:
+        return None
+
+    nodes = []
+    node = target
+    while node is not None:
+        nodes.append(node)
+        node = parent[node]
+    nodes.reverse()
+    return dist[target], nodes, [dist[n] for n in nodes]
@@ -3,9 +3,20 @@ Evacuation routing algorithms
 """
 
 import networkx as nx
-from typing import List, Dict
+from typing import Callable, Dict, List, Mapping
 
+from app.config.settings import ROUTE_K_CAP
 from app.risk.scoring import total_risk_score
+from app.routing.ksp import (
+    Heuristic,
+    SearchStats,
+    TargetTree,
+    WeightFn,
+    k_shortest_paths,
+)
+from app.utils.geo import HEURISTIC_SLACK, haversine_km
+
+ROUTING_METHODS = ("astar", "dijkstra")
 
 
 def find_k_routes(
@@ -13,37 +24,79 @@ def find_k_routes(
     start: str,
     end: str,
     k: int = 3,
+    weight: str | Callable = "weight",
+    node_risk: Mapping[str, float] | None = None,
+    stats: SearchStats | None = None,
+    tree: TargetTree | None = None,
+    method: str = "astar",
 ) -> List[Dict]:
     """
     Find top-k evacuation routes using weighted shortest paths
+
+    `weight` is an edge attribute name or a NetworkX weight function, such
+    as one from RiskOverlay.weight_fn. `node_risk` supplies precomputed
+    node risk scores; without it they are derived from node attributes.
+    `tree` is a shared target_tree towards `end`. k is clamped to ROUTE_K_CAP.
+
+    `method` is "astar" (great-circle heuristic, needs node lat/lon and
+    weights no lower than base_distance_km, as RiskOverlay guarantees) or
+    "dijkstra". Both return the same costs; `stats` counts their work.
     """
+    if method not in ROUTING_METHODS:
+        raise ValueError(f"unknown routing method: {method!r}")
+
     routes: List[Dict] = []
 
     if start not in G or end not in G:
         return routes
 
-    try:
-        paths = nx.shortest_simple_paths(G, start, end, weight="weight")
+    k = min(int(k), ROUTE_K_CAP)
+    if node_risk is None:
+        node_risk = _RiskLookup(G)
 
-        for path in paths:
-            cost = float(nx.path_weight(G, path, weight="weight"))
+    heuristic = haversine_heuristic(G, start, end) if method == "astar" else None
 
+    for cost, path in k_shortest_paths(
+        G, start, end, k, weight_function(weight), stats, tree, heuristic
+    ):
+        routes.append({
+            "path": path,
+            "cost": round(float(cost), 2),
             # Count risky districts in path
-            risk_nodes = sum(
-                1 for n in path
-                if total_risk_score(G.nodes[n]) > 5.0
-            )
+            "risk_nodes": sum(1 for n in path if node_risk[n] > 5.0),
+        })
 
-            routes.append({
-                "path": path,
-                "cost": round(cost, 2),
-                "risk_nodes": risk_nodes,
-            })
+    return routes
 
-            if len(routes) >= k:
-                break
 
-    except nx.NetworkXNoPath:
-        return routes
+def weight_function(weight: str | Callable) -> WeightFn:
+    """Normalise an attribute name or weight function to a weight function"""
+    if callable(weight):
+        return weight
+    return lambda u, v, d: d.get(weight, 1)
 
-    return routes
+
+def haversine_heuristic(G: nx.Graph, start: str, end: str) -> Heuristic | None:
+    """
+    Great-circle distance between node coordinates, or None if missing
+    """
+    nodes = G.nodes
+    if not all("lat" in nodes[n] and "lon" in nodes[n] for n in (start, end)):
+        return None
+
+    def heuristic(u, v):
+        a, b = nodes[u], nodes[v]
+        return HEURISTIC_SLACK * haversine_km(a["lat"], a["lon"], b["lat"], b["lon"])
+
+    return heuristic
+
+
+class _RiskLookup(dict):
+    # Lazily scores nodes once per call when no precomputed table is given
+    def __init__(self, G: nx.Graph):
+        super().__init__()
+        self._nodes = G.nodes
+
+    def __missing__(self, n):
+        score = self[n] = total_risk_score(self._nodes[n])
+        return score
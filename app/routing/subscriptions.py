@@ -0,0 +1,275 @@
+"""
+Live route subscriptions
+
+A client subscribes to (start, end, blocked) and is sent the best route
+again only when a published snapshot changes its path or cost.
+Subscriptions towards the same end under the same scenario share one
+DynamicTree. On publish, the snapshot's risk diff names the edges whose
+weight may have changed; each shared tree is repaired in place and only
+subscriptions whose path crosses a repaired node are walked again.
+
+Idle subscriptions own no thread or timer: between publishes each is an
+awaiting coroutine plus its last route. Publishes are applied on one
+background thread, always for the newest snapshot.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from app.routing.dynamic import DynamicTree
+from app.utils.background import LatestWorker
+
+Scenario = FrozenSet[str]
+
+
+@dataclass(eq=False)
+class RouteSubscription:
+    """
+    One client's subscription; `latest` is (snapshot version, route)
+
+    `route` has the find_k_routes shape, or is None when unreachable.
+    """
+    start: str
+    end: str
+    scenario: Scenario
+    latest: Tuple[int, Optional[Dict]] = (0, None)
+    _loop: asyncio.AbstractEventLoop = field(default=None, repr=False)
+    _event: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def __post_init__(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+
+    def deliver(self, version: int, route: Optional[Dict]):
+        """Publish a new route from any thread and wake the subscriber"""
+        self.latest = (version, route)
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            pass  # event loop already closed
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for the next delivery; False on timeout"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._event.clear()
+        return True
+
+
+@dataclass
+class _SharedTree:
+    tree: Optional[DynamicTree]
+    subscribers: Set[RouteSubscription] = field(default_factory=set)
+
+
+class RouteSubscriptionHub:
+    """
+    Keeps one repaired shortest-path tree per subscribed (scenario, end)
+    """
+
+    def __init__(self):
+        self._trees: Dict[Tuple[Scenario, str], _SharedTree] = {}
+        self._snapshot = None
+        self._lock = threading.Lock()
+        # Unsubscribes wait here instead of blocking the event loop on the lock
+        self._leaving: Deque[RouteSubscription] = deque()
+        self._worker = LatestWorker("route-subscriptions", self.apply)
+
+        self.publishes = 0
+        self.notified = 0
+        self.last_update_seconds: Optional[float] = None
+
+    # --------------------
+    # Subscribers
+    # --------------------
+    def subscribe(
+        self,
+        snapshot,
+        start: str,
+        end: str,
+        blocked: Iterable[str] | None = None,
+    ) -> RouteSubscription:
+        """
+        Register from the event loop; `latest` holds the current route
+
+        Building a new tree runs a full search on the calling thread; async
+        callers should use `subscribe_async`.
+        """
+        sub = RouteSubscription(start, end, frozenset(blocked or ()))
+        self._register(snapshot, sub)
+        return sub
+
+    async def subscribe_async(
+        self,
+        snapshot,
+        start: str,
+        end: str,
+        blocked: Iterable[str] | None = None,
+    ) -> RouteSubscription:
+        """`subscribe` with the registration run off the event loop"""
+        sub = RouteSubscription(start, end, frozenset(blocked or ()))
+        await asyncio.to_thread(self._register, snapshot, sub)
+        return sub
+
+    def _register(self, snapshot, sub: RouteSubscription):
+        key = (sub.scenario, sub.end)
+        while True:
+            with self._lock:
+                self._drop_leaving()
+                if self._snapshot is None or (
+                    not self._trees and snapshot.version > self._snapshot.version
+                ):
+                    self._snapshot = snapshot
+                snap = self._snapshot
+                entry = self._trees.get(key)
+                if entry is not None:
+                    self._attach(entry, snap, sub)
+                    return
+
+            # The search runs outside the lock, so publishes are not held up
+            tree = _build_tree(snap, sub.scenario, sub.end)
+
+            with self._lock:
+                if self._snapshot is snap:
+                    entry = self._trees.setdefault(key, _SharedTree(tree))
+                    self._attach(entry, snap, sub)
+                    return
+            # A publish moved on meanwhile: build again on the newer snapshot
+
+    def _attach(self, entry: _SharedTree, snapshot, sub: RouteSubscription):
+        # Caller holds the lock
+        sub.latest = (snapshot.version, _tree_route(entry.tree, snapshot, sub.start))
+        entry.subscribers.add(sub)
+
+    def unsubscribe(self, sub: RouteSubscription):
+        """Never blocks: dropped now if the lock is free, else by the holder"""
+        self._leaving.append(sub)
+        if self._lock.acquire(blocking=False):
+            try:
+                self._drop_leaving()
+            finally:
+                self._lock.release()
+
+    def _drop_leaving(self):
+        # Caller holds the lock
+        while self._leaving:
+            sub = self._leaving.popleft()
+            entry = self._trees.get((sub.scenario, sub.end))
+            if entry is None:
+                continue
+            entry.subscribers.discard(sub)
+            if not entry.subscribers:
+                del self._trees[sub.scenario, sub.end]
+
+    # --------------------
+    # Publishing
+    # --------------------
+    def on_publish(self, snapshot):
+        self._worker.submit(snapshot)
+
+    def apply(self, snapshot):
+        """
+        Move every tree to `snapshot` and notify subscribers whose route
+        changed; trees are repaired when the snapshot diffs against the
+        one they were built on, rebuilt otherwise
+        """
+        started = time.perf_counter()
+        G = snapshot.graph
+        diff = snapshot.diff
+        changed = diff.risk_changed | diff.type_changed
+        edges = [(n, nbr) for n in changed for nbr in G.adj[n]]
+
+        # Trees are repaired (on copies) or rebuilt outside the lock, then
+        # swapped in together; trees registered meanwhile on the old
+        # snapshot are picked up by the next round
+        done: Dict[Tuple[Scenario, str], Tuple[Optional[DynamicTree], Optional[Set[str]]]] = {}
+        while True:
+            with self._lock:
+                prev = self._snapshot
+                if prev is not None and snapshot.version <= prev.version:
+                    return
+                self._drop_leaving()
+                pending = {k: e.tree for k, e in self._trees.items() if k not in done}
+                if not pending:
+                    self._snapshot = snapshot
+                    self.publishes += 1
+                    for key, entry in self._trees.items():
+                        entry.tree, touched = done[key]
+                        self._notify(entry, snapshot, touched)
+                    break
+
+            incremental = (
+                prev is not None
+                and snapshot.previous_version == prev.version
+                and not diff.full
+            )
+            for (scenario, end), tree in pending.items():
+                if incremental and tree is not None:
+                    tree = tree.copy()
+                    touched = tree.update(G, snapshot.overlay.weight_fn(scenario), edges)
+                else:
+                    tree = _build_tree(snapshot, scenario, end)
+                    touched = None
+                done[scenario, end] = (tree, touched)
+
+        self.last_update_seconds = time.perf_counter() - started
+
+    def _notify(self, entry: _SharedTree, snapshot, touched: Optional[Set[str]]):
+        # Caller holds the lock. A route can only change if a node on its
+        # path (or its start, when it had none) was relabelled
+        for sub in entry.subscribers:
+            _, old = sub.latest
+            if touched is not None:
+                nodes = old["path"] if old else (sub.start,)
+                if touched.isdisjoint(nodes):
+                    continue
+            route = _tree_route(entry.tree, snapshot, sub.start)
+            if _route_key(route) != _route_key(old):
+                sub.deliver(snapshot.version, route)
+                self.notified += 1
+
+    # --------------------
+    # Introspection
+    # --------------------
+    def stats(self) -> Dict:
+        with self._lock:
+            self._drop_leaving()
+            return {
+                "version": self._snapshot.version if self._snapshot else None,
+                "trees": len(self._trees),
+                "subscriptions": sum(len(e.subscribers) for e in self._trees.values()),
+                "publishes": self.publishes,
+                "notified": self.notified,
+                "last_update_seconds": self.last_update_seconds,
+            }
+
+
+def _build_tree(snapshot, scenario: Scenario, end: str) -> Optional[DynamicTree]:
+    if end not in snapshot.graph:
+        return None
+    return DynamicTree(snapshot.graph, end, snapshot.overlay.weight_fn(scenario))
+
+
+def _tree_route(tree: Optional[DynamicTree], snapshot, start: str) -> Optional[Dict]:
+    path = tree.path(start) if tree is not None else None
+    if path is None:
+        return None
+    node_risk = snapshot.overlay.node_risk
+    return {
+        "path": path,
+        "cost": round(float(tree.dist[start]), 2),
+        "risk_nodes": sum(1 for n in path if node_risk[n] > 5.0),
+    }
+
+
+def _route_key(route: Optional[Dict]) -> Optional[Tuple[List[str], float]]:
+    return None if route is None else (route["path"], route["cost"])
+
+
+route_subscriptions = RouteSubscriptionHub()
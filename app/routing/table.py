@@ -0,0 +1,333 @@
+"""
+Precomputed route tables
+
+With a handful of districts and only 2^3 blocked-type subsets, every
+(start, end, blocked, k) answer can be computed once per graph snapshot.
+Requests then answer from a dict lookup and fall back to live search only
+for inputs outside the table (unknown blocked types, k above the table's).
+
+When a snapshot's risk diff is small, the next table is derived from the
+previous one and only entries the diff can affect are recomputed.
+"""
+
+import itertools
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from math import inf
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import networkx as nx
+
+from app.config.settings import DISASTER_TYPES, ROUTE_TABLE_K, ROUTE_TABLE_WORKERS
+from app.graph.filters import RiskOverlay
+from app.routing.paths import find_k_routes
+from app.utils.background import LatestWorker
+
+Scenario = FrozenSet[str]
+RouteKey = Tuple[Scenario, str, str]
+EdgeKey = Tuple[str, str]
+
+
+def standard_scenarios(types: Iterable[str] = DISASTER_TYPES) -> List[Scenario]:
+    """Every subset of the selectable disaster types"""
+    types = list(types)
+    return [
+        frozenset(combo)
+        for r in range(len(types) + 1)
+        for combo in itertools.combinations(types, r)
+    ]
+
+
+@dataclass
+class RouteTable:
+    """
+    Top-k routes for every ordered district pair and standard scenario
+    """
+    version: int
+    k: int
+    routes: Dict[RouteKey, List[Dict]]
+    build_seconds: float
+    workers: int
+    stats: Dict = field(default_factory=dict)
+
+    def lookup(
+        self,
+        start: str,
+        end: str,
+        blocked: Iterable[str] | None,
+        k: int,
+    ) -> Optional[List[Dict]]:
+        """Return the first k routes, or None if the input is not tabled"""
+        if k < 1 or k > self.k:
+            return None
+        routes = self.routes.get((frozenset(blocked or ()), start, end))
+        return None if routes is None else routes[:k]
+
+
+def build_route_table(
+    version: int,
+    G: nx.Graph,
+    overlay: RiskOverlay | None = None,
+    k: int = ROUTE_TABLE_K,
+    workers: int = ROUTE_TABLE_WORKERS,
+) -> RouteTable:
+    """
+    Compute top-k routes for all ordered pairs under every standard scenario
+    """
+    started = time.perf_counter()
+    scenarios = standard_scenarios()
+
+    routes: Dict[RouteKey, List[Dict]] = {}
+    if workers > 0:
+        # Workers rebuild the overlay: its weight closures don't pickle
+        parts = _process_pool(workers).map(
+            _scenario_routes,
+            itertools.repeat(G),
+            scenarios,
+            itertools.repeat(k),
+        )
+        for part in parts:
+            routes.update(part)
+    else:
+        overlay = overlay or RiskOverlay(G)
+        for scenario in scenarios:
+            routes.update(_scenario_routes(G, scenario, k, overlay))
+
+    build_seconds = time.perf_counter() - started
+    return RouteTable(
+        version=version,
+        k=k,
+        routes=routes,
+        build_seconds=build_seconds,
+        workers=workers,
+        stats={
+            "entries": len(routes),
+            "scenarios": len(scenarios),
+            "approx_bytes": _deep_sizeof(routes),
+            "build_seconds": round(build_seconds, 4),
+        },
+    )
+
+
+# (size, pool) kept for the life of the process, so builds reuse its workers
+_pool: Optional[Tuple[int, ProcessPoolExecutor]] = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool[0] != workers:
+            if _pool is not None:
+                _pool[1].shutdown(wait=False)
+            _pool = (workers, ProcessPoolExecutor(max_workers=workers))
+        return _pool[1]
+
+
+def refresh_route_table(
+    table: RouteTable,
+    old_overlay: RiskOverlay,
+    version: int,
+    overlay: RiskOverlay,
+) -> RouteTable:
+    """
+    Table for a new snapshot of the same topology, reusing the entries
+    that `overlay.diff` cannot affect
+
+    An entry survives if none of its paths uses an edge next to a changed
+    node (so its costs and risk counts are unchanged) and no edge that got
+    cheaper can put a new path below its k-th cost.
+    """
+    started = time.perf_counter()
+    G = overlay.graph
+    # Tables never hide blocked nodes, so blocked-only changes don't matter
+    changed = overlay.diff.risk_changed | overlay.diff.type_changed
+
+    routes: Dict[RouteKey, List[Dict]] = {}
+    recomputed = 0
+    for scenario in standard_scenarios() if changed else ():
+        view, weight = overlay.routing_inputs(blocked_disaster_types=list(scenario))
+        old_weight = old_overlay.weight_fn(scenario)
+
+        touched: Set[EdgeKey] = set()
+        cheaper: List[Tuple[str, str, float]] = []
+        for n in changed:
+            for nbr, attrs in G.adj[n].items():
+                touched.add((n, nbr))
+                touched.add((nbr, n))
+                w = weight(n, nbr, attrs)
+                if w < old_weight(n, nbr, attrs):
+                    cheaper.append((n, nbr, w))
+
+        # Distances from both ends of every cheaper edge bound the cost of
+        # any path that uses it
+        dist = {
+            x: nx.single_source_dijkstra_path_length(view, x, weight=weight)
+            for x in {x for u, v, _ in cheaper for x in (u, v)}
+        }
+
+        for start, end in itertools.permutations(G.nodes, 2):
+            key = (scenario, start, end)
+            cached = table.routes.get(key)
+            if cached is not None and _still_valid(
+                cached, start, end, table.k, touched, cheaper, dist
+            ):
+                routes[key] = cached
+                continue
+            routes[key] = find_k_routes(
+                view, start, end, k=table.k,
+                weight=weight,
+                node_risk=overlay.node_risk,
+            )
+            recomputed += 1
+
+    approx_bytes = table.stats.get("approx_bytes")
+    if not changed:
+        routes = dict(table.routes)
+    elif recomputed:
+        approx_bytes = _deep_sizeof(routes)
+
+    build_seconds = time.perf_counter() - started
+    return RouteTable(
+        version=version,
+        k=table.k,
+        routes=routes,
+        build_seconds=build_seconds,
+        workers=0,
+        stats={
+            "entries": len(routes),
+            "scenarios": table.stats.get("scenarios"),
+            "approx_bytes": approx_bytes,
+            "build_seconds": round(build_seconds, 4),
+            "refreshed_from": table.version,
+            "recomputed": recomputed,
+        },
+    )
+
+
+def _still_valid(routes, start, end, k, touched, cheaper, dist) -> bool:
+    for route in routes:
+        path = route["path"]
+        if any(e in touched for e in zip(path, path[1:])):
+            return False
+
+    # Fewer than k routes means every path is listed, so any path over a
+    # cheaper edge was caught above
+    if len(routes) < k or not cheaper:
+        return True
+
+    # Costs are rounded to 2 places; keep a margin above the k-th one
+    kth = routes[-1]["cost"] + 0.005
+    for u, v, w in cheaper:
+        du, dv = dist[u], dist[v]
+        bound = min(
+            du.get(start, inf) + w + dv.get(end, inf),
+            dv.get(start, inf) + w + du.get(end, inf),
+        )
+        if bound <= kth:
+            return False
+    return True
+
+
+def _scenario_routes(
+    G: nx.Graph,
+    scenario: Scenario,
+    k: int,
+    overlay: RiskOverlay | None = None,
+) -> Dict[RouteKey, List[Dict]]:
+    overlay = overlay or RiskOverlay(G)
+    view, weight = overlay.routing_inputs(blocked_disaster_types=list(scenario))
+
+    part: Dict[RouteKey, List[Dict]] = {}
+    for start, end in itertools.permutations(G.nodes, 2):
+        part[scenario, start, end] = find_k_routes(
+            view, start, end, k=k,
+            weight=weight,
+            node_risk=overlay.node_risk,
+        )
+    return part
+
+
+def _deep_sizeof(obj, seen=None) -> int:
+    # Rough resident size of nested dict/list/tuple/set/str containers
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(x, seen) for x in obj)
+    return size
+
+
+class RouteTableManager:
+    """
+    Holds the route table for the newest snapshot
+
+    Tables are built on one background thread, always for the newest
+    published snapshot; until the table for the current snapshot is ready,
+    lookups miss and callers search live. A snapshot diffed against the
+    table's version refreshes it incrementally.
+    """
+
+    def __init__(self):
+        self._table: Optional[RouteTable] = None
+        self._overlay: Optional[RiskOverlay] = None
+        self._lock = threading.Lock()
+        self._worker = LatestWorker("route-table", self.build)
+
+    def on_publish(self, snapshot):
+        self._worker.submit(snapshot)
+
+    def build(self, snapshot) -> RouteTable:
+        with self._lock:
+            previous, old_overlay = self._table, self._overlay
+
+        if (
+            previous is not None
+            and previous.version == snapshot.previous_version
+            and previous.k == ROUTE_TABLE_K
+            and not snapshot.diff.full
+            and not snapshot.graph.is_directed()
+        ):
+            table = refresh_route_table(
+                previous, old_overlay, snapshot.version, snapshot.overlay
+            )
+        else:
+            table = build_route_table(snapshot.version, snapshot.graph, snapshot.overlay)
+
+        with self._lock:
+            if self._table is None or table.version > self._table.version:
+                self._table = table
+                self._overlay = snapshot.overlay
+        return table
+
+    def lookup(
+        self,
+        snapshot,
+        start: str,
+        end: str,
+        blocked: Iterable[str] | None,
+        k: int,
+    ) -> Optional[List[Dict]]:
+        table = self._table
+        if table is None or table.version != snapshot.version:
+            return None
+        return table.lookup(start, end, blocked, k)
+
+    def stats(self) -> Dict:
+        table = self._table
+        builds = {"builds": self._worker.runs, "coalesced": self._worker.coalesced}
+        if table is None:
+            return {"ready": False, **builds}
+        return {"ready": True, "version": table.version, "k": table.k, **table.stats, **builds}
+
+
+route_tables = RouteTableManager()
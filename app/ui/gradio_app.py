@@ -6,13 +6,14 @@ import json
 import gradio as gr
 
 from app.data.districts import get_all_districts
-from app.graph.builder import build_district_graph, enrich_graph_with_live_data
-from app.graph.filters import apply_risk_weights
+from app.graph.snapshot import get_snapshot, snapshot_manager
+from app.graph.refresher import live_refresher
+from app.config.settings import DISASTER_TYPES
 from app.routing.paths import find_k_routes
-from app.visualization.map import build_evacuation_map
-from app.visualization.utils import route_to_latlon
-from app.data_sources.safehouses import fetch_safehouses
-from app.utils.geo import haversine_km
+from app.routing.table import route_tables
+from app.visualization.map import cached_evacuation_map, invalidate_maps
+from app.data_sources.safehouses import fetch_safehouse_index, safehouses_degraded
+from app.utils.resilience import latency_budget
 
 
 def compute_evacuation(
@@ -22,50 +23,53 @@ def compute_evacuation(
     k_routes: int,
 ):
     # --------------------
-    # Build backend engine
+    # Read current graph snapshot
     # --------------------
-    G, positions = build_district_graph()
-    G = enrich_graph_with_live_data(G)
-    H = apply_risk_weights(
-        G,
-        blocked_disaster_types=blocked_disasters,
-        start=start,
-        end=end,
-    )
+    snap = get_snapshot()
+    positions = snap.positions
 
     # --------------------
     # Routing
     # --------------------
-    routes = find_k_routes(H, start, end, k=k_routes)
+    k_routes = int(k_routes)
+    routes = route_tables.lookup(snap, start, end, blocked_disasters, k_routes)
+    if routes is None:
+        view, weight = snap.overlay.routing_inputs(
+            blocked_disaster_types=blocked_disasters,
+            start=start,
+            end=end,
+        )
+        routes = find_k_routes(
+            view, start, end, k=k_routes,
+            weight=weight,
+            node_risk=snap.overlay.node_risk,
+        )
     if not routes:
         return "No evacuation route found.", "<p>No map</p>"
 
     chosen = routes[0]
-    route_coords = route_to_latlon(chosen["path"], positions)
 
     # --------------------
     # Safehouses near destination
     # --------------------
     lat_end, lon_end = positions[end]
-    safehouses = fetch_safehouses()
+    with latency_budget():
+        index = fetch_safehouse_index()
 
-    ranked = []
-    for sh in safehouses:
-        d = haversine_km(lat_end, lon_end, sh["lat"], sh["lon"])
-        ranked.append({
+    top_safehouses = [
+        {
             "safehouse": sh,
             "distance_km": d,
             "route_coords": [(lat_end, lon_end), (sh["lat"], sh["lon"])],
-        })
-
-    ranked.sort(key=lambda x: x["distance_km"])
-    top_safehouses = ranked[:3]
+        }
+        for d, sh in index.k_nearest(lat_end, lon_end, 3)
+    ]
 
     # --------------------
     # Visualization
     # --------------------
-    map_html = build_evacuation_map(
-        route_coords=route_coords,
+    map_html = cached_evacuation_map(
+        path=chosen["path"],
         start=start,
         end=end,
         positions=positions,
@@ -87,6 +91,9 @@ def compute_evacuation(
             }
             for s in top_safehouses
         ],
+        "degraded": sorted(
+            snap.degraded | ({"overpass"} if safehouses_degraded() else set())
+        ),
     }
 
     return json.dumps(summary, indent=2), map_html
@@ -94,6 +101,11 @@ def compute_evacuation(
 
 def launch_app():
     districts = get_all_districts()
+    snapshot_manager.add_listener(route_tables.on_publish)
+    snapshot_manager.add_listener(invalidate_maps)
+    snapshot_manager.refresh()
+    fetch_safehouse_index()
+    live_refresher.start()
 
     with gr.Blocks(title="J&K Evacuation Routing System") as demo:
         gr.Markdown("# 🚨 J&K Disaster-Aware Evacuation Routing")
@@ -113,7 +125,7 @@ def launch_app():
         with gr.Row():
             blocked = gr.CheckboxGroup(
                 label="Treat these disaster types as blocked",
-                choices=["flood", "landslide", "earthquake"],
+                choices=DISASTER_TYPES,
             )
             k_routes = gr.Slider(
                 minimum=1,
@@ -0,0 +1,63 @@
+"""
+Background work driven by snapshot publishes
+"""
+
+import threading
+from typing import Any, Callable, Optional
+
+
+class LatestWorker:
+    """
+    One daemon thread that runs `fn` on the newest submitted item
+
+    Items submitted while a run is in progress replace each other, so a
+    burst of publishes costs at most one more run, on the latest item,
+    and runs never overlap.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Any]):
+        self.name = name
+        self._fn = fn
+        self._cond = threading.Condition()
+        self._pending: Any = None
+        self._has_pending = False
+        self._busy = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.runs = 0
+        self.coalesced = 0
+
+    def submit(self, item: Any):
+        with self._cond:
+            if self._has_pending:
+                self.coalesced += 1
+            self._pending = item
+            self._has_pending = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until nothing is pending or running; False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not (self._has_pending or self._busy), timeout
+            )
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._has_pending)
+                item, self._pending = self._pending, None
+                self._has_pending = False
+                self._busy = True
+            try:
+                self._fn(item)
+            except Exception:
+                pass
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self.runs += 1
+                    self._cond.notify_all()
@@ -1,29 +1,682 @@
 """
-Lightweight in-memory cache utilities
+TTL/LRU caches for upstream data, optionally shared across workers
+
+Each TTLCache is a bounded in-process LRU with per-entry expiry and
+stale-while-revalidate. Given a shared backend (see `cache_backends`),
+it also writes entries through to storage common to every worker, so
+one worker's upstream fetch serves the others.
 """
 
-from typing import Any, Dict, Tuple
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Sequence, Set, Tuple
+
+from app.config.settings import (
+    CACHE_COUNTER_FLUSH_S,
+    CACHE_LEASE_POLL_S,
+    CACHE_LEASE_S,
+    COORD_CACHE_TTL_S,
+    COORD_CACHE_MAXSIZE,
+    WEATHER_CACHE_TTL_S,
+    WEATHER_CACHE_STALE_S,
+    WEATHER_CACHE_MAXSIZE,
+    EARTHQUAKE_CACHE_TTL_S,
+    EARTHQUAKE_CACHE_STALE_S,
+    EARTHQUAKE_CACHE_MAXSIZE,
+    SAFEHOUSE_CACHE_TTL_S,
+    SAFEHOUSE_CACHE_STALE_S,
+    SAFEHOUSE_CACHE_MAXSIZE,
+    MAP_CACHE_TTL_S,
+    MAP_CACHE_MAXSIZE,
+)
+from app.utils.cache_backends import CacheBackend, shared_backend
+from app.utils.resilience import cache_backend_breaker, remaining_budget
+
+# Counters summed across workers in the shared tier
+_SHARED_COUNTERS = ("hits", "misses", "stale_serves", "shared_hits", "cross_worker_hits", "loads")
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-cache expiry and stale-while-revalidate
+
+    An entry is fresh for `ttl` seconds. After that it may still be served
+    for up to `stale_ttl` more seconds by `get_or_load`, which returns the
+    stale value immediately and refreshes it on a single background thread.
+
+    Entries stored with `degraded=True` (fallbacks served while an upstream
+    fails) carry their own short ttl, are never served stale and stay in
+    this worker: other workers wait for, or load, a real value instead.
+
+    With a shared `backend`, the LRU is a first tier in front of storage
+    common to all workers: entries are written through, a local miss or
+    expired entry is looked up there, and a miss is loaded by one worker
+    at a time (under a lease) while the others wait for its result.
+    Backend failures only cost the shared tier, never the caller.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        maxsize: int,
+        stale_ttl: float = 0.0,
+        backend: CacheBackend | None = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stale_ttl = stale_ttl
+        self.backend = backend if backend is not None and backend.shared else None
 
+        # key -> (value, stored_at (wall clock), ttl, degraded, origin pid)
+        self._store: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._refreshing: Set[Hashable] = set()
 
-class SimpleCache:
-    def __init__(self):
-        self._store: Dict[Any, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_serves = 0
+        self.degraded_sets = 0
+        self.shared_hits = 0  # hits served from the shared tier
+        self.cross_worker_hits = 0  # ... on entries another process stored
+        self.loads = 0  # loader calls that completed
+        self.shared_errors = 0
 
-    def get(self, key):
-        return self._store.get(key)
+        self._flushed: Dict[str, int] = dict.fromkeys(_SHARED_COUNTERS, 0)
+        self._flushed_at = time.time()
 
-    def set(self, key, value):
-        self._store[key] = value
+    # --------------------
+    # Basic access
+    # --------------------
+    def get(self, key, default=None):
+        """Return a fresh value, or `default` if missing or expired"""
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Fresh values for whichever `keys` have one, in one shared-tier round trip"""
+        found: Dict[Hashable, Any] = {}
+        missing: List[Hashable] = []
+        with self._lock:
+            for key in keys:
+                entry = self._store.get(key)
+                if entry is not None and self._fresh(entry):
+                    self._store.move_to_end(key)
+                    self.hits += 1
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+
+        if missing:
+            shared = self._fetch_shared(missing)
+            with self._lock:
+                for key in missing:
+                    entry = shared.get(key)
+                    if entry is not None and self._fresh(entry):
+                        self._count_shared_hit(entry)
+                        found[key] = entry[0]
+                    else:
+                        self.misses += 1
+        self._maybe_flush()
+        return found
+
+    def set(
+        self,
+        key,
+        value,
+        ttl: float | None = None,
+        degraded: bool = False,
+        stored_at: float | None = None,
+    ):
+        """
+        Store a value; `ttl` overrides the cache's for this entry
+
+        `stored_at` (wall-clock seconds) backdates entries obtained earlier,
+        such as ones reloaded from disk.
+        """
+        self.set_many([(key, value)], ttl, degraded, stored_at)
+
+    def set_many(
+        self,
+        items: Iterable[Tuple[Hashable, Any]],
+        ttl: float | None = None,
+        degraded: bool = False,
+        stored_at: float | None = None,
+    ):
+        """Store several (key, value) pairs with the same ttl and flags"""
+        meta = (
+            time.time() if stored_at is None else stored_at,
+            self.ttl if ttl is None else ttl,
+            degraded,
+            os.getpid(),
+        )
+        entries = [(key, (value, *meta)) for key, value in items]
+        with self._lock:
+            for key, entry in entries:
+                self._put(key, entry)
+            if degraded:
+                self.degraded_sets += len(entries)
+        self._write_shared(entries)
+
+    def peek(self, key, default=None):
+        """Return any stored value, fresh or expired, without touching stats"""
+        entry = self._current(key)
+        return default if entry is None else entry[0]
 
     def exists(self, key) -> bool:
-        return key in self._store
+        """True if a fresh entry is present"""
+        entry = self._current(key)
+        return entry is not None and self._fresh(entry)
+
+    def is_degraded(self, key) -> bool:
+        """True if the stored value, fresh or not, is a degraded fallback"""
+        entry = self._current(key)
+        return entry is not None and entry[3]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._store.pop(key, None)
+        if self.backend is not None:
+            self._shared_call(self.backend.delete_many, self.name, [key])
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Drop every matching entry here and in the shared tier
+
+        Returns how many were dropped. Other workers' LRUs keep their
+        copies until those expire.
+        """
+        with self._lock:
+            stale = [key for key in self._store if predicate(key)]
+            for key in stale:
+                del self._store[key]
+        if self.backend is not None:
+            shared = self._shared_call(self.backend.keys, self.name, default=[])
+            matched = [key for key in shared if predicate(key)]
+            if matched:
+                self._shared_call(self.backend.delete_many, self.name, matched)
+            stale = set(stale).union(matched)
+        return len(stale)
 
     def clear(self):
-        self._store.clear()
+        with self._lock:
+            self._store.clear()
+        if self.backend is not None:
+            self._shared_call(self.backend.clear, self.name)
+
+    # --------------------
+    # Read-through access
+    # --------------------
+    def get_or_load(self, key, loader: Callable[[], Any]):
+        """
+        Return the cached value, loading it on a miss
+
+        Expired entries inside the stale window are returned as-is while a
+        single background refresh runs. Loader exceptions propagate on a
+        synchronous miss and are swallowed (keeping the stale value) on a
+        background refresh.
+        """
+        found, entry = self._lookup(key)
+        if found:
+            if not self._fresh(entry):
+                with self._lock:
+                    self._schedule_refresh(key, loader)
+            return entry[0]
+
+        entry, leased = self._claim(key)
+        if entry is not None:
+            return entry[0]
+        try:
+            value = loader()
+            self._loaded(key, value)
+        finally:
+            if leased:
+                self._release(key)
+        return value
+
+    async def get_or_load_async(self, key, loader: Callable[[], Awaitable[Any]]):
+        """
+        Async counterpart of `get_or_load`; `loader` returns a coroutine
+
+        Stale refreshes run as a task on the current event loop, and
+        shared-tier round trips run on worker threads.
+        """
+        found, entry = await self._off_loop(self._lookup, key)
+        if found:
+            if not self._fresh(entry):
+                with self._lock:
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        # Fresh context: the refresh must not inherit the
+                        # triggering request's state (e.g. its latency budget)
+                        asyncio.get_running_loop().create_task(
+                            self._refresh_async(key, loader),
+                            context=contextvars.Context(),
+                        )
+            return entry[0]
+
+        entry, leased = await self._claim_async(key)
+        if entry is not None:
+            return entry[0]
+        try:
+            value = await loader()
+            await self._off_loop(self._loaded, key, value)
+        finally:
+            if leased:
+                await self._off_loop(self._release, key)
+        return value
+
+    def _lookup(self, key) -> Tuple[bool, tuple | None]:
+        # (servable, entry): a fresh entry, or a stale one within the window
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is not None and self._fresh(entry):
+                self._store.move_to_end(key)
+                self.hits += 1
+                return True, entry
+
+        if self.backend is not None:
+            entry = self._fetch_shared([key]).get(key, entry)
+
+        with self._lock:
+            if entry is not None:
+                if self._fresh(entry):
+                    self._count_shared_hit(entry)
+                    return True, entry
+                if self._servable_stale(entry):
+                    if key in self._store:
+                        self._store.move_to_end(key)
+                    self.stale_serves += 1
+                    return True, entry
+            self.misses += 1
+        self._maybe_flush()
+        return False, None
+
+    async def _off_loop(self, fn: Callable, *args):
+        # Backend calls block on I/O, so keep them off the event loop;
+        # purely local work is cheaper run in place
+        if self.backend is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    def _loaded(self, key, value):
+        with self._lock:
+            self.loads += 1
+        self.set(key, value)
+        self._maybe_flush()
+
+    async def _refresh_async(self, key, loader: Callable[[], Awaitable[Any]]):
+        try:
+            # Another worker holding the lease is refreshing it already
+            if await self._off_loop(self._acquire, key):
+                try:
+                    await self._off_loop(self._loaded, key, await loader())
+                finally:
+                    await self._off_loop(self._release, key)
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key, loader: Callable[[], Any]):
+        # Caller holds the lock
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        def _run():
+            try:
+                if self._acquire(key):
+                    try:
+                        self._loaded(key, loader())
+                    finally:
+                        self._release(key)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(
+            target=_run,
+            name=f"cache-refresh-{self.name}",
+            daemon=True,
+        ).start()
+
+    # --------------------
+    # Load coordination between workers
+    # --------------------
+    def _claim(self, key) -> Tuple[tuple | None, bool]:
+        """
+        Either a result another worker loaded meanwhile, or the right to load
+
+        Returns (entry, leased). While another worker holds the lease this
+        polls the shared tier for its result, for at most CACHE_LEASE_S or
+        the remaining latency budget; after that it loads without a lease.
+        """
+        if self.backend is None:
+            return None, False
+        deadline = time.monotonic() + self._lease_wait()
+        while not self._acquire(key):
+            if time.monotonic() >= deadline:
+                return None, False
+            time.sleep(CACHE_LEASE_POLL_S)
+            entry = self._shared_result(key)
+            if entry is not None:
+                return entry, False
+        return self._after_acquire(key)
+
+    async def _claim_async(self, key) -> Tuple[tuple | None, bool]:
+        if self.backend is None:
+            return None, False
+        deadline = time.monotonic() + self._lease_wait()
+        while not await self._off_loop(self._acquire, key):
+            if time.monotonic() >= deadline:
+                return None, False
+            await asyncio.sleep(CACHE_LEASE_POLL_S)
+            entry = await self._off_loop(self._shared_result, key)
+            if entry is not None:
+                return entry, False
+        return await self._off_loop(self._after_acquire, key)
+
+    def _after_acquire(self, key) -> Tuple[tuple | None, bool]:
+        # The previous holder may have stored its result just before we won
+        entry = self._shared_result(key)
+        if entry is not None:
+            self._release(key)
+            return entry, False
+        return None, True
+
+    def claim_many(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], List, List]:
+        """
+        Coordinate a batch load of `keys` with the other workers
+
+        Returns (found, mine, theirs): fresh values that landed in the
+        shared tier meanwhile, keys now leased to this worker (load them,
+        then `release_many`), and keys another worker is loading (collect
+        them with `wait_many`).
+        """
+        keys = list(keys)
+        if self.backend is None:
+            return {}, keys, []
+        granted = self._shared_call(
+            self.backend.try_lease_many, self.name, keys, CACHE_LEASE_S, default=None
+        )
+        if granted is None:
+            return {}, keys, []
+        mine = [k for k, ok in zip(keys, granted) if ok]
+        theirs = [k for k, ok in zip(keys, granted) if not ok]
+
+        found = {k: e[0] for k, e in self._shared_results(mine).items()}
+        if found:
+            self.release_many(list(found))
+            mine = [k for k in mine if k not in found]
+        return found, mine, theirs
+
+    def release_many(self, keys: Sequence[Hashable]):
+        if self.backend is not None and keys:
+            self._shared_call(self.backend.release_lease_many, self.name, keys)
+
+    def wait_many(self, keys: Sequence[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Values other workers store for `keys`, waiting as `_claim` does
+
+        Keys still missing when the wait runs out are left out; the caller
+        loads those itself.
+        """
+        found: Dict[Hashable, Any] = {}
+        pending = list(keys)
+        deadline = time.monotonic() + self._lease_wait()
+        while pending and time.monotonic() < deadline:
+            time.sleep(CACHE_LEASE_POLL_S)
+            found.update((k, e[0]) for k, e in self._shared_results(pending).items())
+            pending = [k for k in pending if k not in found]
+        return found
+
+    async def wait_many_async(self, keys: Sequence[Hashable]) -> Dict[Hashable, Any]:
+        """Async counterpart of `wait_many`"""
+        found: Dict[Hashable, Any] = {}
+        pending = list(keys)
+        deadline = time.monotonic() + self._lease_wait()
+        while pending and time.monotonic() < deadline:
+            await asyncio.sleep(CACHE_LEASE_POLL_S)
+            results = await self._off_loop(self._shared_results, pending)
+            found.update((k, e[0]) for k, e in results.items())
+            pending = [k for k in pending if k not in found]
+        return found
+
+    def _lease_wait(self) -> float:
+        budget = remaining_budget()
+        return CACHE_LEASE_S if budget is None else max(0.0, min(CACHE_LEASE_S, budget))
+
+    def _acquire(self, key) -> bool:
+        # Without a reachable shared tier every worker loads for itself
+        if self.backend is None:
+            return True
+        return self._shared_call(
+            self.backend.try_lease, self.name, key, CACHE_LEASE_S, default=True
+        )
+
+    def _release(self, key):
+        if self.backend is not None:
+            self._shared_call(self.backend.release_lease, self.name, key)
+
+    def _shared_result(self, key) -> tuple | None:
+        return self._shared_results([key]).get(key)
+
+    def _shared_results(self, keys: Sequence[Hashable]) -> Dict[Hashable, tuple]:
+        # Fresh, non-degraded results of the lease holder, which may be
+        # another worker or a concurrent caller in this one
+        if not keys:
+            return {}
+        fetched = self._fetch_shared(keys)
+        fresh = {}
+        with self._lock:
+            for key in keys:
+                entry = fetched.get(key) or self._store.get(key)
+                if entry is None or not self._fresh(entry) or entry[3]:
+                    continue
+                fresh[key] = entry
+                if key in fetched:
+                    self._count_shared_hit(entry)
+                else:
+                    self.hits += 1
+        return fresh
+
+    # --------------------
+    # Shared tier
+    # --------------------
+    def _shared_call(self, method, *args, default=None):
+        try:
+            with cache_backend_breaker:
+                return method(*args)
+        except Exception:
+            with self._lock:
+                self.shared_errors += 1
+            return default
+
+    def _fetch_shared(self, keys: Sequence[Hashable]) -> Dict[Hashable, tuple]:
+        """
+        Shared entries newer than the local ones, adopted into the LRU
+
+        Returns only the adopted entries; keys whose local entry is at
+        least as recent are left out.
+        """
+        if self.backend is None:
+            return {}
+        fetched = self._shared_call(self.backend.get_many, self.name, keys, default={})
+        adopted = {}
+        with self._lock:
+            for key, entry in fetched.items():
+                local = self._store.get(key)
+                if local is None or entry[1] > local[1]:
+                    self._put(key, entry)
+                    adopted[key] = entry
+        return adopted
+
+    def _write_shared(self, entries: List[Tuple[Hashable, tuple]]):
+        if self.backend is None:
+            return
+        items = []
+        for key, entry in entries:
+            # Degraded fallbacks stay local so no worker adopts another's
+            if entry[3]:
+                continue
+            keep_s = entry[1] + entry[2] + self.stale_ttl - time.time()
+            if keep_s > 0:
+                items.append((key, entry, keep_s))
+        if items:
+            self._shared_call(self.backend.set_many, self.name, items)
+
+    def _current(self, key) -> tuple | None:
+        # The most recent entry in either tier, fresh or not
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is not None and self._fresh(entry):
+                return entry
+        if self.backend is not None:
+            entry = self._fetch_shared([key]).get(key, entry)
+        return entry
+
+    def _count_shared_hit(self, entry: tuple):
+        # Caller holds the lock
+        self.hits += 1
+        self.shared_hits += 1
+        if entry[4] != os.getpid():
+            self.cross_worker_hits += 1
+
+    def _maybe_flush(self, force: bool = False):
+        """Add this worker's counter increments to the shared totals"""
+        if self.backend is None:
+            return
+        now = time.time()
+        with self._lock:
+            if not force and now - self._flushed_at < CACHE_COUNTER_FLUSH_S:
+                return
+            self._flushed_at = now
+            current = {name: getattr(self, name) for name in _SHARED_COUNTERS}
+            delta = {name: current[name] - self._flushed[name] for name in _SHARED_COUNTERS}
+            self._flushed = current
+        if any(delta.values()):
+            self._shared_call(self.backend.add_counters, self.name, delta)
+
+    # --------------------
+    # Introspection
+    # --------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            local = {
+                "name": self.name,
+                "backend": self.backend.name if self.backend is not None else "memory",
+                "size": len(self._store),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale_serves": self.stale_serves,
+                "degraded_sets": self.degraded_sets,
+                "degraded": sum(1 for e in self._store.values() if e[3]),
+                "shared_hits": self.shared_hits,
+                "cross_worker_hits": self.cross_worker_hits,
+                "loads": self.loads,
+                "shared_errors": self.shared_errors,
+            }
+        local.update(_rates(local))
+        if self.backend is not None:
+            self._maybe_flush(force=True)
+            totals = self._shared_call(self.backend.counters, self.name, default=None)
+            if totals is not None:
+                cluster = {name: int(totals.get(name, 0)) for name in _SHARED_COUNTERS}
+                cluster.update(_rates(cluster))
+                local["cluster"] = cluster
+        return local
+
+    def _fresh(self, entry: tuple) -> bool:
+        return time.time() - entry[1] < entry[2]
+
+    def _servable_stale(self, entry: tuple) -> bool:
+        return not entry[3] and time.time() - entry[1] < entry[2] + self.stale_ttl
+
+    def _put(self, key, entry: tuple):
+        # Caller holds the lock
+        self._store[key] = entry
+        self._store.move_to_end(key)
+        while len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+
+def _rates(counters: Dict[str, int]) -> Dict[str, float]:
+    lookups = counters["hits"] + counters["misses"] + counters["stale_serves"]
+    return {
+        "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+        "cross_worker_hit_rate": counters["cross_worker_hits"] / lookups if lookups else 0.0,
+    }
+
+
+# Shared caches, each with its own freshness policy; the ones holding
+# upstream data are backed by the tier shared between workers
+coord_cache = TTLCache(
+    "coords",
+    ttl=COORD_CACHE_TTL_S,
+    maxsize=COORD_CACHE_MAXSIZE,
+    backend=shared_backend,
+)
+weather_cache = TTLCache(
+    "weather",
+    ttl=WEATHER_CACHE_TTL_S,
+    maxsize=WEATHER_CACHE_MAXSIZE,
+    stale_ttl=WEATHER_CACHE_STALE_S,
+    backend=shared_backend,
+)
+earthquake_cache = TTLCache(
+    "earthquakes",
+    ttl=EARTHQUAKE_CACHE_TTL_S,
+    maxsize=EARTHQUAKE_CACHE_MAXSIZE,
+    stale_ttl=EARTHQUAKE_CACHE_STALE_S,
+    backend=shared_backend,
+)
+safehouse_cache = TTLCache(
+    "safehouses",
+    ttl=SAFEHOUSE_CACHE_TTL_S,
+    maxsize=SAFEHOUSE_CACHE_MAXSIZE,
+    stale_ttl=SAFEHOUSE_CACHE_STALE_S,
+    backend=shared_backend,
+)
+map_cache = TTLCache(
+    "maps",
+    ttl=MAP_CACHE_TTL_S,
+    maxsize=MAP_CACHE_MAXSIZE,
+)
+# Derived from the current earthquake feed object, so only meaningful locally
+exposure_cache = TTLCache(
+    "quake_exposure",
+    ttl=EARTHQUAKE_CACHE_TTL_S + EARTHQUAKE_CACHE_STALE_S,
+    maxsize=EARTHQUAKE_CACHE_MAXSIZE,
+)
 
 
-# Shared caches (intentionally simple for v1)
-coord_cache = SimpleCache()
-weather_cache = SimpleCache()
-earthquake_cache = SimpleCache()
-safehouse_cache = SimpleCache()
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Return hit/miss counters for every shared cache"""
+    return {
+        c.name: c.stats()
+        for c in (
+            coord_cache,
+            weather_cache,
+            earthquake_cache,
+            safehouse_cache,
+            map_cache,
+            exposure_cache,
+        )
+    }
@@ -0,0 +1,514 @@
+"""
+Cache backends: the tier shared by worker processes behind each TTLCache
+
+Every TTLCache keeps its own in-process LRU. A shared backend sits behind
+it, so a value one worker fetched from an upstream is found by the others
+instead of being fetched again:
+
+- InProcessBackend ("memory"): no shared tier; each process caches alone
+- SQLiteBackend ("sqlite"): a WAL-mode database shared by one host's workers
+- RedisBackend ("redis"): any server speaking the Redis protocol (RESP2)
+
+Entries cross process boundaries in the compact binary format of
+`app.utils.codec`, never pickled. Besides storage, backends provide
+short leases, so only one worker loads a missing key while the others
+wait for its result, and shared counters for host-wide hit rates.
+"""
+
+import os
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Sequence, Tuple
+from urllib.parse import unquote, urlsplit
+
+from app.config.settings import (
+    CACHE_BACKEND,
+    CACHE_KEY_PREFIX,
+    CACHE_REDIS_TIMEOUT_S,
+    CACHE_REDIS_URL,
+    CACHE_SQLITE_PATH,
+)
+from app.utils.codec import CodecError, decode, encode
+from app.utils.store import connect_wal
+
+# value, stored_at (wall clock), ttl, degraded, pid of the storing process
+Entry = Tuple[Any, float, float, bool, int]
+
+_ENTRY_HEADER = struct.Struct("<ddBI")
+
+
+def encode_entry(entry: Entry) -> bytes:
+    value, stored_at, ttl, degraded, origin = entry
+    return _ENTRY_HEADER.pack(stored_at, ttl, degraded, origin) + encode(value)
+
+
+def decode_entry(data: bytes) -> Entry:
+    if len(data) < _ENTRY_HEADER.size:
+        raise CodecError("truncated cache entry")
+    stored_at, ttl, degraded, origin = _ENTRY_HEADER.unpack_from(data)
+    return decode(data[_ENTRY_HEADER.size:]), stored_at, ttl, bool(degraded), origin
+
+
+class CacheBackend:
+    """
+    Storage shared by the caches of several processes
+
+    Keys are any codec-encodable value, namespaced by cache name. Each
+    entry must stay retrievable for `keep_s` seconds (its ttl plus the
+    cache's stale window) and may be dropped after that.
+    """
+
+    name = "base"
+    shared = True
+
+    def get_many(self, namespace: str, keys: Sequence[Hashable]) -> Dict[Hashable, Entry]:
+        raise NotImplementedError
+
+    def set_many(self, namespace: str, items: Iterable[Tuple[Hashable, Entry, float]]):
+        """Store (key, entry, keep_s) triples"""
+        raise NotImplementedError
+
+    def delete_many(self, namespace: str, keys: Sequence[Hashable]):
+        raise NotImplementedError
+
+    def keys(self, namespace: str) -> List[Hashable]:
+        raise NotImplementedError
+
+    def clear(self, namespace: str):
+        self.delete_many(namespace, self.keys(namespace))
+
+    def try_lease(self, namespace: str, key: Hashable, ttl_s: float) -> bool:
+        """Claim the right to load `key` for up to `ttl_s` seconds"""
+        raise NotImplementedError
+
+    def release_lease(self, namespace: str, key: Hashable):
+        raise NotImplementedError
+
+    def try_lease_many(self, namespace: str, keys: Sequence[Hashable], ttl_s: float) -> List[bool]:
+        return [self.try_lease(namespace, k, ttl_s) for k in keys]
+
+    def release_lease_many(self, namespace: str, keys: Sequence[Hashable]):
+        for k in keys:
+            self.release_lease(namespace, k)
+
+    def add_counters(self, namespace: str, counters: Dict[str, int]):
+        raise NotImplementedError
+
+    def counters(self, namespace: str) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+# --------------------
+# In-process
+# --------------------
+class InProcessBackend(CacheBackend):
+    """
+    No shared tier: every TTLCache's own LRU is its only storage
+    """
+
+    name = "memory"
+    shared = False
+
+    def get_many(self, namespace, keys):
+        return {}
+
+    def set_many(self, namespace, items):
+        pass
+
+    def delete_many(self, namespace, keys):
+        pass
+
+    def keys(self, namespace):
+        return []
+
+    def try_lease(self, namespace, key, ttl_s):
+        return True
+
+    def release_lease(self, namespace, key):
+        pass
+
+    def try_lease_many(self, namespace, keys, ttl_s):
+        return [True] * len(keys)
+
+    def add_counters(self, namespace, counters):
+        pass
+
+    def counters(self, namespace):
+        return {}
+
+
+# --------------------
+# SQLite (one host)
+# --------------------
+_SQLITE_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        namespace TEXT NOT NULL,
+        key BLOB NOT NULL,
+        entry BLOB NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cache_leases (
+        namespace TEXT NOT NULL,
+        key BLOB NOT NULL,
+        owner INTEGER NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cache_counters (
+        namespace TEXT NOT NULL,
+        name TEXT NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY (namespace, name)
+    )
+    """,
+)
+
+# Bound on host parameters per statement (SQLite's default limit is 999)
+_SQLITE_CHUNK = 500
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Entries in a WAL-mode SQLite file that every worker on the host opens
+
+    Readers never block each other or the single writer; expired rows are
+    pruned every PRUNE_INTERVAL_S by whichever worker writes next.
+    """
+
+    name = "sqlite"
+    PRUNE_INTERVAL_S = 60.0
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._pruned_at = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect_wal(self.path, *_SQLITE_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, namespace, keys):
+        by_raw = {encode(k): k for k in keys}
+        raw = list(by_raw)
+        found: Dict[Hashable, Entry] = {}
+        now = time.time()
+        for i in range(0, len(raw), _SQLITE_CHUNK):
+            chunk = raw[i:i + _SQLITE_CHUNK]
+            rows = self._conn().execute(
+                "SELECT key, entry FROM cache_entries WHERE namespace = ? "
+                f"AND expires_at > ? AND key IN ({','.join('?' * len(chunk))})",
+                (namespace, now, *chunk),
+            ).fetchall()
+            for k, entry in rows:
+                found[by_raw[bytes(k)]] = decode_entry(entry)
+        return found
+
+    def set_many(self, namespace, items):
+        now = time.time()
+        rows = [
+            (namespace, encode(k), encode_entry(entry), now + keep_s)
+            for k, entry, keep_s in items
+        ]
+        if not rows:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, entry, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            if now - self._pruned_at >= self.PRUNE_INTERVAL_S:
+                self._pruned_at = now
+                conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+                conn.execute("DELETE FROM cache_leases WHERE expires_at <= ?", (now,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def delete_many(self, namespace, keys):
+        raw = [encode(k) for k in keys]
+        for i in range(0, len(raw), _SQLITE_CHUNK):
+            chunk = raw[i:i + _SQLITE_CHUNK]
+            self._conn().execute(
+                "DELETE FROM cache_entries WHERE namespace = ? "
+                f"AND key IN ({','.join('?' * len(chunk))})",
+                (namespace, *chunk),
+            )
+
+    def keys(self, namespace):
+        rows = self._conn().execute(
+            "SELECT key FROM cache_entries WHERE namespace = ? AND expires_at > ?",
+            (namespace, time.time()),
+        ).fetchall()
+        return [decode(bytes(k)) for k, in rows]
+
+    def clear(self, namespace):
+        self._conn().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+    def try_lease(self, namespace, key, ttl_s):
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO cache_leases (namespace, key, owner, expires_at) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET "
+            "owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE cache_leases.expires_at <= ?",
+            (namespace, encode(key), os.getpid(), now + ttl_s, now),
+        )
+        return cur.rowcount == 1
+
+    def release_lease(self, namespace, key):
+        self._conn().execute(
+            "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND owner = ?",
+            (namespace, encode(key), os.getpid()),
+        )
+
+    def add_counters(self, namespace, counters):
+        self._conn().executemany(
+            "INSERT INTO cache_counters (namespace, name, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (namespace, name) DO UPDATE SET value = value + excluded.value",
+            [(namespace, name, n) for name, n in counters.items() if n],
+        )
+
+    def counters(self, namespace):
+        rows = self._conn().execute(
+            "SELECT name, value FROM cache_counters WHERE namespace = ?",
+            (namespace,),
+        ).fetchall()
+        return dict(rows)
+
+
+# --------------------
+# Redis protocol
+# --------------------
+class RespError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+class RespConnection:
+    """
+    Minimal blocking RESP2 client: commands and pipelines of commands
+    """
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+
+    def command(self, *args):
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands: Sequence[Sequence]) -> List[Any]:
+        """Send every command, then read every reply; error replies are returned"""
+        self._sock.sendall(b"".join(_pack_command(c) for c in commands))
+        return [self._read_reply() for _ in commands]
+
+    def close(self):
+        try:
+            self._reader.close()
+            self._sock.close()
+        except OSError:
+            pass
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            return RespError(body.decode(errors="replace"))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            if size < 0:
+                return None
+            data = self._reader.read(size + 2)
+            if len(data) != size + 2:
+                raise ConnectionError("connection closed by server")
+            return data[:-2]
+        if kind == b"*":
+            count = int(body)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"unexpected reply type {kind!r}")
+
+
+def _pack_command(args: Sequence) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, (int, float)):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def _checked(reply):
+    if isinstance(reply, RespError):
+        raise reply
+    return reply
+
+
+class RedisBackend(CacheBackend):
+    """
+    Entries in a Redis-protocol server, expiring on the server side
+
+    Uses only GET-family, SET (PX, NX), DEL, SCAN and hash commands, so
+    small stand-ins and Redis-compatible servers work as well as Redis.
+    Each thread keeps one connection, reopened after a network error.
+    """
+
+    name = "redis"
+    _BATCH = 500
+
+    def __init__(self, url: str = CACHE_REDIS_URL, timeout: float = CACHE_REDIS_TIMEOUT_S):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self) -> RespConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = RespConnection(self.host, self.port, self.timeout)
+            setup = []
+            if self.password:
+                setup.append(("AUTH", self.password))
+            if self.db:
+                setup.append(("SELECT", self.db))
+            try:
+                for reply in conn.pipeline(setup) if setup else ():
+                    _checked(reply)
+            except BaseException:
+                conn.close()
+                raise
+            self._local.conn = conn
+        return conn
+
+    def _run(self, commands: Sequence[Sequence]) -> List[Any]:
+        try:
+            return self._conn().pipeline(commands)
+        except (OSError, ValueError):
+            conn = getattr(self._local, "conn", None)
+            if conn is not None:
+                conn.close()
+                self._local.conn = None
+            raise
+
+    def _prefix(self, namespace: str, kind: str) -> bytes:
+        return f"{CACHE_KEY_PREFIX}:{namespace}:{kind}:".encode()
+
+    def get_many(self, namespace, keys):
+        keys = list(keys)
+        prefix = self._prefix(namespace, "e")
+        found: Dict[Hashable, Entry] = {}
+        for i in range(0, len(keys), self._BATCH):
+            chunk = keys[i:i + self._BATCH]
+            reply = _checked(self._run([("MGET", *(prefix + encode(k) for k in chunk))])[0])
+            for k, data in zip(chunk, reply):
+                if data is not None:
+                    found[k] = decode_entry(data)
+        return found
+
+    def set_many(self, namespace, items):
+        prefix = self._prefix(namespace, "e")
+        commands = [
+            ("SET", prefix + encode(k), encode_entry(entry), "PX", max(1, int(keep_s * 1000)))
+            for k, entry, keep_s in items
+        ]
+        for i in range(0, len(commands), self._BATCH):
+            for reply in self._run(commands[i:i + self._BATCH]):
+                _checked(reply)
+
+    def delete_many(self, namespace, keys):
+        keys = list(keys)
+        prefix = self._prefix(namespace, "e")
+        for i in range(0, len(keys), self._BATCH):
+            chunk = keys[i:i + self._BATCH]
+            _checked(self._run([("DEL", *(prefix + encode(k) for k in chunk))])[0])
+
+    def keys(self, namespace):
+        prefix = self._prefix(namespace, "e")
+        found, cursor = [], b"0"
+        while True:
+            cursor, batch = _checked(
+                self._run([("SCAN", cursor, "MATCH", prefix + b"*", "COUNT", 1000)])[0]
+            )
+            found.extend(decode(k[len(prefix):]) for k in batch)
+            if cursor in (b"0", 0):
+                return found
+
+    def try_lease(self, namespace, key, ttl_s):
+        reply = _checked(self._run([(
+            "SET", self._prefix(namespace, "l") + encode(key), os.getpid(),
+            "NX", "PX", max(1, int(ttl_s * 1000)),
+        )])[0])
+        return reply == "OK"
+
+    def release_lease(self, namespace, key):
+        self.release_lease_many(namespace, [key])
+
+    def try_lease_many(self, namespace, keys, ttl_s):
+        prefix = self._prefix(namespace, "l")
+        px = max(1, int(ttl_s * 1000))
+        commands = [("SET", prefix + encode(k), os.getpid(), "NX", "PX", px) for k in keys]
+        granted = []
+        for i in range(0, len(commands), self._BATCH):
+            granted.extend(_checked(r) == "OK" for r in self._run(commands[i:i + self._BATCH]))
+        return granted
+
+    def release_lease_many(self, namespace, keys):
+        keys = list(keys)
+        prefix = self._prefix(namespace, "l")
+        for i in range(0, len(keys), self._BATCH):
+            chunk = keys[i:i + self._BATCH]
+            _checked(self._run([("DEL", *(prefix + encode(k) for k in chunk))])[0])
+
+    def add_counters(self, namespace, counters):
+        name = f"{CACHE_KEY_PREFIX}:{namespace}:counters"
+        commands = [("HINCRBY", name, field, n) for field, n in counters.items() if n]
+        if commands:
+            for reply in self._run(commands):
+                _checked(reply)
+
+    def counters(self, namespace):
+        reply = _checked(self._run([("HGETALL", f"{CACHE_KEY_PREFIX}:{namespace}:counters")])[0])
+        return {
+            reply[i].decode(): int(reply[i + 1]) for i in range(0, len(reply or ()), 2)
+        }
+
+
+def create_backend(name: str = CACHE_BACKEND) -> CacheBackend:
+    """Backend for a CACHE_BACKEND setting value"""
+    if name == "memory":
+        return InProcessBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"unknown cache backend {name!r}")
+
+
+# Backend shared by the upstream-data caches of this process
+shared_backend = create_backend()
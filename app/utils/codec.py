@@ -0,0 +1,166 @@
+"""
+Compact, safe binary encoding for cached values
+
+Values are written as a one-byte tag followed by the payload; integers
+and lengths are zigzag/unsigned varints. Only plain data is supported
+(None, bool, int, float, str, bytes, list, tuple, dict, frozenset), so
+decoding never constructs arbitrary objects, unlike pickle, and a
+corrupt or hostile payload can only raise CodecError.
+"""
+
+import numbers
+import struct
+from typing import Any, List, Tuple
+
+_F64 = struct.Struct("<d")
+
+MAX_DEPTH = 64
+
+
+class CodecError(ValueError):
+    """Raised for values that cannot be encoded or payloads that cannot be decoded"""
+
+
+# --------------------
+# Encoding
+# --------------------
+def encode(value: Any) -> bytes:
+    out = bytearray()
+    _encode(value, out, 0)
+    return bytes(out)
+
+
+def _varint(n: int, out: bytearray):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _encode(value: Any, out: bytearray, depth: int):
+    if depth > MAX_DEPTH:
+        raise CodecError("value nested too deeply")
+
+    if value is None:
+        out += b"N"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif isinstance(value, numbers.Integral):
+        n = int(value)
+        out += b"i"
+        _varint((n << 1) if n >= 0 else ((-n << 1) - 1), out)
+    elif isinstance(value, numbers.Real):
+        out += b"d"
+        out += _F64.pack(float(value))
+    elif isinstance(value, str):
+        raw = value.encode("utf-8")
+        out += b"s"
+        _varint(len(raw), out)
+        out += raw
+    elif isinstance(value, (bytes, bytearray)):
+        out += b"b"
+        _varint(len(value), out)
+        out += value
+    elif isinstance(value, (list, tuple, frozenset)):
+        out += b"l" if isinstance(value, list) else b"t" if isinstance(value, tuple) else b"f"
+        _varint(len(value), out)
+        for item in value:
+            _encode(item, out, depth + 1)
+    elif isinstance(value, dict):
+        out += b"m"
+        _varint(len(value), out)
+        for k, v in value.items():
+            _encode(k, out, depth + 1)
+            _encode(v, out, depth + 1)
+    else:
+        raise CodecError(f"cannot encode {type(value).__name__}")
+
+
+# --------------------
+# Decoding
+# --------------------
+def decode(data: bytes) -> Any:
+    value, pos = _decode(memoryview(data), 0, 0)
+    if pos != len(data):
+        raise CodecError("trailing bytes after value")
+    return value
+
+
+def _read_varint(buf: memoryview, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise CodecError("truncated varint")
+        byte = buf[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+        if shift > 640:
+            raise CodecError("varint too long")
+
+
+def _read_bytes(buf: memoryview, pos: int) -> Tuple[bytes, int]:
+    size, pos = _read_varint(buf, pos)
+    end = pos + size
+    if end > len(buf):
+        raise CodecError("truncated payload")
+    return bytes(buf[pos:end]), end
+
+
+def _decode(buf: memoryview, pos: int, depth: int) -> Tuple[Any, int]:
+    if depth > MAX_DEPTH:
+        raise CodecError("payload nested too deeply")
+    if pos >= len(buf):
+        raise CodecError("truncated payload")
+
+    tag = buf[pos]
+    pos += 1
+    if tag == ord("N"):
+        return None, pos
+    if tag == ord("T"):
+        return True, pos
+    if tag == ord("F"):
+        return False, pos
+    if tag == ord("i"):
+        n, pos = _read_varint(buf, pos)
+        return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+    if tag == ord("d"):
+        if pos + 8 > len(buf):
+            raise CodecError("truncated float")
+        return _F64.unpack_from(buf, pos)[0], pos + 8
+    if tag == ord("s"):
+        raw, pos = _read_bytes(buf, pos)
+        try:
+            return raw.decode("utf-8"), pos
+        except UnicodeDecodeError as exc:
+            raise CodecError("invalid UTF-8") from exc
+    if tag == ord("b"):
+        return _read_bytes(buf, pos)
+    if tag in (ord("l"), ord("t"), ord("f")):
+        count, pos = _read_varint(buf, pos)
+        items: List[Any] = []
+        for _ in range(count):
+            item, pos = _decode(buf, pos, depth + 1)
+            items.append(item)
+        if tag == ord("l"):
+            return items, pos
+        try:
+            return (tuple(items) if tag == ord("t") else frozenset(items)), pos
+        except TypeError as exc:
+            raise CodecError("unhashable set member") from exc
+    if tag == ord("m"):
+        count, pos = _read_varint(buf, pos)
+        result = {}
+        for _ in range(count):
+            k, pos = _decode(buf, pos, depth + 1)
+            v, pos = _decode(buf, pos, depth + 1)
+            try:
+                result[k] = v
+            except TypeError as exc:
+                raise CodecError("unhashable mapping key") from exc
+        return result, pos
+    raise CodecError(f"unknown tag {tag:#x}")
@@ -3,13 +3,23 @@ Geospatial utility functions
 """
 
 from math import radians, sin, cos, sqrt, atan2
+from typing import Iterator, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+EARTH_RADIUS_KM = 6371.0
+
+# Scales great-circle lower bounds (A* heuristics) so rounding in stored
+# distances can never make them overestimate
+HEURISTIC_SLACK = 0.9999
 
 
 def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
     Compute great-circle distance between two points on Earth (in km)
     """
-    R = 6371.0  # Earth radius in km
+    R = EARTH_RADIUS_KM
 
     phi1, phi2 = radians(lat1), radians(lat2)
     dphi = radians(lat2 - lat1)
@@ -19,3 +29,129 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     c = 2 * atan2(sqrt(a), sqrt(1 - a))
 
     return R * c
+
+
+# --------------------
+# Vectorized kernels (float64 arrays)
+# --------------------
+def _haversine_rad(phi1, lam1, phi2, lam2):
+    # Same formula as haversine_km, broadcast over arrays in radians
+    a = (
+        np.sin((phi2 - phi1) / 2) ** 2
+        + np.cos(phi1) * np.cos(phi2) * np.sin((lam2 - lam1) / 2) ** 2
+    )
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_one_to_many(
+    lat: float,
+    lon: float,
+    lats: ArrayLike,
+    lons: ArrayLike,
+) -> np.ndarray:
+    """
+    Distance (km) from one point to each of many points
+    """
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    return _haversine_rad(radians(lat), radians(lon), lats, lons)
+
+
+def haversine_paired(
+    lats1: ArrayLike,
+    lons1: ArrayLike,
+    lats2: ArrayLike,
+    lons2: ArrayLike,
+) -> np.ndarray:
+    """
+    Element-wise distance (km) between two equally long point arrays
+    """
+    return _haversine_rad(
+        np.radians(np.asarray(lats1, dtype=np.float64)),
+        np.radians(np.asarray(lons1, dtype=np.float64)),
+        np.radians(np.asarray(lats2, dtype=np.float64)),
+        np.radians(np.asarray(lons2, dtype=np.float64)),
+    )
+
+
+def haversine_matrix(
+    lats1: ArrayLike,
+    lons1: ArrayLike,
+    lats2: ArrayLike | None = None,
+    lons2: ArrayLike | None = None,
+) -> np.ndarray:
+    """
+    Distance matrix (km) of shape (len(lats1), len(lats2))
+
+    With only one point set, returns its all-pairs matrix.
+    """
+    if lats2 is None:
+        lats2, lons2 = lats1, lons1
+
+    phi1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    lam1 = np.radians(np.asarray(lons1, dtype=np.float64))[:, None]
+    phi2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    lam2 = np.radians(np.asarray(lons2, dtype=np.float64))[None, :]
+    return _haversine_rad(phi1, lam1, phi2, lam2)
+
+
+def haversine_matrix_chunked(
+    lats1: ArrayLike,
+    lons1: ArrayLike,
+    lats2: ArrayLike | None = None,
+    lons2: ArrayLike | None = None,
+    max_bytes: int = 64 * 1024 * 1024,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield (row_offset, block) slices of the distance matrix
+
+    Each block holds as many full rows as fit in `max_bytes`, counting the
+    temporaries the kernel needs, so peak memory stays bounded however
+    large the inputs are.
+    """
+    if lats2 is None:
+        lats2, lons2 = lats1, lons1
+
+    lats1 = np.asarray(lats1, dtype=np.float64)
+    lons1 = np.asarray(lons1, dtype=np.float64)
+    lats2 = np.asarray(lats2, dtype=np.float64)
+    lons2 = np.asarray(lons2, dtype=np.float64)
+
+    # ~4 live float64 temporaries per matrix cell inside _haversine_rad
+    row_bytes = max(1, len(lats2)) * 8 * 4
+    rows = max(1, max_bytes // row_bytes)
+
+    for start in range(0, len(lats1), rows):
+        stop = start + rows
+        yield start, haversine_matrix(
+            lats1[start:stop], lons1[start:stop], lats2, lons2
+        )
+
+
+def pairs_within_km(
+    lats: ArrayLike,
+    lons: ArrayLike,
+    max_km: float,
+    max_bytes: int = 64 * 1024 * 1024,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    All pairs i < j of one point set closer than or equal to `max_km`
+
+    Returns (i, j, distance_km) arrays in row-major (i, then j) order.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+
+    rows_i, rows_j, dists = [], [], []
+    for offset, block in haversine_matrix_chunked(lats, lons, max_bytes=max_bytes):
+        r, c = np.nonzero(block <= max_km)
+        r_abs = r + offset
+        upper = c > r_abs
+        rows_i.append(r_abs[upper])
+        rows_j.append(c[upper])
+        dists.append(block[r[upper], c[upper]])
+
+    if not rows_i:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=np.float64)
+    return np.concatenate(rows_i), np.concatenate(rows_j), np.concatenate(dists)
@@ -0,0 +1,66 @@
+"""
+Shared, pooled HTTP sessions for upstream clients
+
+One keep-alive `requests.Session` serves every synchronous caller, and one
+`httpx.AsyncClient` per event loop serves the async clients, so repeated
+calls to the same upstream reuse TCP+TLS connections.
+"""
+
+import asyncio
+import threading
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config.settings import HTTP_POOL_SIZE, HTTP_USER_AGENT
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_SIZE,
+                    pool_maxsize=HTTP_POOL_SIZE,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["User-Agent"] = HTTP_USER_AGENT
+                _session = session
+    return _session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled async client bound to the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            headers={"User-Agent": HTTP_USER_AGENT},
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_SIZE,
+                max_keepalive_connections=HTTP_POOL_SIZE,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    """Close the async client of the running loop (call on shutdown)"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,223 @@
+"""
+Upstream failure handling: circuit breakers and a per-request latency budget
+
+Each upstream has a breaker. After BREAKER_FAILURE_THRESHOLD consecutive
+failures it opens and calls fail fast with CircuitOpenError. Once
+BREAKER_COOLDOWN_S has passed, a single half-open probe is let through,
+and its outcome closes or re-opens the breaker.
+
+A latency budget caps the time one request may spend on upstreams:
+HTTP timeouts and rate-limit waits are clipped to what is left of it,
+and calls that no longer fit fail fast with LatencyBudgetExceeded; so do
+HTTP timeouts that only fired because the budget clipped them. Work
+outside a budget (startup, the background refresher) uses the full
+per-upstream timeouts.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+
+from app.config.settings import (
+    BREAKER_COOLDOWN_S,
+    BREAKER_FAILURE_THRESHOLD,
+    REQUEST_LATENCY_BUDGET_S,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+
+class LatencyBudgetExceeded(TimeoutError):
+    """Raised when an upstream call no longer fits the request's budget"""
+
+
+# Client timeouts, sync and async, that may stem from a clipped timeout
+_TIMEOUT_ERRORS = (requests.Timeout, httpx.TimeoutException, TimeoutError)
+
+
+# --------------------
+# Circuit breaker
+# --------------------
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker for one upstream
+
+    Use as a context manager around the HTTP exchange only: exceptions
+    inside count as failures, except those that say nothing about the
+    upstream's health: LatencyBudgetExceeded, cancellation (e.g. a client
+    disconnect) and timeouts shortened by the budget, which are re-raised
+    as LatencyBudgetExceeded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        cooldown_s: float = BREAKER_COOLDOWN_S,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+
+    def __enter__(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.cooldown_s:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} circuit is open")
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probing:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} circuit is half-open")
+                self._probing = True
+            self.calls += 1
+        _timeout_clipped.set(False)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        budget_timeout = (
+            exc_type is not None
+            and not issubclass(exc_type, LatencyBudgetExceeded)
+            and issubclass(exc_type, _TIMEOUT_ERRORS)
+            and _timeout_clipped.get()
+        )
+        with self._lock:
+            self._probing = False
+            if exc_type is None:
+                self.state = "closed"
+                self._failures = 0
+            elif not (
+                budget_timeout
+                or issubclass(exc_type, (LatencyBudgetExceeded, asyncio.CancelledError))
+            ):
+                self.failures += 1
+                self._failures += 1
+                self.last_error = repr(exc)
+                if self.state == "half_open" or self._failures >= self.failure_threshold:
+                    self.state = "open"
+                    self._opened_at = time.monotonic()
+        if budget_timeout:
+            raise LatencyBudgetExceeded(f"{self.name} timeout clipped by the budget") from exc
+        return False
+
+    @property
+    def available(self) -> bool:
+        """False while calls would be rejected without trying"""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self._opened_at >= self.cooldown_s
+            return not (self.state == "half_open" and self._probing)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+            }
+
+
+# --------------------
+# Latency budget
+# --------------------
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "saferoutex_deadline", default=None
+)
+# Set when `upstream_timeout` handed out less than the configured timeout
+_timeout_clipped: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "saferoutex_timeout_clipped", default=False
+)
+
+
+@contextmanager
+def latency_budget(seconds: float = REQUEST_LATENCY_BUDGET_S):
+    """Bound upstream time for the enclosed work (and tasks it spawns)"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left in the current budget, or None outside one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def upstream_timeout(default: float) -> float:
+    """`default`, clipped to the remaining budget"""
+    remaining = remaining_budget()
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        raise LatencyBudgetExceeded("request latency budget exhausted")
+    if remaining < default:
+        _timeout_clipped.set(True)
+        return remaining
+    return default
+
+
+class LatencyBudgetMiddleware:
+    """
+    ASGI middleware giving every HTTP request its own latency budget
+    """
+
+    def __init__(self, app, budget_s: float = REQUEST_LATENCY_BUDGET_S):
+        self.app = app
+        self.budget_s = budget_s
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with latency_budget(self.budget_s):
+            await self.app(scope, receive, send)
+
+
+# Upstream policies
+nominatim_breaker = CircuitBreaker("nominatim")
+weather_breaker = CircuitBreaker("open_meteo")
+usgs_breaker = CircuitBreaker("usgs")
+overpass_breaker = CircuitBreaker("overpass")
+# The shared cache tier is not an upstream, but fails the same way
+cache_backend_breaker = CircuitBreaker("cache_backend")
+
+
+def upstream_status() -> Dict[str, Dict[str, Any]]:
+    """Breaker state and counters for every upstream"""
+    return {
+        b.name: b.stats()
+        for b in (
+            nominatim_breaker,
+            weather_breaker,
+            usgs_breaker,
+            overpass_breaker,
+            cache_backend_breaker,
+        )
+    }
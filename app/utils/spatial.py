@@ -0,0 +1,194 @@
+"""
+Spatial index for nearest-point queries on the sphere
+
+Points are embedded as 3D unit vectors, where straight-line (chord)
+distance grows monotonically with great-circle distance, and stored in a
+KD-tree. Queries are exact and visit only the branches that can still
+beat the current best, so they stay sub-linear in the number of points.
+"""
+
+import heapq
+from math import cos, pi, radians, sin
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.utils.geo import EARTH_RADIUS_KM, haversine_one_to_many
+
+Vector = Tuple[float, float, float]
+
+
+def _to_xyz(lat: float, lon: float) -> Vector:
+    phi, lam = radians(lat), radians(lon)
+    return (cos(phi) * cos(lam), cos(phi) * sin(lam), sin(phi))
+
+
+def _km_to_chord_sq(km: float) -> float:
+    half_angle = min(km / (2 * EARTH_RADIUS_KM), pi / 2)
+    chord = 2 * sin(half_angle)
+    return chord * chord
+
+
+def _sq_dist(a: Vector, b: Vector) -> float:
+    dx, dy, dz = a[0] - b[0], a[1] - b[1], a[2] - b[2]
+    return dx * dx + dy * dy + dz * dz
+
+
+class _KDTree:
+    """
+    Static KD-tree over 3D vectors; leaves hold (vector, point id) pairs
+    """
+
+    def __init__(self, items: List[Tuple[Vector, int]], leaf_size: int = 16):
+        self._leaf_size = leaf_size
+        self._root = self._build(items) if items else None
+
+    def _build(self, items):
+        if len(items) <= self._leaf_size:
+            return ("leaf", items)
+
+        spreads = [
+            max(v[d] for v, _ in items) - min(v[d] for v, _ in items)
+            for d in range(3)
+        ]
+        dim = spreads.index(max(spreads))
+        items.sort(key=lambda it: it[0][dim])
+        mid = len(items) // 2
+        split = items[mid][0][dim]
+
+        return (
+            "node",
+            dim,
+            split,
+            self._build(items[:mid]),
+            self._build(items[mid:]),
+        )
+
+    def nearest(self, q: Vector, k: int) -> List[Tuple[float, int]]:
+        """Return up to k (squared chord, id) pairs, nearest first"""
+        # Max-heap of the best k via negated distances
+        best: List[Tuple[float, int]] = []
+
+        def visit(node):
+            if node[0] == "leaf":
+                for v, pid in node[1]:
+                    d = _sq_dist(q, v)
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, pid))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, pid))
+                return
+
+            _, dim, split, left, right = node
+            diff = q[dim] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(best) < k or diff * diff < -best[0][0]:
+                visit(far)
+
+        if self._root is not None and k > 0:
+            visit(self._root)
+        return sorted((-d, pid) for d, pid in best)
+
+    def within(self, q: Vector, limit_sq: float) -> List[Tuple[float, int]]:
+        """Return all (squared chord, id) pairs within limit_sq"""
+        found: List[Tuple[float, int]] = []
+
+        def visit(node):
+            if node[0] == "leaf":
+                for v, pid in node[1]:
+                    d = _sq_dist(q, v)
+                    if d <= limit_sq:
+                        found.append((d, pid))
+                return
+
+            _, dim, split, left, right = node
+            diff = q[dim] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if diff * diff <= limit_sq:
+                visit(far)
+
+        if self._root is not None:
+            visit(self._root)
+        found.sort()
+        return found
+
+
+class SpatialIndex:
+    """
+    Nearest-neighbour index over point dicts with `lat`, `lon` and `type`
+
+    Built once per point set. A KD-tree is kept for all points and one per
+    type, so type-filtered queries are as cheap as unfiltered ones.
+    """
+
+    def __init__(self, points: Sequence[Dict], leaf_size: int = 16):
+        self.points: List[Dict] = list(points)
+        vectors = [_to_xyz(p["lat"], p["lon"]) for p in self.points]
+
+        self._all = _KDTree(list(zip(vectors, range(len(vectors)))), leaf_size)
+
+        by_type: Dict[Optional[str], List[Tuple[Vector, int]]] = {}
+        for pid, (p, v) in enumerate(zip(self.points, vectors)):
+            by_type.setdefault(p.get("type"), []).append((v, pid))
+        self._by_type = {t: _KDTree(items, leaf_size) for t, items in by_type.items()}
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _trees(self, types: str | Iterable[str] | None):
+        if types is None:
+            return [self._all]
+        if isinstance(types, str):
+            types = [types]  # one type, not an iterable of letters
+        return [self._by_type[t] for t in set(types) if t in self._by_type]
+
+    def k_nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        types: str | Iterable[str] | None = None,
+    ) -> List[Tuple[float, Dict]]:
+        """
+        Return the k closest points as (distance_km, point), nearest first
+        """
+        q = _to_xyz(lat, lon)
+        candidates: List[Tuple[float, int]] = []
+        for tree in self._trees(types):
+            candidates.extend(tree.nearest(q, k))
+        candidates.sort()
+
+        return self._with_distances(lat, lon, [pid for _, pid in candidates[:k]])
+
+    def within_radius(
+        self,
+        lat: float,
+        lon: float,
+        km: float,
+        types: str | Iterable[str] | None = None,
+    ) -> List[Tuple[float, Dict]]:
+        """
+        Return all points within `km` as (distance_km, point), nearest first
+        """
+        q = _to_xyz(lat, lon)
+        # Slightly loose in chord space, exact in haversine below
+        limit_sq = _km_to_chord_sq(km) * (1 + 1e-9)
+        candidates: List[Tuple[float, int]] = []
+        for tree in self._trees(types):
+            candidates.extend(tree.within(q, limit_sq))
+        candidates.sort()
+
+        results = self._with_distances(lat, lon, [pid for _, pid in candidates])
+        return [(d, p) for d, p in results if d <= km]
+
+    def _with_distances(
+        self, lat: float, lon: float, pids: List[int]
+    ) -> List[Tuple[float, Dict]]:
+        points = [self.points[pid] for pid in pids]
+        if not points:
+            return []
+        d = haversine_one_to_many(
+            lat, lon, [p["lat"] for p in points], [p["lon"] for p in points]
+        )
+        return list(zip(d.tolist(), points))
+
@@ -0,0 +1,187 @@
+"""
+Persistent on-disk store for slow-changing upstream data
+
+Geocodes and the safehouse set are written through to a small SQLite
+database (WAL mode, so worker processes can read while one writes) under
+DATA_DIR. On first use after a restart the in-memory caches are primed
+from it, and entries younger than their refresh age are served without
+contacting any upstream. Older entries are still loaded: caches with a
+stale window serve them while refreshing in the background, and the
+data sources fall back to them if the upstream fails.
+
+The store is an optimisation only; if the database cannot be opened or
+written, everything behaves as before.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.config.settings import STORE_BUSY_TIMEOUT_S, STORE_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+)
+"""
+
+
+def connect_wal(path: str, *schema: str) -> sqlite3.Connection:
+    """
+    Autocommit connection to a WAL-mode database, creating it if needed
+
+    Batches open their own transaction with BEGIN.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=STORE_BUSY_TIMEOUT_S, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in schema:
+        conn.execute(statement)
+    return conn
+
+
+class PersistentStore:
+    """
+    Namespaced key -> (JSON value, wall-clock timestamp) table
+
+    Each thread gets its own connection; SQLite serialises writers across
+    threads and processes.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect_wal(self.path, _SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, stored_at) or None"""
+        row = self._conn().execute(
+            "SELECT value, stored_at FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
+
+    def items(self, namespace: str) -> List[Tuple[str, Any, float]]:
+        """Every (key, value, stored_at) in `namespace`"""
+        rows = self._conn().execute(
+            "SELECT key, value, stored_at FROM entries WHERE namespace = ?",
+            (namespace,),
+        ).fetchall()
+        return [(key, json.loads(value), stored_at) for key, value, stored_at in rows]
+
+    def put(self, namespace: str, key: str, value: Any, stored_at: float | None = None):
+        self.put_many(namespace, [(key, value)], stored_at)
+
+    def put_many(
+        self,
+        namespace: str,
+        items: Iterable[Tuple[str, Any]],
+        stored_at: float | None = None,
+    ):
+        """Upsert several entries in one transaction"""
+        stored_at = time.time() if stored_at is None else stored_at
+        rows = [(namespace, key, json.dumps(value), stored_at) for key, value in items]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, stored_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self._conn().execute(
+            "SELECT namespace, COUNT(*), MIN(stored_at) FROM entries GROUP BY namespace"
+        ).fetchall()
+        now = time.time()
+        return {
+            "path": self.path,
+            "namespaces": {
+                ns: {"entries": count, "oldest_age_s": round(now - oldest, 1)}
+                for ns, count, oldest in rows
+            },
+        }
+
+
+class PersistedCache:
+    """
+    Write-through from one TTLCache to a store namespace
+
+    `prime()` loads every stored entry into the cache once, dated when it
+    was stored and with `refresh_age_s` as its ttl (possibly already
+    expired), so the cache's own fresh/stale rules apply to persisted
+    data as well.
+    Keys must be strings; `decode` rebuilds values JSON flattened (e.g.
+    tuples come back as lists).
+    """
+
+    def __init__(
+        self,
+        cache,
+        namespace: str,
+        refresh_age_s: float,
+        store: PersistentStore,
+        decode: Callable[[Any], Any] | None = None,
+    ):
+        self.cache = cache
+        self.namespace = namespace
+        self.refresh_age_s = refresh_age_s
+        self.store = store
+        self.decode = decode or (lambda value: value)
+        self._primed = False
+        self._lock = threading.Lock()
+
+    def prime(self):
+        if self._primed:
+            return
+        with self._lock:
+            if self._primed:
+                return
+            try:
+                entries = self.store.items(self.namespace)
+            except (sqlite3.Error, OSError, ValueError):
+                entries = []
+            for key, value, stored_at in entries:
+                # Expired entries are loaded too: they stay peekable for
+                # fallbacks and are served within the cache's stale window
+                self.cache.set(
+                    key, self.decode(value), ttl=self.refresh_age_s, stored_at=stored_at
+                )
+            self._primed = True
+
+    def save(self, key: Hashable, value: Any) -> Any:
+        """Persist a fresh upstream value; returns it for use in loaders"""
+        try:
+            self.store.put(self.namespace, key, value)
+        except (sqlite3.Error, OSError, TypeError, ValueError):
+            pass
+        return value
+
+    def seed(self, items: Dict[str, Any], stored_at: float | None = None):
+        """Write entries as if just fetched and load them into the cache"""
+        self.store.put_many(self.namespace, items.items(), stored_at)
+        self._primed = False
+        self.prime()
+
+
+# Store shared by the data sources of this process
+persistent_store = PersistentStore()
@@ -0,0 +1,130 @@
+"""
+Token-bucket rate limiting for upstream APIs
+
+Buckets are keyed per upstream and persisted in a small state file guarded
+by an exclusive file lock, so every thread and worker process on the host
+draws from the same budget. Only real HTTP requests should be charged;
+cache hits never touch a bucket.
+"""
+
+import asyncio
+import os
+import struct
+import threading
+import time
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts
+    fcntl = None
+
+from app.config.settings import (
+    RATE_LIMIT_DIR,
+    NOMINATIM_CALLS_PER_SEC,
+    WEATHER_CALLS_PER_SEC,
+    OVERPASS_CALLS_PER_SEC,
+)
+from app.utils.resilience import LatencyBudgetExceeded
+
+_STATE = struct.Struct("dd")  # tokens, last refill (wall clock)
+
+
+class TokenBucket:
+    """
+    Cross-process token bucket refilled at `rate` tokens per second
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float | None = None):
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.path = os.path.join(RATE_LIMIT_DIR, f"{name}.bucket")
+        self._thread_lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0, max_wait: float | None = None) -> float:
+        """
+        Block until `tokens` are available and take them
+
+        Returns the number of seconds spent waiting. Raises
+        LatencyBudgetExceeded instead of waiting past `max_wait`.
+        """
+        waited = 0.0
+        while True:
+            wait = self._take(tokens)
+            if wait <= 0:
+                return waited
+            self._check_wait(waited + wait, max_wait)
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens: float = 1.0, max_wait: float | None = None) -> float:
+        """
+        Like `acquire`, but yields to the event loop while waiting
+
+        The bucket file's lock and I/O run on a worker thread.
+        """
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self._take, tokens)
+            if wait <= 0:
+                return waited
+            self._check_wait(waited + wait, max_wait)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _check_wait(self, total: float, max_wait: float | None):
+        if max_wait is not None and total > max_wait:
+            raise LatencyBudgetExceeded(f"{self.name} rate limit wait exceeds the budget")
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take `tokens` if available right now, without blocking"""
+        return self._take(tokens) <= 0
+
+    def _take(self, tokens: float) -> float:
+        # Returns 0 if tokens were taken, else seconds until they will be
+        with self._thread_lock:
+            os.makedirs(RATE_LIMIT_DIR, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+
+                now = time.time()
+                raw = os.pread(fd, _STATE.size, 0)
+                if len(raw) == _STATE.size:
+                    available, last = _STATE.unpack(raw)
+                else:
+                    available, last = self.capacity, now
+
+                elapsed = max(0.0, now - last)
+                available = min(self.capacity, available + elapsed * self.rate)
+
+                if available >= tokens:
+                    os.pwrite(fd, _STATE.pack(available - tokens, now), 0)
+                    return 0.0
+
+                os.pwrite(fd, _STATE.pack(available, now), 0)
+                return (tokens - available) / self.rate
+            finally:
+                os.close(fd)  # also releases the flock
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_registry_lock = threading.Lock()
+
+
+def get_bucket(name: str, rate: float, capacity: float | None = None) -> TokenBucket:
+    """Return the process-wide bucket for an upstream, creating it once"""
+    with _registry_lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            bucket = TokenBucket(name, rate, capacity)
+            _buckets[name] = bucket
+        return bucket
+
+
+# Upstream policies
+nominatim_bucket = get_bucket("nominatim", NOMINATIM_CALLS_PER_SEC, capacity=1)
+weather_bucket = get_bucket("open_meteo", WEATHER_CALLS_PER_SEC)
+overpass_bucket = get_bucket("overpass", OVERPASS_CALLS_PER_SEC, capacity=1)
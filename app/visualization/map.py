@@ -5,6 +5,9 @@ Map visualization utilities using Folium
 from typing import List, Dict, Tuple
 import folium
 
+from app.utils.cache import map_cache
+from app.visualization.utils import route_to_latlon
+
 
 def build_evacuation_map(
     route_coords: List[Tuple[float, float]],
@@ -101,3 +104,51 @@ def build_evacuation_map(
     )
 
     return iframe
+
+
+# --------------------
+# Rendered map cache
+# --------------------
+def cached_evacuation_map(
+    path: List[str],
+    start: str,
+    end: str,
+    positions: Dict[str, Tuple[float, float]],
+    safehouses: List[Dict] | None = None,
+) -> str:
+    """
+    `build_evacuation_map` for a district path, reusing earlier renders
+
+    Entries are keyed by the route's districts, so `invalidate_maps` can
+    drop just the routes crossing nodes a refresh changed.
+    """
+    safehouses = safehouses or []
+    key = (
+        tuple(path),
+        start,
+        end,
+        tuple((e["safehouse"].get("name"), e["safehouse"]["lat"], e["safehouse"]["lon"])
+              for e in safehouses),
+    )
+    return map_cache.get_or_load(
+        key,
+        lambda: build_evacuation_map(
+            route_coords=route_to_latlon(path, positions),
+            start=start,
+            end=end,
+            positions=positions,
+            safehouses=safehouses,
+        ),
+    )
+
+
+def invalidate_maps(snapshot) -> int:
+    """
+    Snapshot listener: drop rendered maps whose route the diff touches
+    """
+    diff = snapshot.diff
+    if diff.full:
+        dropped = len(map_cache)
+        map_cache.clear()
+        return dropped
+    return map_cache.invalidate_where(lambda key: diff.touches(key[0]))
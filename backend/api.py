@@ -3,18 +3,42 @@ FastAPI wrapper for J&K Evacuation Engine
 Thin API layer – all logic lives in app/
 """
 
-from fastapi import FastAPI, Query
-from typing import List, Optional
+import asyncio
+import json
+from dataclasses import asdict
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import List, Literal, Optional
 
+from app.config.settings import ROUTE_BATCH_MAX_ITEMS, ROUTE_K_CAP, SUBSCRIPTION_KEEPALIVE_S
 from app.data.districts import get_all_districts
-from app.graph.builder import build_district_graph, enrich_graph_with_live_data
-from app.graph.filters import apply_risk_weights
+from app.graph.roadnet import road_router
+from app.graph.snapshot import get_snapshot_async, snapshot_manager
+from app.graph.refresher import live_refresher
+from app.routing.batch import RouteItem, plan_route_batch
+from app.routing.cch import cch_router
 from app.routing.paths import find_k_routes
+from app.routing.subscriptions import route_subscriptions
+from app.routing.table import route_tables
 from app.visualization.utils import route_to_latlon
-from app.data_sources.safehouses import fetch_safehouses
-from app.utils.geo import haversine_km
+from app.data_sources.safehouses import (
+    fetch_safehouse_index_async,
+    safehouses_degraded,
+)
+from app.utils.cache import cache_stats
+from app.utils.cache_backends import shared_backend
+from app.utils.http import close_async_client
+from app.utils.resilience import LatencyBudgetMiddleware, upstream_status
+from app.utils.store import persistent_store
 from fastapi.middleware.cors import CORSMiddleware
 
+app = FastAPI(
+    title="J&K Evacuation Routing API",
+    description="Risk-aware evacuation routing backend",
+    version="1.0.0",
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # later restrict to Vercel domain
@@ -23,82 +47,242 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app = FastAPI(
-    title="J&K Evacuation Routing API",
-    description="Risk-aware evacuation routing backend",
-    version="1.0.0",
-)
+# Bounds the time any request can spend waiting on failing upstreams
+app.add_middleware(LatencyBudgetMiddleware)
+
+# -------------------------
+# Startup: build graph snapshot once, then keep it fresh
+# -------------------------
+@app.on_event("startup")
+async def warm_snapshot():
+    snapshot_manager.add_listener(route_tables.on_publish)
+    snapshot_manager.add_listener(route_subscriptions.on_publish)
+    snapshot_manager.add_listener(road_router.on_publish)
+    snapshot_manager.add_listener(cch_router.on_publish)
+    await snapshot_manager.refresh_async()
+    await fetch_safehouse_index_async()
+    live_refresher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_background_work():
+    live_refresher.stop()
+    await close_async_client()
 
 # -------------------------
 # Health check
 # -------------------------
 @app.get("/")
-def health():
+async def health():
     return {"status": "ok"}
 
+# -------------------------
+# Cache statistics
+# -------------------------
+@app.get("/cache/stats")
+async def get_cache_stats():
+    try:
+        store = persistent_store.stats()
+    except Exception:
+        store = None
+    return {"backend": shared_backend.name, "caches": cache_stats(), "store": store}
+
+# -------------------------
+# Upstream circuit breakers
+# -------------------------
+@app.get("/upstreams/status")
+async def get_upstream_status():
+    return {"upstreams": upstream_status()}
+
+# -------------------------
+# Live-data refresh status
+# -------------------------
+@app.get("/refresh/status")
+async def get_refresh_status():
+    return asdict(live_refresher.status())
+
+# -------------------------
+# Route table and subscription statistics
+# -------------------------
+@app.get("/route-table/stats")
+async def get_route_table_stats():
+    return route_tables.stats()
+
+
+@app.get("/subscriptions/stats")
+async def get_subscription_stats():
+    return route_subscriptions.stats()
+
 # -------------------------
 # District list
 # -------------------------
 @app.get("/districts")
-def get_districts():
+async def get_districts():
     return {"districts": get_all_districts()}
 
 # -------------------------
 # Evacuation route
 # -------------------------
 @app.get("/route")
-def compute_route(
+async def compute_route(
     start: str,
     end: str,
     blocked: Optional[List[str]] = Query(default=[]),
     k: int = 3,
+    method: Literal["astar", "dijkstra", "cch"] = "astar",
 ):
-    G, positions = build_district_graph()
-    G = enrich_graph_with_live_data(G)
-    H = apply_risk_weights(
-        G,
-        blocked_disaster_types=blocked,
-        start=start,
-        end=end,
-    )
+    snap = await get_snapshot_async()
+    routes = route_tables.lookup(snap, start, end, blocked, k)
+    if routes is None and method == "cch":
+        # Single cheapest route from the contraction hierarchy
+        routes = await asyncio.to_thread(cch_router.routes, snap, start, end, blocked)
+    elif routes is None:
+        # Live search is CPU-bound: run it off the event loop
+        view, weight = snap.overlay.routing_inputs(
+            blocked_disaster_types=blocked,
+            start=start,
+            end=end,
+        )
+        routes = await asyncio.to_thread(
+            find_k_routes,
+            view, start, end, k=k,
+            weight=weight,
+            node_risk=snap.overlay.node_risk,
+            method=method,
+        )
+
+    return await _route_response_async(routes, snap, blocked)
+
+
+async def _route_response_async(routes, snap, blocked=()):
+    # Road geometry searches the road network, so keep it off the loop
+    if road_router.enabled:
+        return await asyncio.to_thread(_route_response, routes, snap, blocked)
+    return _route_response(routes, snap, blocked)
 
-    routes = find_k_routes(H, start, end, k=k)
+
+def _route_response(routes, snap, blocked=()):
+    # `degraded` lists upstreams whose fallback data fed this snapshot
+    degraded = sorted(snap.degraded)
     if not routes:
-        return {"error": "No route found"}
+        return {"error": "No route found", "degraded": degraded}
 
     chosen = routes[0]
-    route_coords = route_to_latlon(chosen["path"], positions)
-
-    return {
+    route_coords = route_to_latlon(chosen["path"], snap.positions)
+    response = {
         "route": chosen["path"],
         "cost": chosen["cost"],
         "risk_nodes": chosen["risk_nodes"],
         "coordinates": route_coords,
+        "degraded": degraded,
     }
 
+    # Follow the roads between districts when a road network is loaded
+    try:
+        road = road_router.geometry(snap, chosen["path"], blocked)
+    except Exception:
+        road = None
+    if road is not None:
+        response["coordinates"] = road["coordinates"]
+        response["road_cost"] = road["cost"]
+    return response
+
+# -------------------------
+# Batch evacuation routes (NDJSON stream)
+# -------------------------
+class RouteRequest(BaseModel):
+    start: str
+    end: str
+    blocked: List[str] = []
+    k: int = 3
+
+
+@app.post("/routes/batch")
+async def compute_routes_batch(items: List[RouteRequest]):
+    if len(items) > ROUTE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"at most {ROUTE_BATCH_MAX_ITEMS} items per batch",
+        )
+
+    snap = await get_snapshot_async()
+    groups = await asyncio.to_thread(
+        plan_route_batch,
+        snap,
+        [
+            # k is clamped as /route's search clamps it
+            RouteItem(it.start, it.end, list(it.blocked), min(it.k, ROUTE_K_CAP))
+            for it in items
+        ],
+        route_tables,
+    )
+
+    async def stream():
+        # One line per item as each group finishes, tagged with its index
+        for group in groups:
+            for index, routes in await asyncio.to_thread(group.solve):
+                body = await _route_response_async(routes, snap, items[index].blocked)
+                line = {"index": index, **body}
+                yield json.dumps(line) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# -------------------------
+# Route subscriptions (server-sent events)
+# -------------------------
+@app.get("/routes/subscribe")
+async def subscribe_route(
+    start: str,
+    end: str,
+    blocked: Optional[List[str]] = Query(default=[]),
+):
+    sub = await route_subscriptions.subscribe_async(
+        await get_snapshot_async(), start, end, blocked
+    )
+
+    async def stream():
+        try:
+            while True:
+                version, route = sub.latest
+                snap = await get_snapshot_async()
+                body = await _route_response_async([route] if route else [], snap, sub.scenario)
+                event = {"version": version, **body}
+                yield f"event: route\ndata: {json.dumps(event)}\n\n"
+                while not await sub.wait(SUBSCRIPTION_KEEPALIVE_S):
+                    yield ": keepalive\n\n"
+        finally:
+            route_subscriptions.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
 # -------------------------
 # Safehouses near district
 # -------------------------
 @app.get("/safehouses")
-def safehouses_near(district: str, k: int = 3):
-    G, positions = build_district_graph()
+async def safehouses_near(district: str, k: int = 3):
+    positions = (await get_snapshot_async()).positions
     lat, lon = positions.get(district, (None, None))
     if lat is None:
         return {"error": "Invalid district"}
 
-    safehouses = fetch_safehouses()
-    ranked = []
-
-    for sh in safehouses:
-        d = haversine_km(lat, lon, sh["lat"], sh["lon"])
-        ranked.append({
+    index = await fetch_safehouse_index_async()
+    ranked = [
+        {
             "name": sh["name"],
             "type": sh.get("type"),
             "lat": sh["lat"],
             "lon": sh["lon"],
             "distance_km": round(d, 2),
-        })
+        }
+        for d, sh in index.k_nearest(lat, lon, k)
+    ]
 
-    ranked.sort(key=lambda x: x["distance_km"])
-    return {"safehouses": ranked[:k]}
+    return {
+        "safehouses": ranked,
+        "degraded": ["overpass"] if safehouses_degraded() else [],
+    }
 
@@ -0,0 +1,145 @@
+"""
+Benchmark: upstream traffic and cross-worker hit rate per cache backend
+
+Starts W worker processes at once against each backend. Every worker
+resolves the same skewed stream of keys through a TTLCache whose loader
+stands in for an upstream call (a fixed delay, counted), once key by key
+via `get_or_load` and once as a bulk request like the weather tiles.
+Upstream loads should stay flat as W grows for the shared backends and
+grow with W for the in-process one.
+
+    python -m benchmarks.bench_cache_backends
+    python -m benchmarks.bench_cache_backends --workers 1 2 4 8 --backends sqlite redis
+    python -m benchmarks.bench_cache_backends --redis-url redis://127.0.0.1:6379/0
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+import uuid
+
+
+def _worker(backend_name, location, namespace, args, barrier, results):
+    from app.utils.cache import TTLCache
+    from app.utils.cache_backends import InProcessBackend, RedisBackend, SQLiteBackend
+
+    if backend_name == "sqlite":
+        backend = SQLiteBackend(location)
+    elif backend_name == "redis":
+        backend = RedisBackend(location)
+    else:
+        backend = InProcessBackend()
+
+    cache = TTLCache(namespace, ttl=600.0, maxsize=args.keys, backend=backend)
+    loads = 0
+
+    def loader_for(key):
+        def _load():
+            nonlocal loads
+            loads += 1
+            time.sleep(args.upstream_ms / 1000)
+            return {"key": key, "lat": 34.0 + key * 1e-3, "lon": 74.0}
+        return _load
+
+    # Same skewed stream for every worker, offset so they do not march in step
+    rnd = random.Random(args.seed)
+    stream = [min(int(rnd.paretovariate(1.2)) - 1, args.keys - 1) for _ in range(args.lookups)]
+    offset = (os.getpid() * 7919) % len(stream)
+    stream = stream[offset:] + stream[:offset]
+
+    barrier.wait()
+    started = time.perf_counter()
+    for key in stream:
+        cache.get_or_load(("point", key), loader_for(key))
+
+    # Bulk path: every worker wants the same tiles, as after a snapshot refresh
+    tiles = [("tile", i) for i in range(args.keys)]
+    values = cache.get_many(tiles)
+    found, mine, theirs = cache.claim_many([t for t in tiles if t not in values])
+    try:
+        for i in range(0, len(mine), 100):
+            loads += len(mine[i:i + 100])
+            time.sleep(args.upstream_ms / 1000)
+            cache.set_many((t, 0.5) for t in mine[i:i + 100])
+    finally:
+        cache.release_many(mine)
+    arrived = cache.wait_many(theirs)
+    late = [t for t in theirs if t not in arrived]
+    loads += len(late)
+    cache.set_many((t, 0.5) for t in late)
+    elapsed = time.perf_counter() - started
+
+    stats = cache.stats()
+    results.put((loads, elapsed, stats.get("cluster"), stats))
+
+
+def run(backend_name: str, location: str, workers: int, args):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    namespace = f"bench-{uuid.uuid4().hex[:8]}"
+    procs = [
+        ctx.Process(target=_worker, args=(backend_name, location, namespace, args, barrier, results))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    out = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    loads = sum(o[0] for o in out)
+    slowest = max(o[1] for o in out)
+    lookups = sum(o[3]["hits"] + o[3]["misses"] + o[3]["stale_serves"] for o in out)
+    cross = sum(o[3]["cross_worker_hits"] for o in out)
+    cluster = max((o[2] for o in out if o[2]), key=lambda c: c["hits"] + c["misses"], default=None)
+    reported = f"{cluster['cross_worker_hit_rate']:.1%}" if cluster else "n/a"
+    print(
+        f"  {backend_name:7s} W={workers:<3d} upstream loads={loads:6d} "
+        f"({loads / workers:8.1f} per worker)  "
+        f"cross-worker hit rate={cross / max(lookups, 1):6.1%} (cluster stats {reported})  "
+        f"slowest worker {slowest:6.2f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4, 8])
+    parser.add_argument("--backends", nargs="*", default=["memory", "sqlite", "redis"])
+    parser.add_argument("--keys", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--upstream-ms", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--redis-url", default=None,
+                        help="use this server instead of the bundled stand-in")
+    args = parser.parse_args()
+
+    server = None
+    redis_url = args.redis_url
+    if "redis" in args.backends and redis_url is None:
+        from benchmarks.resp_server import RespServer
+
+        server = RespServer().start()
+        redis_url = server.url
+
+    with tempfile.TemporaryDirectory() as tmp:
+        locations = {
+            "memory": "",
+            "sqlite": os.path.join(tmp, "cache.sqlite3"),
+            "redis": redis_url,
+        }
+        print(f"{args.keys} keys, {args.lookups} lookups per worker, "
+              f"{args.upstream_ms:g} ms per upstream call")
+        for backend_name in args.backends:
+            for workers in args.workers:
+                run(backend_name, locations[backend_name], workers, args)
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
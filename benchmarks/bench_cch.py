@@ -0,0 +1,103 @@
+"""
+Benchmark: customizable contraction hierarchies vs. Dijkstra
+
+Reports preprocessing time, customization time per risk scenario, query
+time and memory on the district graph and on synthetic road-like graphs,
+and checks every CCH distance against NetworkX Dijkstra.
+
+    python -m benchmarks.bench_cch --offline
+    python -m benchmarks.bench_cch --sizes 10000 50000 --queries 200
+"""
+
+import argparse
+import random
+import statistics
+import resource
+import time
+
+import networkx as nx
+
+from app.graph.filters import RiskOverlay
+from app.routing.cch import ContractionHierarchy
+from app.routing.table import standard_scenarios
+from benchmarks.bench_ksp import district_graph, synthetic_graph
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(name: str, G: nx.Graph, queries: int, seed: int, dijkstra_queries: int):
+    overlay = RiskOverlay(G)
+    print(f"{name}: n={G.number_of_nodes()} m={G.number_of_edges()}")
+
+    cch, prep_s = _timed(ContractionHierarchy, G)
+    print(
+        f"  preprocess   {prep_s * 1000:10.1f} ms  arcs={cch.n_arcs} "
+        f"(fill-in x{cch.n_arcs / max(G.number_of_edges(), 1):.2f}) "
+        f"triangles={cch.n_triangles} arrays={cch.nbytes() / 2**20:.1f} MB "
+        f"process peak RSS={_peak_rss_mb():.0f} MB"
+    )
+
+    custom_times = []
+    metrics = {}
+    for scenario in standard_scenarios():
+        weight = overlay.weight_fn(scenario)
+        metrics[scenario], seconds = _timed(cch.customize, weight)
+        custom_times.append(seconds)
+    metric = metrics[frozenset({"flood"})]
+    print(
+        f"  customize    {statistics.median(custom_times) * 1000:10.1f} ms per scenario "
+        f"(weights {metric.nbytes() / 2**20:.1f} MB)"
+    )
+
+    rnd = random.Random(seed)
+    nodes = list(G.nodes)
+    pairs = [tuple(rnd.sample(nodes, 2)) for _ in range(queries)]
+
+    dist_times = [_timed(metric.distance, s, t)[1] for s, t in pairs]
+    path_times = [_timed(metric.shortest_path, s, t)[1] for s, t in pairs]
+    print(
+        f"  query        {statistics.median(dist_times) * 1e6:10.1f} us distance, "
+        f"{statistics.median(path_times) * 1e6:.1f} us with path"
+    )
+
+    weight = overlay.weight_fn({"flood"})
+    ref_times = []
+    mismatches = 0
+    for s, t in pairs[:dijkstra_queries]:
+        ref, seconds = _timed(nx.dijkstra_path_length, G, s, t, weight)
+        ref_times.append(seconds)
+        if abs(ref - metric.distance(s, t)) > 1e-9 * max(1.0, ref):
+            mismatches += 1
+    print(
+        f"  dijkstra     {statistics.median(ref_times) * 1e6:10.1f} us  "
+        f"mismatches={mismatches}/{len(ref_times)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dijkstra-queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--offline", action="store_true",
+                        help="use bundled district coordinates instead of Nominatim")
+    args = parser.parse_args()
+
+    run("districts", district_graph(args.seed, args.offline),
+        args.queries, args.seed, args.dijkstra_queries)
+    for n in args.sizes:
+        run(f"synthetic-{n}", synthetic_graph(n, args.seed),
+            args.queries, args.seed, args.dijkstra_queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark: top-k route engine vs. the NetworkX-based find_k_routes
+
+Compares app.routing.paths.find_k_routes (dedicated Yen/Lawler engine,
+in both A* and Dijkstra modes) against the previous implementation built
+on nx.shortest_simple_paths, on the district graph and on synthetic
+road-like graphs.
+
+    python -m benchmarks.bench_ksp --offline
+    python -m benchmarks.bench_ksp --sizes 10000 50000 --pairs 5 --k 5
+"""
+
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+import networkx as nx
+
+from app.graph.filters import RiskOverlay
+from app.risk.scoring import total_risk_score
+from app.routing.ksp import SearchStats
+from app.routing.paths import find_k_routes
+from app.utils.geo import haversine_km
+from app.utils.spatial import SpatialIndex
+
+
+def legacy_find_k_routes(G, start, end, k=3, weight="weight"):
+    """find_k_routes as it was before the dedicated engine"""
+    routes = []
+    if start not in G or end not in G:
+        return routes
+    try:
+        for path in nx.shortest_simple_paths(G, start, end, weight=weight):
+            cost = 0.0
+            for u, v in zip(path, path[1:]):
+                cost += weight(u, v, G[u][v])
+            routes.append({
+                "path": path,
+                "cost": round(float(cost), 2),
+                "risk_nodes": sum(
+                    1 for n in path if total_risk_score(G.nodes[n]) > 5.0
+                ),
+            })
+            if len(routes) >= k:
+                break
+    except nx.NetworkXNoPath:
+        pass
+    return routes
+
+
+# --------------------
+# Graphs
+# --------------------
+def _random_hazards(G: nx.Graph, rnd: random.Random):
+    for _, attrs in G.nodes(data=True):
+        attrs["precipitation_24h"] = rnd.choice([0, 0, 25, 60, 120, 250])
+        attrs["quake_mag"] = rnd.choice([0, 0, 0, 4.2, 5.5, 6.3])
+        attrs["disaster_type"] = rnd.choice(["", "", "flood", "landslide", "earthquake"])
+
+
+def district_graph(seed: int, offline: bool) -> nx.Graph:
+    if offline:
+        from app.data.districts import FALLBACK_COORDINATES
+        from app.utils.cache import coord_cache
+        for district, coord in FALLBACK_COORDINATES.items():
+            coord_cache.set(district, coord)
+
+    from app.graph.builder import build_district_graph
+    G, _ = build_district_graph()
+    G = G.copy()
+    _random_hazards(G, random.Random(seed))
+    return nx.freeze(G)
+
+
+def synthetic_graph(n: int, seed: int, degree: int = 4) -> nx.Graph:
+    """
+    Random points over the region, each linked to its `degree` nearest
+    neighbours - sparse and planar-ish, like a road network
+    """
+    rnd = random.Random(seed)
+    points = [
+        {"id": i, "lat": rnd.uniform(32.3, 37.1), "lon": rnd.uniform(73.0, 80.4)}
+        for i in range(n)
+    ]
+    index = SpatialIndex(points)
+
+    G = nx.Graph()
+    for p in points:
+        G.add_node(p["id"], lat=p["lat"], lon=p["lon"])
+    for p in points:
+        for d, q in index.k_nearest(p["lat"], p["lon"], degree + 1)[1:]:
+            G.add_edge(p["id"], q["id"], base_distance_km=d)
+
+    # Keep the largest component so every sampled pair is routable
+    G = G.subgraph(max(nx.connected_components(G), key=len)).copy()
+    _random_hazards(G, rnd)
+    return nx.freeze(G)
+
+
+# --------------------
+# Runner
+# --------------------
+def _far_pairs(G: nx.Graph, count: int, seed: int):
+    rnd = random.Random(seed)
+    nodes = list(G.nodes)
+    if len(nodes) <= 64:
+        pairs = list(itertools.permutations(nodes, 2))
+        rnd.shuffle(pairs)
+        return pairs[:count]
+
+    # Long routes are the expensive case; pick pairs far apart
+    pairs = []
+    while len(pairs) < count:
+        s, t = rnd.sample(nodes, 2)
+        a, b = G.nodes[s], G.nodes[t]
+        if haversine_km(a["lat"], a["lon"], b["lat"], b["lon"]) > 200:
+            pairs.append((s, t))
+    return pairs
+
+
+def run(name: str, G: nx.Graph, pairs, k: int, blocked, legacy: bool):
+    overlay = RiskOverlay(G)
+    view, weight = overlay.routing_inputs(blocked_disaster_types=blocked)
+    print(
+        f"{name}: n={G.number_of_nodes()} m={G.number_of_edges()} "
+        f"pairs={len(pairs)} k={k}"
+    )
+
+    costs = {}
+    for method in ("astar", "dijkstra"):
+        times = []
+        stats = SearchStats()
+        costs[method] = []
+        for s, t in pairs:
+            started = time.perf_counter()
+            routes = find_k_routes(view, s, t, k=k, weight=weight,
+                                   node_risk=overlay.node_risk,
+                                   stats=stats, method=method)
+            times.append(time.perf_counter() - started)
+            costs[method].append([r["cost"] for r in routes])
+        print(
+            f"  {method:<9} {statistics.median(times) * 1000:10.2f} ms  "
+            f"expanded={stats.expanded} spur searches={stats.spur_searches} "
+            f"tree hits={stats.tree_hits}"
+        )
+
+    mismatches = sum(a != d for a, d in zip(costs["astar"], costs["dijkstra"]))
+    if legacy:
+        times = []
+        for (s, t), expected in zip(pairs, costs["dijkstra"]):
+            started = time.perf_counter()
+            old = legacy_find_k_routes(view, s, t, k=k, weight=weight)
+            times.append(time.perf_counter() - started)
+            mismatches += [r["cost"] for r in old] != expected
+        print(f"  {'networkx':<9} {statistics.median(times) * 1000:10.2f} ms")
+    print(f"  cost mismatches={mismatches}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10000])
+    parser.add_argument("--pairs", type=int, default=5)
+    parser.add_argument("--district-pairs", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--blocked", nargs="*", default=["flood"])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--offline", action="store_true",
+                        help="use bundled district coordinates instead of Nominatim")
+    parser.add_argument("--no-legacy", action="store_true",
+                        help="skip the NetworkX baseline (slow on large graphs)")
+    args = parser.parse_args()
+
+    G = district_graph(args.seed, args.offline)
+    run("districts", G, _far_pairs(G, args.district_pairs, args.seed),
+        args.k, args.blocked, not args.no_legacy)
+
+    for n in args.sizes:
+        G = synthetic_graph(n, args.seed)
+        run(f"synthetic-{n}", G, _far_pairs(G, args.pairs, args.seed),
+            args.k, args.blocked, not args.no_legacy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: CSR road network build, memory and A*/Dijkstra queries
+
+Generates a jittered grid road network over the region (about 1M arcs by
+default), writes a small copy as Overpass JSON to exercise the loader,
+and checks A* against Dijkstra and NetworkX.
+
+    python -m benchmarks.bench_roadnet
+    python -m benchmarks.bench_roadnet --side 700 --queries 20
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import networkx as nx
+
+from app.graph.roadnet import RoadNetwork
+
+
+def grid_ways(side: int, seed: int):
+    """
+    side x side intersections, one way per grid row and column, with
+    a few one-way streets and missing blocks
+    """
+    rnd = random.Random(seed)
+    step = 0.6 / side * 8  # ~side/8 degrees across
+    coords = {}
+    for r in range(side):
+        for c in range(side):
+            coords[r * side + c] = (
+                32.5 + r * step + rnd.uniform(-0.3, 0.3) * step,
+                74.0 + c * step + rnd.uniform(-0.3, 0.3) * step,
+            )
+
+    ways = []
+    for r in range(side):
+        refs = [r * side + c for c in range(side) if rnd.random() > 0.02]
+        ways.append((refs, "yes" if rnd.random() < 0.05 else None))
+    for c in range(side):
+        refs = [r * side + c for r in range(side) if rnd.random() > 0.02]
+        ways.append((refs, "-1" if rnd.random() < 0.05 else None))
+    return coords, ways
+
+
+def check_loader(seed: int):
+    coords, ways = grid_ways(30, seed)
+    elements = [{"type": "node", "id": i, "lat": la, "lon": lo} for i, (la, lo) in coords.items()]
+    elements += [
+        {"type": "way", "id": 10**6 + i, "nodes": refs,
+         "tags": {"highway": "primary", **({"oneway": ow} if ow else {})}}
+        for i, (refs, ow) in enumerate(ways)
+    ]
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump({"elements": elements}, f)
+    try:
+        loaded = RoadNetwork.load(path)
+    finally:
+        os.remove(path)
+    built = RoadNetwork.from_ways(coords, ways)
+    assert loaded.n_arcs == built.n_arcs and loaded.n_vertices == built.n_vertices
+    print(f"loader      overpass json ok ({loaded.n_vertices} vertices, {loaded.n_arcs} arcs)")
+
+
+def to_networkx(net: RoadNetwork) -> nx.DiGraph:
+    G = nx.DiGraph()
+    for u, v, w in zip(net.arc_tails().tolist(), net.indices.tolist(), net.length_km.tolist()):
+        G.add_edge(u, v, weight=w)
+    return G
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--side", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--networkx", action="store_true",
+                        help="also time NetworkX Dijkstra (needs several GB at full size)")
+    args = parser.parse_args()
+
+    check_loader(args.seed)
+
+    coords, ways = grid_ways(args.side, args.seed)
+    tracemalloc.start()
+    started = time.perf_counter()
+    net = RoadNetwork.from_ways(coords, ways)
+    build_s = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del coords, ways
+
+    started = time.perf_counter()
+    component = net.main_component()
+    component_s = time.perf_counter() - started
+
+    print(
+        f"network     {net.n_vertices} vertices, {net.n_arcs} arcs, "
+        f"{net.nbytes() / 2**20:.1f} MB arrays, build {build_s:.2f} s "
+        f"(peak {peak / 2**20:.0f} MB), components {component_s:.2f} s"
+    )
+
+    rnd = random.Random(args.seed)
+    pairs = [tuple(rnd.sample(component.tolist(), 2)) for _ in range(args.queries)]
+
+    results = {}
+    for astar in (True, False):
+        times, expanded = [], []
+        costs = []
+        for s, t in pairs:
+            stats = {}
+            started = time.perf_counter()
+            cost, _ = net.shortest_path(s, t, astar=astar, stats=stats)
+            times.append(time.perf_counter() - started)
+            expanded.append(stats["expanded"])
+            costs.append(cost)
+        results[astar] = costs
+        name = "A*" if astar else "Dijkstra"
+        print(
+            f"{name:<11} median {statistics.median(times) * 1000:8.1f} ms, "
+            f"median expanded {int(statistics.median(expanded))}"
+        )
+
+    same = all(abs(a - b) <= 1e-6 * max(1.0, b) for a, b in zip(results[True], results[False]))
+    print(f"A* == Dijkstra costs: {same}")
+
+    if args.networkx:
+        G = to_networkx(net)
+        times = []
+        for (s, t), cost in zip(pairs, results[False]):
+            started = time.perf_counter()
+            ref = nx.dijkstra_path_length(G, s, t)
+            times.append(time.perf_counter() - started)
+            assert abs(ref - cost) <= 1e-6 * max(1.0, cost)
+        print(f"networkx    median {statistics.median(times) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
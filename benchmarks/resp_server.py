@@ -0,0 +1,190 @@
+"""
+Stand-in Redis-protocol server for exercising the redis cache backend
+
+Implements the subset RedisBackend uses (GET, MGET, SET with PX/EX/NX,
+DEL, SCAN, HINCRBY, HGETALL) plus PING, SELECT, AUTH and FLUSHDB, in
+memory, with lazy key expiry. One thread per client; not for production.
+
+    python -m benchmarks.resp_server --port 6399
+"""
+
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class RespStore:
+    """Keyspace shared by every client: key -> (value, expires_at or None)"""
+
+    def __init__(self):
+        self._data: Dict[bytes, Tuple[object, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: bytes):
+        # Caller holds the lock
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item[0]
+
+    def execute(self, args: List[bytes]):
+        name = args[0].upper()
+        handler = getattr(self, "cmd_" + name.decode(errors="replace").lower(), None)
+        if handler is None:
+            return ValueError(f"ERR unknown command '{name.decode(errors='replace')}'")
+        with self._lock:
+            try:
+                return handler(*args[1:])
+            except (TypeError, ValueError, IndexError):
+                return ValueError(f"ERR wrong arguments for '{name.decode()}'")
+
+    def cmd_ping(self, *args):
+        return args[0] if args else "PONG"
+
+    def cmd_select(self, db):
+        return "OK"
+
+    def cmd_auth(self, *args):
+        return "OK"
+
+    def cmd_flushdb(self, *args):
+        self._data.clear()
+        return "OK"
+
+    def cmd_get(self, key):
+        value = self._live(key)
+        return value if value is None or isinstance(value, bytes) else _wrong_type()
+
+    def cmd_mget(self, *keys):
+        values = [self._live(k) for k in keys]
+        return [v if isinstance(v, bytes) else None for v in values]
+
+    def cmd_set(self, key, value, *options):
+        expires_at, nx, i = None, False, 0
+        while i < len(options):
+            opt = options[i].upper()
+            if opt == b"PX":
+                expires_at = time.monotonic() + int(options[i + 1]) / 1000
+                i += 2
+            elif opt == b"EX":
+                expires_at = time.monotonic() + int(options[i + 1])
+                i += 2
+            elif opt == b"NX":
+                nx, i = True, i + 1
+            else:
+                raise ValueError(opt)
+        if nx and self._live(key) is not None:
+            return None
+        self._data[key] = (value, expires_at)
+        return "OK"
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._live(key) is not None:
+                del self._data[key]
+                removed += 1
+        return removed
+
+    def cmd_scan(self, cursor, *options):
+        # The whole keyspace in one page, which SCAN's contract allows
+        pattern = None
+        for i in range(0, len(options) - 1, 2):
+            if options[i].upper() == b"MATCH":
+                pattern = options[i + 1]
+        keys = [
+            k for k in list(self._data)
+            if self._live(k) is not None
+            and (pattern is None or fnmatch.fnmatchcase(k, pattern))
+        ]
+        return [b"0", keys]
+
+    def cmd_hincrby(self, key, field, amount):
+        table = self._live(key)
+        if table is None:
+            table = {}
+            self._data[key] = (table, None)
+        elif not isinstance(table, dict):
+            return _wrong_type()
+        table[field] = table.get(field, 0) + int(amount)
+        return table[field]
+
+    def cmd_hgetall(self, key):
+        table = self._live(key) or {}
+        if not isinstance(table, dict):
+            return _wrong_type()
+        return [x for field, n in table.items() for x in (field, str(n).encode())]
+
+
+def _wrong_type():
+    return ValueError("WRONGTYPE Operation against a key holding the wrong kind of value")
+
+
+def _encode(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, ValueError):
+        return b"-" + str(reply).encode() + b"\r\n"
+    if isinstance(reply, str):
+        return b"+" + reply.encode() + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(_encode(r) for r in reply)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.startswith(b"*"):
+                self.wfile.write(b"-ERR inline commands are not supported\r\n")
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                size = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(size + 2)[:-2])
+            self.wfile.write(_encode(self.server.store.execute(args)))
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.store = RespStore()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "RespServer":
+        """Serve on a daemon thread; returns self"""
+        threading.Thread(target=self.serve_forever, name="resp-server", daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+
+    server = RespServer(args.host, args.port)
+    print(f"serving {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
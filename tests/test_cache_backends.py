@@ -0,0 +1,200 @@
+"""
+Binary codec and shared cache backends
+"""
+
+import math
+import time
+
+import pytest
+
+from app.utils.cache import TTLCache
+from app.utils.cache_backends import (
+    InProcessBackend,
+    RedisBackend,
+    SQLiteBackend,
+    decode_entry,
+    encode_entry,
+)
+from app.utils.codec import MAX_DEPTH, CodecError, decode, encode
+from benchmarks.resp_server import RespServer
+
+VALUES = [
+    None,
+    True,
+    False,
+    0,
+    -1,
+    2**70,
+    -(2**70),
+    3.25,
+    -0.0,
+    math.inf,
+    "",
+    "Évacuation ✓",
+    b"\x00\xff",
+    [],
+    (1, "a", None),
+    frozenset({1, "b"}),
+    {"lat": 19.07, "lon": 72.87, "tags": ["flood", ("zone", 3)], 7: {}},
+]
+
+
+# --------------------
+# Codec
+# --------------------
+@pytest.mark.parametrize("value", VALUES, ids=repr)
+def test_codec_round_trip(value):
+    decoded = decode(encode(value))
+    assert decoded == value
+    assert type(decoded) is type(value)
+
+
+def test_codec_keeps_bool_and_int_apart():
+    assert decode(encode([True, 1, False, 0])) == [True, 1, False, 0]
+    assert [type(v) for v in decode(encode([True, 1]))] == [bool, int]
+
+
+def test_codec_rejects_every_truncation():
+    data = encode(VALUES)
+    for end in range(len(data)):
+        with pytest.raises(CodecError):
+            decode(data[:end])
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"N\x00",  # trailing bytes
+        b"?",  # unknown tag
+        b"i" + b"\xff" * 100,  # unterminated varint
+        b"s\x02\xff\xfe",  # invalid UTF-8
+        b"s\xff\xff\xff\x0f",  # length past the end
+        b"f\x01l\x00",  # unhashable set member
+        b"m\x01l\x00N",  # unhashable mapping key
+        b"l\x01" * (MAX_DEPTH + 2) + b"N",  # nested too deeply
+    ],
+    ids=repr,
+)
+def test_codec_rejects_corrupt_payloads(data):
+    with pytest.raises(CodecError):
+        decode(data)
+
+
+@pytest.mark.parametrize("value", [object(), {1, 2}, [object()]], ids=repr)
+def test_codec_refuses_unsupported_values(value):
+    with pytest.raises(CodecError):
+        encode(value)
+
+
+def test_entry_round_trip_and_truncation():
+    entry = ({"temp": 31.5}, 1700000000.5, 600.0, True, 4242)
+    assert decode_entry(encode_entry(entry)) == entry
+    data = encode_entry(entry)
+    for end in range(len(data)):
+        with pytest.raises(CodecError):
+            decode_entry(data[:end])
+
+
+# --------------------
+# Backends
+# --------------------
+@pytest.fixture
+def resp_server():
+    server = RespServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    return RedisBackend(request.getfixturevalue("resp_server").url)
+
+
+def _entry(value, ttl=60.0):
+    return (value, time.time(), ttl, False, 1234)
+
+
+def test_backend_round_trip(backend):
+    assert backend.shared
+    items = [
+        ("plain", _entry(1.5)),
+        (("tuple", 2), _entry({"nested": [1, 2, 3]})),
+        (42, _entry(None)),
+    ]
+    backend.set_many("ns", [(k, e, 60.0) for k, e in items])
+
+    found = backend.get_many("ns", [k for k, _ in items] + ["missing"])
+    assert found == dict(items)
+    assert sorted(map(repr, backend.keys("ns"))) == sorted(repr(k) for k, _ in items)
+    assert backend.get_many("other", ["plain"]) == {}
+
+    backend.delete_many("ns", ["plain"])
+    assert "plain" not in backend.get_many("ns", ["plain", 42])
+    backend.clear("ns")
+    assert backend.get_many("ns", [42, ("tuple", 2)]) == {}
+
+
+def test_backend_expires_entries(backend):
+    backend.set_many("ns", [("short", _entry(1), 0.05), ("long", _entry(2), 60.0)])
+    time.sleep(0.15)
+    assert set(backend.get_many("ns", ["short", "long"])) == {"long"}
+
+
+def test_backend_leases(backend):
+    assert backend.try_lease("ns", "k", 60.0)
+    assert not backend.try_lease("ns", "k", 60.0)
+    backend.release_lease("ns", "k")
+    assert backend.try_lease("ns", "k", 60.0)
+
+    assert backend.try_lease_many("ns", ["a", "k", "b"], 60.0) == [True, False, True]
+    backend.release_lease_many("ns", ["a", "k", "b"])
+    assert backend.try_lease_many("ns", ["a", "k"], 60.0) == [True, True]
+
+    assert backend.try_lease("ns", "brief", 0.05)
+    time.sleep(0.15)
+    assert backend.try_lease("ns", "brief", 60.0)
+
+
+def test_backend_counters(backend):
+    backend.add_counters("ns", {"hits": 3, "misses": 1})
+    backend.add_counters("ns", {"hits": 2, "loads": 0})
+    assert backend.counters("ns") == {"hits": 5, "misses": 1}
+    assert backend.counters("other") == {}
+
+
+def test_in_process_backend_is_not_shared():
+    backend = InProcessBackend()
+    backend.set_many("ns", [("k", _entry(1), 60.0)])
+    assert not backend.shared
+    assert backend.get_many("ns", ["k"]) == {}
+    assert TTLCache("local", ttl=60, maxsize=4, backend=backend).backend is None
+
+
+# --------------------
+# TTLCache over a shared backend
+# --------------------
+def test_caches_share_entries_across_workers(backend):
+    first = TTLCache("weather", ttl=60, maxsize=16, backend=backend)
+    second = TTLCache("weather", ttl=60, maxsize=16, backend=backend)
+
+    first.set(("lat", "lon"), {"temp": 30})
+    assert second.get(("lat", "lon")) == {"temp": 30}
+    assert second.shared_hits == 1
+
+    calls = []
+    assert first.get_or_load("fresh", lambda: calls.append(1) or "loaded") == "loaded"
+    assert second.get_or_load("fresh", lambda: calls.append(2) or "again") == "loaded"
+    assert calls == [1]
+
+
+def test_degraded_entries_stay_local(backend):
+    first = TTLCache("quakes", ttl=60, maxsize=16, backend=backend)
+    second = TTLCache("quakes", ttl=60, maxsize=16, backend=backend)
+
+    first.set("k", "fallback", degraded=True)
+    assert first.get("k") == "fallback"
+    assert second.get("k") is None
@@ -0,0 +1,225 @@
+"""
+KSP, CCH and DynamicTree against plain NetworkX searches
+"""
+
+import random
+from itertools import islice
+
+import networkx as nx
+import pytest
+
+from app.routing.cch import ContractionHierarchy
+from app.routing.dynamic import DynamicTree
+from app.routing.ksp import k_shortest_paths
+from app.routing.paths import find_k_routes, haversine_heuristic, weight_function
+from app.utils.geo import haversine_km
+
+SEEDS = range(6)
+
+
+def _district_graph(seed: int, n: int = 120) -> nx.Graph:
+    """Random geometric graph with lat/lon and weights >= great-circle km"""
+    rng = random.Random(seed)
+    G = nx.random_geometric_graph(n, 0.17, seed=seed)
+    for v, (x, y) in nx.get_node_attributes(G, "pos").items():
+        G.nodes[v].update(lat=19.0 + 0.3 * y, lon=72.8 + 0.3 * x)
+        del G.nodes[v]["pos"]
+    for u, v, d in G.edges(data=True):
+        a, b = G.nodes[u], G.nodes[v]
+        km = haversine_km(a["lat"], a["lon"], b["lat"], b["lon"])
+        d["weight"] = km * (1.0 + 3.0 * rng.random())
+    return G
+
+
+def _pairs(G: nx.Graph, seed: int, count: int = 8):
+    rng = random.Random(seed)
+    nodes = list(G)
+    return [tuple(rng.sample(nodes, 2)) for _ in range(count)]
+
+
+def _cost(G: nx.Graph, path) -> float:
+    return nx.path_weight(G, path, "weight")
+
+
+# --------------------
+# k shortest paths
+# --------------------
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("astar", [False, True], ids=["dijkstra", "astar"])
+def test_ksp_matches_shortest_simple_paths(seed, astar):
+    G = _district_graph(seed)
+    weight = weight_function("weight")
+    for s, t in _pairs(G, seed):
+        heuristic = haversine_heuristic(G, s, t) if astar else None
+        found = k_shortest_paths(G, s, t, 6, weight, heuristic=heuristic)
+
+        if not nx.has_path(G, s, t):
+            assert found == []
+            continue
+        expected = [
+            _cost(G, p) for p in islice(nx.shortest_simple_paths(G, s, t, "weight"), 6)
+        ]
+        assert [c for c, _ in found] == pytest.approx(expected)
+        assert len({tuple(p) for _, p in found}) == len(found)
+        for cost, path in found:
+            assert path[0] == s and path[-1] == t
+            assert len(set(path)) == len(path)
+            assert cost == pytest.approx(_cost(G, path))
+
+
+def test_ksp_hidden_edges_are_never_used():
+    G = _district_graph(0)
+    blocked = set(list(G.edges)[::5])
+
+    def weight(u, v, d):
+        return None if (u, v) in blocked or (v, u) in blocked else d["weight"]
+
+    H = G.copy()
+    H.remove_edges_from(blocked)
+    for s, t in _pairs(G, 0):
+        found = k_shortest_paths(G, s, t, 4, weight)
+        if not nx.has_path(H, s, t):
+            assert found == []
+            continue
+        expected = [_cost(H, p) for p in islice(nx.shortest_simple_paths(H, s, t, "weight"), 4)]
+        assert [c for c, _ in found] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS[:3])
+def test_find_k_routes_methods_agree(seed):
+    G = _district_graph(seed)
+    for s, t in _pairs(G, seed, 4):
+        astar = find_k_routes(G, s, t, k=4, method="astar", node_risk={n: 0.0 for n in G})
+        dijkstra = find_k_routes(G, s, t, k=4, method="dijkstra", node_risk={n: 0.0 for n in G})
+        assert [r["cost"] for r in astar] == [r["cost"] for r in dijkstra]
+
+
+# --------------------
+# Customizable contraction hierarchies
+# --------------------
+@pytest.mark.parametrize("seed", SEEDS)
+def test_cch_matches_dijkstra(seed):
+    G = _district_graph(seed)
+    cch = ContractionHierarchy(G)
+    metric = cch.customize("weight")
+
+    lengths = {s: nx.single_source_dijkstra_path_length(G, s) for s, _ in _pairs(G, seed)}
+    for s, t in _pairs(G, seed):
+        expected = lengths[s].get(t)
+        if expected is None:
+            assert metric.distance(s, t) is None
+            assert metric.shortest_path(s, t) is None
+            continue
+        assert metric.distance(s, t) == pytest.approx(expected)
+        cost, path = metric.shortest_path(s, t)
+        assert cost == pytest.approx(expected)
+        assert path[0] == s and path[-1] == t
+        assert _cost(G, path) == pytest.approx(expected)
+
+
+def test_cch_recustomizes_without_preprocessing_again():
+    G = _district_graph(1)
+    cch = ContractionHierarchy(G)
+    rng = random.Random(1)
+
+    H = G.copy()
+    for _, _, d in H.edges(data=True):
+        d["weight"] *= 1.0 + 4.0 * rng.random()
+    metric = cch.customize("weight", H)
+
+    for s, t in _pairs(G, 1):
+        if nx.has_path(H, s, t):
+            expected = nx.dijkstra_path_length(H, s, t)
+            assert metric.distance(s, t) == pytest.approx(expected)
+            assert _cost(H, metric.shortest_path(s, t)[1]) == pytest.approx(expected)
+
+
+def test_cch_without_coordinates():
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(9, 9))
+    rng = random.Random(7)
+    for _, _, d in G.edges(data=True):
+        d["weight"] = rng.uniform(1.0, 10.0)
+    metric = ContractionHierarchy(G).customize("weight")
+
+    for s, t in _pairs(G, 7):
+        expected = nx.dijkstra_path_length(G, s, t)
+        cost, path = metric.shortest_path(s, t)
+        assert cost == pytest.approx(expected)
+        assert _cost(G, path) == pytest.approx(expected)
+
+
+def test_cch_rejects_directed_graphs():
+    with pytest.raises(ValueError):
+        ContractionHierarchy(nx.DiGraph([(1, 2)]))
+
+
+# --------------------
+# Dynamic shortest-path tree
+# --------------------
+def _reweigh(G: nx.Graph, seed: int, share: float = 0.15):
+    """Copy of G with a share of edges cheaper, dearer or hidden; returns (H, changed)"""
+    rng = random.Random(seed)
+    H = G.copy()
+    changed = []
+    for u, v, d in H.edges(data=True):
+        if rng.random() < share:
+            roll = rng.random()
+            d["weight"] = None if roll < 0.2 else d["weight"] * (0.4 if roll < 0.6 else 3.0)
+            changed.append((u, v))
+    return H, changed
+
+
+def _weight(u, v, d):
+    return d["weight"]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_dynamic_tree_repair_matches_fresh_build(seed):
+    G = _district_graph(seed)
+    target = next(iter(G))
+    tree = DynamicTree(G, target, _weight)
+
+    H, changed = _reweigh(G, seed)
+    repaired = tree.copy()
+    touched = repaired.update(H, _weight, changed)
+    fresh = DynamicTree(H, target, _weight)
+
+    assert repaired.dist.keys() == fresh.dist.keys()
+    assert repaired.dist == pytest.approx(fresh.dist)
+    for v in repaired.dist:
+        path = repaired.path(v)
+        assert path[0] == v and path[-1] == target
+        assert _cost(H, path) == pytest.approx(repaired.dist[v])
+
+    moved = {
+        v for v in set(tree.dist) | set(fresh.dist)
+        if tree.dist.get(v) != pytest.approx(fresh.dist.get(v))
+    }
+    assert moved <= touched
+
+
+def test_dynamic_tree_repairs_in_sequence():
+    G = _district_graph(3)
+    target = next(iter(G))
+    tree = DynamicTree(G, target, _weight)
+    prev = G
+    for step in range(4):
+        # Each step reweighs the original graph, so hidden edges come back
+        H, _ = _reweigh(G, 100 + step, share=0.1)
+        changed = [(u, v) for u, v, d in H.edges(data=True) if d["weight"] != prev[u][v]["weight"]]
+        tree.update(H, _weight, changed)
+        assert tree.dist == pytest.approx(DynamicTree(H, target, _weight).dist)
+        prev = H
+
+
+def test_dynamic_tree_copy_is_independent():
+    G = _district_graph(2)
+    target = next(iter(G))
+    tree = DynamicTree(G, target, _weight)
+    dist, next_hop = dict(tree.dist), dict(tree.next_hop)
+
+    H, changed = _reweigh(G, 2, share=0.5)
+    tree.copy().update(H, _weight, changed)
+
+    assert tree.dist == dist
+    assert tree.next_hop == next_hop